@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+import metrics
+from matcher import get_matcher
+from result_cache import cache_key, content_hash
+from scoring import MANAGER_SATURATION, ScoringEngine
+from streaming import iter_sentence_blocks, iter_text
+from summarizer import MAX_SUMMARY, SummaryRanker
+
+# 分析逻辑改变时递增，结果缓存随之失效
+ANALYZER_VERSION = 4
+
+# 各分析阶段的版本：某一阶段的算法改变时只递增这一项，重新分析时只重算该阶段。
+# 每条本地分析记录的 stage_versions 记下产出时各阶段的版本（含所用关键词集合的哈希）
+STAGE_VERSIONS = {
+    'summary': 1,
+    'action_items': 1,
+    'complaints': 1,
+    'gt_analysis': 1,
+    'manager_analysis': 2,
+}
+# 阶段 -> 写入记录的字段
+STAGE_FIELDS = {
+    'summary': ('summary', 'summary_documents'),
+    'action_items': ('action_items',),
+    'complaints': ('complaints',),
+    'gt_analysis': ('gt_analysis',),
+    'manager_analysis': ('manager_analysis',),
+}
+
+# 记录耗时的分析阶段（segmentation 包括分句和关键词扫描）
+ANALYZER_STAGES = ('segmentation', 'summary', 'action_extraction', 'complaint_extraction',
+                   'role_resolution', 'scoring')
+
+# 预设角色设置
+class DefaultRoles:
+    def __init__(self):
+        self.customers = {
+            'YungSen': {'company': 'YungSen Corp', 'title': '客户代表'},
+            'adline': {'company': 'adline Inc', 'title': '技术经理'},
+            'Philp': {'company': 'Philp Industries', 'title': '项目负责人'}
+        }
+        
+        self.managers = {
+            'Mark': {'name': 'Mark', 'title': 'PM处长', 'responsibilities': ['项目规划', '资源分配', '进度控制']},
+            'Eric': {'name': 'Eric', 'title': 'DM/Project Leader', 'responsibilities': ['项目执行', '团队协调', '技术指导']},
+            'Chester': {'name': 'Chester', 'title': '客诉PM课长', 'responsibilities': ['客户投诉处理', '品质问题追踪', '客户关系维护']},
+            'David': {'name': 'David', 'title': 'GQAM Dell品质保证负责人', 'responsibilities': ['品质标准制定', '品质检验', '供应商品质管理']}
+        }
+
+# 职责短语对应的专门用语。问题、客户、处理、管理、项目这类通用词各位主管的会议里都会出现，
+# 也和抱怨关键词重叠，不拿来区分主管
+RESPONSIBILITY_TERMS = {
+    '项目规划': ['规划', '排程', '里程碑'],
+    '资源分配': ['资源', '人力', '预算'],
+    '进度控制': ['时程', '延期', '赶工'],
+    '项目执行': ['推进', '落地', '上线'],
+    '团队协调': ['协调', '分工', '对接'],
+    '技术指导': ['技术', '方案', '设计'],
+    '客户投诉处理': ['客诉', '退货', '赔偿'],
+    '品质问题追踪': ['追踪', '异常', '不良'],
+    '客户关系维护': ['客户关系', '回访', '满意度'],
+    '品质标准制定': ['品质标准', '规格', '允收'],
+    '品质检验': ['检验', '抽检', '良率'],
+    '供应商品质管理': ['供应商', '来料', '稽核'],
+}
+
+# 职责短语本身及其专门用语作为该主管的关键词；不在表里的职责只按完整短语匹配
+def responsibility_keywords(responsibilities):
+    keywords = []
+    for phrase in responsibilities:
+        keywords.append(phrase)
+        keywords.extend(RESPONSIBILITY_TERMS.get(phrase, []))
+    return list(dict.fromkeys(keywords))
+
+def keyword_hash(value):
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 本地会议分析模型
+class LocalMeetingAnalyzer:
+    def __init__(self, cache=None, roles=None, idf=None):
+        # roles: roles.RoleDirectory，提供时为行动项目和抱怨标注负责人和客户；
+        # idf: summarizer.IdfTable，提供时摘要使用语料级 IDF，并登记每场分析的会议
+        self.cache = cache
+        self.roles = roles
+        self.idf = idf
+        self.default_roles = DefaultRoles()
+        self.gt_keywords = {
+            'performance': ['表演', '展示', '呈现', '表现', '演出', '做秀', '演示'],
+            'shield': ['流程', '规定', '政策', '原则', '按照', '依据', '根据', '规范', '制度'],
+            'wash': ['检讨', '反思', '总结', '回顾', '评估', '分析', '反省', '检视'],
+            'delay': ['改进', '完善', '优化', '提升', '加强', '下一步', '后续', '未来', '计划']
+        }
+        
+        self.action_keywords = ['负责', '完成', '需要', '处理', '安排', '工作', '任务', '执行', '跟进', '进度']
+        self.complaint_keywords = ['问题', '困难', '挑战', '不足', '缺点', '缺陷', '失误', '错误', '抱怨', '投诉', '不满']
+        self.manager_keywords = {
+            name: responsibility_keywords(info['responsibilities'])
+            for name, info in self.default_roles.managers.items()
+        }
+        self.matcher = get_matcher(self.keyword_families())
+        self.gt_scorer = ScoringEngine(self.matcher, {name: name for name in self.gt_keywords})
+        self.manager_scorer = ScoringEngine(
+            self.matcher, {name: 'manager:' + name for name in self.manager_keywords},
+            saturation=MANAGER_SATURATION)
+        self.stage_versions = self.compute_stage_versions()
+        # 关键词或阶段版本改动同样会让缓存失效
+        self.version = '%d-%s' % (ANALYZER_VERSION,
+                                  keyword_hash([self.keyword_families(), self.stage_versions]))
+
+    def compute_stage_versions(self):
+        # 阶段版本号加上该阶段依赖的关键词集合的哈希；行动项目和抱怨的负责人、客户还依赖角色名册
+        roles = self.roles.families() if self.roles is not None else {}
+        dependencies = {
+            'summary': [],
+            'action_items': [self.action_keywords, roles],
+            'complaints': [self.complaint_keywords, roles],
+            'gt_analysis': self.gt_keywords,
+            'manager_analysis': self.manager_keywords,
+        }
+        return {stage: '%d-%s' % (version, keyword_hash(dependencies[stage]))
+                for stage, version in STAGE_VERSIONS.items()}
+
+    def stale_stages(self, record):
+        # 本地分析记录里版本与当前不一致的阶段；远程分析不依赖本地关键词，不在此列
+        if record.get('analysis_method') != 'local_model':
+            return []
+        recorded = record.get('stage_versions') or {}
+        return [stage for stage, version in self.stage_versions.items() if recorded.get(stage) != version]
+
+    def keyword_families(self):
+        families = {'action': self.action_keywords, 'complaint': self.complaint_keywords}
+        families.update(self.gt_keywords)
+        families.update(('manager:' + name, keywords) for name, keywords in self.manager_keywords.items())
+        if self.roles is not None:
+            families.update(self.roles.families())
+        return families
+
+    def scan(self, text):
+        # 已经扫描过的结果直接复用
+        if isinstance(text, str):
+            return self.matcher.scan(text)
+        return text
+
+    def analyze(self, content, filename):
+        return self.analyze_stream([content], filename, digest=content_hash(content))
+
+    def analyze_path(self, path, filename=None, digest=None, encoding='utf-8'):
+        # 从文件流式分析，不把整份转录读进内存
+        if digest is None:
+            digest = file_hash(path)
+        with open(path, 'rb') as f:
+            return self.analyze_stream(iter_text(f, encoding), filename or os.path.basename(path),
+                                       digest=digest)
+
+    def analyze_stream(self, chunks, filename, digest=None):
+        # chunks: 依次到达的文本块；digest 为原始内容的哈希，提供时先查结果缓存
+        key = cache_key(digest, 'local_model', version=self.version) if self.cache and digest else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                cached['metadata'] = self.extract_metadata(filename)
+                return cached
+
+        result = self._analyze_blocks(iter_sentence_blocks(chunks), filename, digest=digest)
+        result['content_hash'] = digest
+        if key:
+            self.cache.put(key, {k: v for k, v in result.items() if k != 'metadata'})
+        return result
+
+    def reanalyze_path(self, path, stages, digest=None, encoding='utf-8'):
+        # 只重算给定的阶段，返回这些阶段的字段和 stage_versions（只含这些阶段），由调用方合并进原记录
+        with open(path, 'rb') as f:
+            return self._analyze_blocks(iter_sentence_blocks(iter_text(f, encoding)), None,
+                                        digest=digest, stages=stages)
+
+    def _analyze_blocks(self, blocks, filename, max_summary=MAX_SUMMARY, digest=None, stages=None):
+        # 每个文本块只扫描一次，摘要、行动项目、抱怨和打分都复用同一个扫描结果；
+        # stages 给定时跳过其余阶段，只返回这些阶段的字段
+        partial = stages is not None
+        wanted = set(stages) if partial else set(STAGE_VERSIONS)
+        action_items, complaints = [], []
+        snapshot = self.idf.snapshot() if self.idf is not None else None
+        ranker = SummaryRanker(snapshot)
+        gt_covered = manager_covered = 0
+        total = chars = 0
+        speaker = None
+        # 各阶段耗时按块累加，整份转录结束后记录一次
+        stages = dict.fromkeys(ANALYZER_STAGES, 0.0)
+        clock = time.perf_counter
+        for block in blocks:
+            t0 = clock()
+            scan = self.scan(block)
+            t1 = clock()
+            if 'summary' in wanted:
+                ranker.add(scan.text, scan.starts, scan.ends)
+            t2 = clock()
+            block_actions = self.extract_action_items(scan) if 'action_items' in wanted else []
+            t3 = clock()
+            block_complaints = self.extract_complaints(scan) if 'complaints' in wanted else []
+            t4 = clock()
+            # 发言人跨块接续，只要用到负责人或客户就得逐块解析
+            if self.roles is not None and ('action_items' in wanted or 'complaints' in wanted):
+                speaker = self.assign_roles(scan, block_actions, block_complaints, speaker)
+            action_items.extend(block_actions)
+            complaints.extend(block_complaints)
+            t5 = clock()
+            if 'gt_analysis' in wanted:
+                gt_covered = gt_covered + self.gt_scorer.covered_counts(scan)
+            if 'manager_analysis' in wanted:
+                manager_covered = manager_covered + self.manager_scorer.covered_counts(scan)
+            t6 = clock()
+            stages['segmentation'] += t1 - t0
+            stages['summary'] += t2 - t1
+            stages['action_extraction'] += t3 - t2
+            stages['complaint_extraction'] += t4 - t3
+            stages['role_resolution'] += t5 - t4
+            stages['scoring'] += t6 - t5
+            total += len(scan)
+            chars += len(block)
+
+        start = clock()
+        summary = ranker.summary(max_summary) if 'summary' in wanted else None
+        if self.idf is not None and digest and 'summary' in wanted:
+            self.idf.add(digest, ranker.terms())
+        stages['summary'] += clock() - start
+
+        start = clock()
+        gt_analysis = self.gt_scorer.score_counts(gt_covered, total) if 'gt_analysis' in wanted else None
+        manager_analysis = (self.manager_scorer.score_counts(manager_covered, total)
+                            if 'manager_analysis' in wanted else None)
+        stages['scoring'] += clock() - start
+        if metrics.enabled:
+            for stage, seconds in stages.items():
+                metrics.ANALYZER_STAGE_SECONDS.observe(seconds, stage=stage)
+            metrics.ANALYZED_CHARS.inc(chars)
+
+        result = {
+            'metadata': None if partial else self.extract_metadata(filename),
+            'summary': summary,
+            'action_items': action_items,
+            'complaints': complaints,
+            'gt_analysis': gt_analysis,
+            'manager_analysis': manager_analysis,
+            'analysis_method': 'local_model',
+            # 生成摘要时语料里的会议数，用于判断 IDF 漂移后是否需要重新摘要
+            'summary_documents': ranker.snapshot.documents,
+            'stage_versions': {stage: self.stage_versions[stage] for stage in STAGE_VERSIONS if stage in wanted},
+        }
+        if partial:
+            return {key: value for key, value in result.items()
+                    if key == 'stage_versions' or any(key in STAGE_FIELDS[stage] for stage in wanted)}
+        return result
+
+    def extract_metadata(self, filename):
+        basename = os.path.splitext(filename)[0]
+        
+        # 从文件名中提取会议名称 (格式: [任意内容] 会议名称_YYYYMMDD_HHMMSS)
+        # 使用正则表达式匹配日期时间部分
+        pattern = r'_(\d{8}_\d{6})$'
+        match = re.search(pattern, basename)
+        
+        if match:
+            # 找到日期时间部分，提取前面的内容作为会议名称
+            date_part = match.group(1)
+            topic = basename.replace('_' + date_part, '')
+            
+            # 尝试解析日期时间
+            try:
+                date_obj = datetime.strptime(date_part[:8], '%Y%m%d')
+                time_obj = datetime.strptime(date_part[9:], '%H%M%S')
+                date_str = date_obj.strftime('%Y-%m-%d')
+                time_str = time_obj.strftime('%H:%M:%S')
+            except ValueError:
+                date_str = '未知日期'
+                time_str = '未知时间'
+        else:
+            # 如果没有找到日期时间格式，使用整个文件名（不含扩展名）
+            topic = basename
+            date_str = '未知日期'
+            time_str = '未知时间'
+        
+        return {
+            'filename': filename,
+            'date': date_str,
+            'time': time_str,
+            'topic': topic.strip()
+        }
+
+    def extract_summary(self, text, max_sentences=MAX_SUMMARY):
+        scan = self.scan(text)
+        ranker = SummaryRanker(self.idf.snapshot() if self.idf is not None else None)
+        ranker.add(scan.text, scan.starts, scan.ends)
+        return ranker.summary(max_sentences)
+
+    def extract_action_items(self, text):
+        scan = self.scan(text)
+        return [{'description': sentence} for sentence in scan.sentences(scan.select('action'))]
+
+    def extract_complaints(self, text):
+        scan = self.scan(text)
+        return [{'content': sentence} for sentence in scan.sentences(scan.select('complaint'))]
+
+    def assign_roles(self, scan, action_items, complaints, speaker=None):
+        # 句中点名的人优先，否则取发言人；返回块末的发言人，供下一个块接续
+        responsible, customers, speaker = self.roles.resolve(
+            scan, scan.select('action'), scan.select('complaint'), speaker)
+        for item, name in zip(action_items, responsible):
+            if name:
+                item['responsible'] = name
+        for item, customer in zip(complaints, customers):
+            if customer:
+                item['customer'] = customer
+        return speaker
+
+    def analyze_grassroots_tragedy(self, text):
+        return self.gt_scorer.score(self.scan(text))
+
+    def analyze_manager_responsibilities(self, text):
+        return self.manager_scorer.score(self.scan(text))
+
+    def score_batch(self, texts):
+        # 批量重新打分：逐篇扫描，打分对 N 篇会议一次矩阵运算完成
+        scans = [self.scan(text) for text in texts]
+        gt_scores = self.gt_scorer.to_dicts(self.gt_scorer.score_batch(scans))
+        manager_scores = self.manager_scorer.to_dicts(self.manager_scorer.score_batch(scans))
+        return [{'gt_analysis': gt, 'manager_analysis': manager}
+                for gt, manager in zip(gt_scores, manager_scores)]
+
@@ -1,15 +1,38 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, make_response, render_template, request, jsonify, redirect, url_for, g, stream_with_context
+from flask import before_render_template, template_rendered
 import os
-import csv
 import json
 import re
-import requests
-from datetime import datetime
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import wraps
 import logging
-from collections import Counter
-import jieba
-import jieba.analyse
-import numpy as np
+
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import get_input_stream
+
+from analyzer import LocalMeetingAnalyzer, file_hash
+from jobs import JobQueue, JobStore
+from locks import atomic_write
+from fingerprints import FingerprintIndex, file_signature
+from fragments import FragmentCache
+import metrics
+from remote import DeepSeekClient
+from result_cache import ResultCache
+from roles import RolesConflict, RolesRegistry
+from rollups import DIMENSIONS, PERIODS, RollupStore, buckets
+from search import SearchIndex, document_sentences
+import startup
+from storage import SORTS, open_store
+from summarizer import IdfTable
+from streaming import iter_lines, iter_text
+from transfer import EXPORT_FORMATS, export_lines, import_lines
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -19,126 +42,34 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['DATA_FOLDER'] = 'data'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# 上传和分析都是流式的，单次请求的上限可以按需调大（例如全天会议录音转录）
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MSS_MAX_CONTENT_MB', 16)) * 1024 * 1024
+app.config['STORAGE_BACKEND'] = os.environ.get('MSS_STORAGE_BACKEND', 'sqlite')
+app.config['AI_MAX_CONCURRENCY'] = int(os.environ.get('MSS_AI_MAX_CONCURRENCY', 4))
+app.config['AI_TOKENS_PER_MINUTE'] = int(os.environ.get('MSS_AI_TOKENS_PER_MINUTE', 0)) or None
+app.config['AI_TIMEOUT'] = float(os.environ.get('MSS_AI_TIMEOUT', 120))
+# 超过这个估算 token 数的转录分段并发分析
+app.config['AI_CHUNK_TOKENS'] = int(os.environ.get('MSS_AI_CHUNK_TOKENS', 16000))
+app.config['RESULT_CACHE_MEMORY_ITEMS'] = int(os.environ.get('MSS_RESULT_CACHE_ITEMS', 256))
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('MSS_RESULT_CACHE_MB', 256)) * 1024 * 1024
+app.config['JOB_WORKERS'] = int(os.environ.get('MSS_JOB_WORKERS', 2))
+app.config['PAGE_SIZE'] = int(os.environ.get('MSS_PAGE_SIZE', 15))
+app.config['MAX_PAGE_SIZE'] = int(os.environ.get('MSS_MAX_PAGE_SIZE', 100))
+app.config['METRICS_ENABLED'] = os.environ.get('MSS_METRICS', '1') != '0'
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('MSS_IMPORT_BATCH_SIZE', 500))
+# 批量导入是流式写入的，上限单独设置，不受 MAX_CONTENT_LENGTH 限制
+app.config['IMPORT_MAX_CONTENT_LENGTH'] = int(os.environ.get('MSS_IMPORT_MAX_MB', 4096)) * 1024 * 1024
+app.config['FRAGMENT_CACHE_ITEMS'] = int(os.environ.get('MSS_FRAGMENT_CACHE_ITEMS', 2000))
+# 近似重复的转录：merge 不再分析、指向已有记录；flag 照常分析并在记录上标注；off 不检测
+app.config['NEAR_DUPLICATES'] = os.environ.get('MSS_NEAR_DUPLICATES', 'merge')
+app.config['NEAR_DUPLICATE_THRESHOLD'] = float(os.environ.get('MSS_NEAR_DUPLICATE_THRESHOLD', 0.8))
+
+metrics.set_enabled(app.config['METRICS_ENABLED'])
 
 # 确保目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['DATA_FOLDER'], exist_ok=True)
 
-# 预设角色设置
-class DefaultRoles:
-    def __init__(self):
-        self.customers = {
-            'YungSen': {'company': 'YungSen Corp', 'title': '客户代表'},
-            'adline': {'company': 'adline Inc', 'title': '技术经理'},
-            'Philp': {'company': 'Philp Industries', 'title': '项目负责人'}
-        }
-        
-        self.managers = {
-            'Mark': {'name': 'Mark', 'title': 'PM处长', 'responsibilities': ['项目规划', '资源分配', '进度控制']},
-            'Eric': {'name': 'Eric', 'title': 'DM/Project Leader', 'responsibilities': ['项目执行', '团队协调', '技术指导']},
-            'Chester': {'name': 'Chester', 'title': '客诉PM课长', 'responsibilities': ['客户投诉处理', '品质问题追踪', '客户关系维护']},
-            'David': {'name': 'David', 'title': 'GQAM Dell品质保证负责人', 'responsibilities': ['品质标准制定', '品质检验', '供应商品质管理']}
-        }
-
-# 本地会议分析模型
-class LocalMeetingAnalyzer:
-    def __init__(self):
-        self.default_roles = DefaultRoles()
-        self.gt_keywords = {
-            'performance': ['表演', '展示', '呈现', '表现', '演出', '做秀', '演示'],
-            'shield': ['流程', '规定', '政策', '原则', '按照', '依据', '根据', '规范', '制度'],
-            'wash': ['检讨', '反思', '总结', '回顾', '评估', '分析', '反省', '检视'],
-            'delay': ['改进', '完善', '优化', '提升', '加强', '下一步', '后续', '未来', '计划']
-        }
-        
-        self.action_keywords = ['负责', '完成', '需要', '处理', '安排', '工作', '任务', '执行', '跟进', '进度']
-        self.complaint_keywords = ['问题', '困难', '挑战', '不足', '缺点', '缺陷', '失误', '错误', '抱怨', '投诉', '不满']
-
-    def analyze(self, content, filename):
-        metadata = self.extract_metadata(filename)
-        summary = self.extract_summary(content)
-        action_items = self.extract_action_items(content)
-        complaints = self.extract_complaints(content)
-        gt_analysis = self.analyze_grassroots_tragedy(content)
-        manager_analysis = self.analyze_manager_responsibilities(content)
-        
-        return {
-            'metadata': metadata,
-            'summary': summary,
-            'action_items': action_items,
-            'complaints': complaints,
-            'gt_analysis': gt_analysis,
-            'manager_analysis': manager_analysis,
-            'analysis_method': 'local_model'
-        }
-
-    def extract_metadata(self, filename):
-        basename = os.path.splitext(filename)[0]
-        
-        # 从文件名中提取会议名称 (格式: [任意内容] 会议名称_YYYYMMDD_HHMMSS)
-        # 使用正则表达式匹配日期时间部分
-        pattern = r'_(\d{8}_\d{6})$'
-        match = re.search(pattern, basename)
-        
-        if match:
-            # 找到日期时间部分，提取前面的内容作为会议名称
-            date_part = match.group(1)
-            topic = basename.replace('_' + date_part, '')
-            
-            # 尝试解析日期时间
-            try:
-                date_obj = datetime.strptime(date_part[:8], '%Y%m%d')
-                time_obj = datetime.strptime(date_part[9:], '%H%M%S')
-                date_str = date_obj.strftime('%Y-%m-%d')
-                time_str = time_obj.strftime('%H:%M:%S')
-            except ValueError:
-                date_str = '未知日期'
-                time_str = '未知时间'
-        else:
-            # 如果没有找到日期时间格式，使用整个文件名（不含扩展名）
-            topic = basename
-            date_str = '未知日期'
-            time_str = '未知时间'
-        
-        return {
-            'filename': filename,
-            'date': date_str,
-            'time': time_str,
-            'topic': topic.strip()
-        }
-
-    def extract_summary(self, text, max_sentences=3):
-        sentences = re.split(r'[。！？!?]', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        return sentences[:max_sentences]
-
-    def extract_action_items(self, text):
-        action_items = []
-        sentences = re.split(r'[。！？!?]', text)
-        
-        for sentence in sentences:
-            if any(kw in sentence for kw in self.action_keywords):
-                action_items.append({'description': sentence})
-        
-        return action_items
-
-    def extract_complaints(self, text):
-        complaints = []
-        sentences = re.split(r'[。！？!?]', text)
-        
-        for sentence in sentences:
-            if any(kw in sentence for kw in self.complaint_keywords):
-                complaints.append({'content': sentence})
-        
-        return complaints
-
-    def analyze_grassroots_tragedy(self, text):
-        return {'performance': 5, 'shield': 3, 'wash': 7, 'delay': 4}
-
-    def analyze_manager_responsibilities(self, text):
-        return {'Mark': 8, 'Eric': 6, 'Chester': 7, 'David': 9}
-
 # 数据存取函数
 def load_config():
     config_path = os.path.join(app.config['DATA_FOLDER'], 'config.json')
@@ -155,59 +86,429 @@ def load_config():
 
 def save_config(config):
     config_path = os.path.join(app.config['DATA_FOLDER'], 'config.json')
-    with open(config_path, 'w', encoding='utf-8') as f:
+    with atomic_write(config_path, 'w', encoding='utf-8') as f:
         json.dump(config, f, ensure_ascii=False, indent=4)
 
+# 角色名册缓存在内存，roles.csv 变化时才重新解析
+_roles_registry = None
+
+def get_roles_registry():
+    global _roles_registry
+    if _roles_registry is None:
+        _roles_registry = RolesRegistry(os.path.join(app.config['DATA_FOLDER'], 'roles.csv'))
+    return _roles_registry
+
 def load_roles():
-    roles_path = os.path.join(app.config['DATA_FOLDER'], 'roles.csv')
-    roles = []
-    if os.path.exists(roles_path):
-        try:
-            with open(roles_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    roles.append(row)
-        except:
-            pass
-    return roles
+    return get_roles_registry().roles()
 
 def save_roles(roles):
-    roles_path = os.path.join(app.config['DATA_FOLDER'], 'roles.csv')
-    with open(roles_path, 'w', encoding='utf-8-sig', newline='') as f:
-        fieldnames = ['company', 'name', 'title']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for role in roles:
-            writer.writerow(role)
+    get_roles_registry().save(roles)
+
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = open_store(app.config['DATA_FOLDER'], app.config['STORAGE_BACKEND'], cached=True)
+    return _store
 
 def load_analyses():
-    analyses_path = os.path.join(app.config['DATA_FOLDER'], 'analyses.json')
-    if os.path.exists(analyses_path):
-        with open(analyses_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+    return get_store().load_all()
 
 def save_analyses(analyses):
-    analyses_path = os.path.join(app.config['DATA_FOLDER'], 'analyses.json')
-    with open(analyses_path, 'w', encoding='utf-8') as f:
-        json.dump(analyses, f, ensure_ascii=False, indent=4)
+    get_store().replace_all(analyses)
+    get_fragment_cache().clear()
+
+def append_analyses(analyses):
+    return get_store().append_many(analyses)
+
+_result_cache = None
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(os.path.join(app.config['DATA_FOLDER'], 'cache'),
+                                    memory_items=app.config['RESULT_CACHE_MEMORY_ITEMS'],
+                                    max_disk_bytes=app.config['RESULT_CACHE_MAX_BYTES'])
+    return _result_cache
+
+_remote_client = None
+_remote_client_key = None
+_remote_client_lock = threading.Lock()
+
+def get_remote_client():
+    # 配置不变时复用同一个客户端，共享连接池和限流状态。
+    # 配置改变时换上新客户端；旧客户端可能还在其他任务线程里使用，不主动关闭，随引用释放回收
+    global _remote_client, _remote_client_key
+    config = load_config()
+    if not config.get('ai_api_key') or not config.get('ai_url'):
+        return None
+    key = (config['ai_url'], config.get('ai_model'), config['ai_api_key'], config.get('prompt'))
+    with _remote_client_lock:
+        if _remote_client is None or _remote_client_key != key:
+            _remote_client = DeepSeekClient(
+                config['ai_url'], config.get('ai_model'), config['ai_api_key'],
+                prompt=config.get('prompt') or '',
+                max_concurrency=app.config['AI_MAX_CONCURRENCY'],
+                timeout=(5, app.config['AI_TIMEOUT']),
+                tokens_per_minute=app.config['AI_TOKENS_PER_MINUTE'],
+                cache=get_result_cache(),
+                chunk_tokens=app.config['AI_CHUNK_TOKENS'])
+            _remote_client_key = key
+        return _remote_client
+
+_search_index = None
+
+def get_search_index():
+    global _search_index
+    if _search_index is None:
+        _search_index = SearchIndex(os.path.join(app.config['DATA_FOLDER'], 'search.db'))
+    return _search_index
+
+def index_records(records):
+    # 入库后增量更新全文索引；索引失败不影响分析结果
+    try:
+        get_search_index().add([(record['id'], document_sentences(record, app.config['UPLOAD_FOLDER']))
+                                for record in records if record.get('id')])
+    except Exception:
+        logger.exception('更新全文索引失败')
+
+_rollups = None
+
+def get_rollups():
+    global _rollups
+    if _rollups is None:
+        _rollups = RollupStore(os.path.join(app.config['DATA_FOLDER'], 'rollups.db'))
+    return _rollups
+
+def update_rollups(records):
+    # 入库后累加趋势汇总；失败时可用 manage.py rollups 补齐
+    try:
+        get_rollups().add(records)
+    except Exception:
+        logger.exception('更新趋势汇总失败')
+
+_idf_table = None
+
+def get_idf_table():
+    global _idf_table
+    if _idf_table is None:
+        _idf_table = IdfTable(os.path.join(app.config['DATA_FOLDER'], 'idf.db'))
+    return _idf_table
+
+_fingerprints = None
+
+def get_fingerprints():
+    global _fingerprints
+    if _fingerprints is None:
+        _fingerprints = FingerprintIndex(os.path.join(app.config['DATA_FOLDER'], 'fingerprints.db'),
+                                         threshold=app.config['NEAR_DUPLICATE_THRESHOLD'])
+    return _fingerprints
+
+def record_method(analysis_method):
+    # 表单里的分析方式 -> 记录的 analysis_method；签名库和批量导入都按后者登记
+    return 'deepseek' if analysis_method == 'deepseek' else 'local_model'
+
+def find_near_duplicate(path, digest, method):
+    # 分析前查找已入库的近似重复，返回 (最相似的一条或 None, 签名)；method 为记录的 analysis_method。
+    # 检测失败不影响分析
+    if app.config['NEAR_DUPLICATES'] == 'off':
+        return None, None
+    try:
+        signature = file_signature(path)
+        match = get_fingerprints().find(signature, method, exclude=digest)
+    except Exception:
+        logger.exception('计算转录签名失败')
+        return None, None
+    return (match if match and match['analysis_id'] is not None else None), signature
+
+def register_fingerprint(digest, method, signature, analysis_id, filename):
+    # 入库后按记录实际的分析方式登记签名（DeepSeek 失败退回本地时为 local_model）
+    if app.config['NEAR_DUPLICATES'] == 'off' or signature is None:
+        return
+    try:
+        get_fingerprints().add([(digest, method, signature, analysis_id, filename)])
+    except Exception:
+        logger.exception('登记转录签名失败')
+
+def analyze_uploads(uploads, analysis_method, analyzer):
+    # uploads: [(content, filename)]；DeepSeek 分析并发执行，失败的文件退回本地模型
+    if analysis_method == 'deepseek':
+        client = get_remote_client()
+        if client is None:
+            logger.warning('未设置 API 金钥，改用本地模型分析')
+        else:
+            results = client.analyze_many(uploads, analyzer)
+            analyses = []
+            for (content, filename), result in zip(uploads, results):
+                if isinstance(result, Exception):
+                    logger.error('DeepSeek 分析 %s 失败，改用本地模型: %s', filename, result)
+                    result = analyzer.analyze(content, filename)
+                analyses.append(result)
+            return analyses
+    return [analyzer.analyze(content, filename) for content, filename in uploads]
+
+# 每个进程记录第一个请求的耗时（含各模块的首次初始化），之后每个请求计入延迟直方图
+@app.before_request
+def mark_request_start():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if 'request_started' in g:
+        elapsed = time.perf_counter() - g.request_started
+        if 'first_request_ms' not in startup.TIMINGS:
+            startup.record_timing('first_request_ms', elapsed)
+        # 按端点而不是原始路径分组，避免标签数量随 URL 增长
+        endpoint = request.endpoint or 'unmatched'
+        metrics.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method)
+        metrics.REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+def mark_render_start(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+def record_render(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        metrics.RENDER_SECONDS.observe(time.perf_counter() - started, template=template.name)
+
+before_render_template.connect(mark_render_start, app)
+template_rendered.connect(record_render, app)
+
+# 列表页的筛选、排序和分页参数，查询和计数都交给存储层
+LIST_FILTERS = ('date_from', 'date_to', 'topic', 'method')
+
+def list_filters(*extra):
+    return {name: request.args.get(name, '').strip() or None for name in LIST_FILTERS + extra}
+
+def list_sort():
+    sort = request.args.get('sort')
+    return sort if sort in SORTS else 'newest'
+
+def page_size():
+    per_page = request.args.get('per_page', type=int) or app.config['PAGE_SIZE']
+    return min(max(per_page, 1), app.config['MAX_PAGE_SIZE'])
+
+def paginate(total):
+    per_page = page_size()
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(max(request.args.get('page', 1, type=int), 1), pages)
+    return {'page': page, 'pages': pages, 'per_page': per_page, 'total': total,
+            'offset': (page - 1) * per_page}
+
+@app.template_global()
+def page_url(page):
+    args = request.args.to_dict()
+    args['page'] = page
+    return url_for(request.endpoint, **args)
+
+_fragment_cache = None
+
+def get_fragment_cache():
+    global _fragment_cache
+    if _fragment_cache is None:
+        _fragment_cache = FragmentCache(app.jinja_env, max_items=app.config['FRAGMENT_CACHE_ITEMS'])
+    return _fragment_cache
+
+@app.template_global()
+def meeting_card(template, analysis):
+    return get_fragment_cache().render(template, analysis)
+
+# 只读页面的条件请求：ETag 由存储版本号、请求的路径和参数、模板版本及页面的其他依赖算出，
+# 浏览器带着 If-None-Match / If-Modified-Since 再来时，数据没变就直接回 304，不查询也不渲染
+_templates_version = None
+
+def templates_version():
+    # 模板在进程运行期间不会重新载入，取一次最新修改时间即可
+    global _templates_version
+    if _templates_version is None:
+        folder = os.path.join(app.root_path, app.template_folder)
+        _templates_version = max([os.stat(os.path.join(folder, name)).st_mtime_ns
+                                  for name in os.listdir(folder)] + [0])
+    return _templates_version
+
+def roles_version():
+    return get_roles_registry().version()
+
+def page_validators(*dependencies):
+    store = get_store()
+    modified = store.modified()
+    parts = [store.version(), modified, request.full_path, page_size(), templates_version()]
+    parts.extend(dependency() for dependency in dependencies)
+    etag = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+    last_modified = datetime.fromtimestamp(modified, timezone.utc) if modified else None
+    return etag, last_modified
+
+def conditional_page(*dependencies):
+    # dependencies: 页面除存储外还依赖的数据的版本函数，例如角色名册
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = page_validators(*dependencies)
+            if is_resource_modified(request.environ, etag, last_modified=last_modified):
+                response = make_response(view(*args, **kwargs))
+            else:
+                response = Response(status=304)
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if last_modified is not None:
+                    response.last_modified = last_modified
+                # 允许浏览器缓存，但每次使用前都要重新验证
+                response.cache_control.no_cache = True
+                response.cache_control.private = True
+            return response
+        return wrapper
+    return decorator
+
+def meeting_page(template):
+    store = get_store()
+    filters = list_filters()
+    pagination = paginate(store.count_matching(**filters))
+    analyses = store.query(limit=pagination['per_page'], offset=pagination['offset'],
+                           sort=list_sort(), **filters)
+    return render_template(template, analyses=analyses, pagination=pagination,
+                           filters=filters, sort=list_sort(), topics=store.topics())
 
 # 路由定义
 @app.route('/')
 def index():
     return redirect(url_for('dashboard'))
 
-@app.route('/dashboard')
-def dashboard():
-    analyses = load_analyses()
-    stats = {
+def dashboard_stats():
+    # 统计值在写入时累加，这里只读取聚合结果
+    totals = get_store().stats()
+    return {
         'total_files': 10,
-        'total_meetings': len(analyses),
-        'total_actions': sum(len(a.get('action_items', [])) for a in analyses),
-        'total_complaints': sum(len(a.get('complaints', [])) for a in analyses),
+        'total_meetings': totals['meetings'],
+        'total_actions': totals['actions'],
+        'total_complaints': totals['complaints'],
         'total_managers': 4
     }
-    return render_template('dashboard.html', stats=stats, analyses=analyses[-5:])
+
+@app.route('/dashboard')
+@conditional_page()
+def dashboard():
+    return render_template('dashboard.html', stats=dashboard_stats(), analyses=get_store().recent(5))
+
+def store_analysis(analysis):
+    # 同一份转录用同一种方式分析过时不再追加重复记录，返回 (记录, 是否重复)
+    # 查重和写入在存储的同一个事务里完成，多个 worker 同时处理同一份上传也只留一条
+    store = get_store()
+    if not analysis.get('content_hash'):
+        return store.append(analysis), False
+    record, duplicate = store.append_unique(analysis)
+    if duplicate:
+        logger.info('跳过重复上传: %s', analysis['metadata']['filename'])
+    return record, duplicate
+
+def save_upload(file):
+    # 边读边写边算哈希，按内容存放在 UPLOAD_FOLDER/<哈希前两位>/<哈希>.txt
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.part')
+    with os.fdopen(fd, 'wb') as out:
+        for chunk in iter(lambda: file.stream.read(1024 * 1024), b''):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    hexdigest = digest.hexdigest()
+    relative_path = os.path.join(hexdigest[:2], hexdigest + '.txt')
+    path = os.path.join(app.config['UPLOAD_FOLDER'], relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    filename = os.path.basename(file.filename.replace('\\', '/'))
+    return {'filename': filename, 'path': relative_path, 'size': size}
+
+def upload_path(relative_path):
+    # 只接受 UPLOAD_FOLDER 之内的相对路径
+    root = os.path.abspath(app.config['UPLOAD_FOLDER'])
+    path = os.path.abspath(os.path.join(root, relative_path))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+# save_upload 的存放方式：<哈希前两位>/<哈希>.txt
+_CONTENT_PATH = re.compile(r'^([0-9a-f]{2})/(\1[0-9a-f]{62})\.txt$')
+
+def upload_digest(relative_path, path):
+    # 按内容存放的上传文件从路径直接取哈希；其他文件（旧的按文件名保存的转录）现算
+    match = _CONTENT_PATH.match(relative_path.replace(os.sep, '/'))
+    return match.group(2) if match else file_hash(path)
+
+def process_job(job, files):
+    analyzer = LocalMeetingAnalyzer(cache=get_result_cache(), roles=get_roles_registry().directory(),
+                                    idf=get_idf_table())
+    job_store = get_job_store()
+    method = job['analysis_method']
+
+    def run(file):
+        job_store.set_file_status(job['id'], file['idx'], 'running')
+        try:
+            path = upload_path(file['path'])
+            digest = upload_digest(file['path'], path)
+            match, signature = find_near_duplicate(path, digest, record_method(method))
+            if match and app.config['NEAR_DUPLICATES'] == 'merge':
+                logger.info('跳过近似重复上传: %s（与记录 %s 相似度 %.2f）', file['filename'],
+                            match['analysis_id'], match['similarity'])
+                register_fingerprint(digest, record_method(method), signature, match['analysis_id'],
+                                     file['filename'])
+                job_store.set_file_status(job['id'], file['idx'], 'duplicate',
+                                          analysis_id=match['analysis_id'])
+                return
+            if method == 'deepseek':
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                analysis = analyze_uploads([(content, file['filename'])], method, analyzer)[0]
+            else:
+                # 本地分析直接从磁盘流式读取
+                analysis = analyzer.analyze_path(path, file['filename'], digest=digest)
+            analysis['source_path'] = file['path']
+            if match:
+                analysis['near_duplicate_of'] = {'id': match['analysis_id'], 'similarity': match['similarity']}
+            record, duplicate = store_analysis(analysis)
+            register_fingerprint(digest, record['analysis_method'], signature, record.get('id'),
+                                 file['filename'])
+            if not duplicate:
+                index_records([record])
+                update_rollups([record])
+            job_store.set_file_status(job['id'], file['idx'], 'duplicate' if duplicate else 'done',
+                                      analysis_id=record.get('id'))
+        except Exception as e:
+            logger.exception('分析 %s 失败', file['filename'])
+            job_store.set_file_status(job['id'], file['idx'], 'failed', error=str(e))
+
+    # DeepSeek 分析主要在等网络，任务内的文件并发处理
+    if method == 'deepseek' and len(files) > 1:
+        with ThreadPoolExecutor(max_workers=app.config['AI_MAX_CONCURRENCY']) as executor:
+            list(executor.map(run, files))
+    else:
+        for file in files:
+            run(file)
+
+_job_store = None
+_job_queue = None
+
+def get_job_store():
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore(os.path.join(app.config['DATA_FOLDER'], 'jobs.db'))
+    return _job_store
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(get_job_store(), process_job, max_workers=app.config['JOB_WORKERS'])
+        resumed = _job_queue.resume()
+        if resumed:
+            logger.info('恢复 %d 个未完成的分析任务', resumed)
+    return _job_queue
+
+def wants_json():
+    return request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json'
+
+def job_response(job_id):
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload_files():
@@ -215,114 +516,235 @@ def upload_files():
         files = request.files.getlist('files')
         analysis_method = request.form.get('analysis_method', 'local')
         
-        analyzer = LocalMeetingAnalyzer()
-        analyses = load_analyses()
-        
-        for file in files:
-            if file and file.filename.endswith('.txt'):
-                filename = file.filename
-                content = file.read().decode('utf-8')
-                
-                # 分析会议内容
-                analysis_result = analyzer.analyze(content, filename)
-                
-                # 添加到分析结果列表
-                analyses.append(analysis_result)
-        
-        # 保存分析结果
-        save_analyses(analyses)
+        # 只落盘并建立任务，分析交给后台工作线程
+        saved = [save_upload(file) for file in files if file and file.filename.endswith('.txt')]
+        if not saved:
+            if wants_json():
+                return jsonify({'error': '请上传TXT文件'}), 400
+            return redirect(url_for('upload_files'))
         
-        return redirect(url_for('dashboard'))
+        job_id = get_job_queue().submit(saved, analysis_method)
+        if wants_json():
+            return job_response(job_id)
+        return redirect(url_for('upload_files', job=job_id))
     
-    return render_template('upload.html')
+    job = get_job_store().get(request.args['job']) if request.args.get('job') else None
+    uploaded_files = []
+    if job:
+        uploaded_files = [{'filename': f['filename'], 'upload_time': job['created_at'],
+                           'analyzed': f['status'] in ('done', 'duplicate'), 'status': f['status']}
+                          for f in job['files']]
+    return render_template('upload.html', job=job, uploaded_files=uploaded_files)
+
+@app.route('/analyze', methods=['POST'])
+def analyze_files():
+    # 接受 multipart 文件，或 JSON 中列出已在 UPLOAD_FOLDER 的文件，立即返回任务编号
+    payload = request.get_json(silent=True) or {}
+    analysis_method = payload.get('analysis_method') or request.form.get('analysis_method', 'local')
+    saved = [save_upload(file) for file in request.files.getlist('files')
+             if file and file.filename.endswith('.txt')]
+    for name in payload.get('filenames') or []:
+        if not upload_path(name):
+            return jsonify({'error': '找不到文件: %s' % name}), 400
+        filename = get_job_store().original_filename(name) or os.path.basename(name)
+        saved.append({'filename': filename, 'path': name,
+                      'size': os.path.getsize(upload_path(name))})
+    if not saved:
+        return jsonify({'error': '没有可分析的文件'}), 400
+    return job_response(get_job_queue().submit(saved, analysis_method))
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
 
 @app.route('/meeting_records')
+@conditional_page()
 def meeting_records():
-    analyses = load_analyses()
-    return render_template('meeting_records.html', analyses=analyses)
+    return meeting_page('meeting_records.html')
 
 @app.route('/action_items')
+@conditional_page(roles_version)
 def action_items():
-    analyses = load_analyses()
-    
-    # 计算统计信息
-    total_count = 0
-    completed_count = 0
-    pending_count = 0
-    
-    for analysis in analyses:
-        action_items = analysis.get('action_items', [])
-        total_count += len(action_items)
-        
-        for item in action_items:
-            if item.get('deadline'):
-                pending_count += 1
-            else:
-                completed_count += 1
+    store = get_store()
+    filters = list_filters('responsible', 'status')
+    totals = store.item_totals('action', **filters)
+    pagination = paginate(totals['total'])
+    items = store.query_items('action', limit=pagination['per_page'], offset=pagination['offset'],
+                              sort=list_sort(), **filters)
     
     return render_template('action_items.html', 
-                         analyses=analyses, 
+                         items=items, 
                          roles=load_roles(),
-                         total_count=total_count,
-                         completed_count=completed_count,
-                         pending_count=pending_count)
+                         pagination=pagination,
+                         filters=filters,
+                         sort=list_sort(),
+                         topics=store.topics(),
+                         responsibles=store.responsibles('action'),
+                         show_status=True,
+                         total_count=totals['total'],
+                         completed_count=totals['completed'],
+                         pending_count=totals['pending'])
 
 @app.route('/complaints')
+@conditional_page(roles_version)
 def customer_complaints():
-    analyses = load_analyses()
-    return render_template('complaints.html', analyses=analyses, roles=load_roles())
+    store = get_store()
+    filters = list_filters()
+    pagination = paginate(store.item_totals('complaint', **filters)['total'])
+    items = store.query_items('complaint', limit=pagination['per_page'], offset=pagination['offset'],
+                              sort=list_sort(), **filters)
+    return render_template('complaints.html', items=items, roles=load_roles(), pagination=pagination,
+                           filters=filters, sort=list_sort(), topics=store.topics())
 
 @app.route('/manager_analysis')
+@conditional_page()
 def manager_analysis():
-    analyses = load_analyses()
-    return render_template('manager_analysis.html', analyses=analyses)
+    return meeting_page('manager_analysis.html')
+
+def search_results():
+    query = request.args.get('q', '').strip()
+    per_page = page_size()
+    page = max(request.args.get('page', 1, type=int), 1)
+    result = get_search_index().search(query, limit=per_page, offset=(page - 1) * per_page)
+    records = get_store().get_many([hit['id'] for hit in result['hits']])
+    hits = []
+    for hit in result['hits']:
+        record = records.get(hit['id'])
+        if record is None:
+            continue
+        metadata = record.get('metadata') or {}
+        hits.append(dict(hit, topic=metadata.get('topic'), date=metadata.get('date'),
+                         time=metadata.get('time'), filename=metadata.get('filename'),
+                         analysis_method=record.get('analysis_method')))
+    return query, result, hits
+
+@app.route('/search')
+def search_meetings():
+    query, result, hits = search_results()
+    return render_template('search.html', query=query, terms=result['terms'], hits=hits,
+                           pagination=paginate(result['total']))
+
+@app.route('/api/search')
+def search_api():
+    query, result, hits = search_results()
+    pagination = paginate(result['total'])
+    return jsonify({'query': query, 'terms': result['terms'], 'total': result['total'],
+                    'page': pagination['page'], 'per_page': pagination['per_page'], 'hits': hits})
+
+@app.route('/api/export')
+def export_analyses():
+    # ?format=ndjson|csv&date_from=&date_to=&method=，边读边写，不把全部记录放进内存
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': '不支持的格式: %s' % fmt, 'formats': list(EXPORT_FORMATS)}), 400
+    filters = {name: request.args.get(name, '').strip() or None
+               for name in ('date_from', 'date_to', 'method')}
+    records = get_store().iter_matching(**filters)
+    filename = 'analyses_%s.%s' % (datetime.now().strftime('%Y%m%d_%H%M%S'), fmt)
+    return Response(stream_with_context(export_lines(records, fmt)), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
+
+@app.route('/api/import', methods=['POST'])
+def import_analyses():
+    # 请求体为 NDJSON（/api/export 的输出），逐行解析、分批写入；同内容同方式的记录跳过。
+    # 全文索引是导入中最慢的一步，大批量迁移时可加 ?index=0，之后用 manage.py reindex 补建
+    with_index = request.args.get('index', '1') != '0'
+
+    def stored(records):
+        if with_index:
+            index_records(records)
+        update_rollups(records)
+
+    stream = get_input_stream(request.environ, max_content_length=app.config['IMPORT_MAX_CONTENT_LENGTH'])
+    lines = iter_lines(iter_text(stream, 'utf-8-sig'))
+    try:
+        totals = import_lines(lines, get_store(), batch_size=app.config['IMPORT_BATCH_SIZE'],
+                              on_batch=stored)
+    except UnicodeDecodeError as e:
+        # 之前的批次已经写入，重新导入时会按内容哈希跳过
+        return jsonify({'error': '请求体不是 UTF-8 编码: %s' % e}), 400
+    return jsonify(totals)
+
+@app.route('/api/rollups')
+def rollups_api():
+    # ?dimension=manager&period=week&key=Mark&key=Eric&date_from=2024-01-01&date_to=2024-03-31
+    dimension = request.args.get('dimension', 'meetings')
+    period = request.args.get('period', 'week')
+    if dimension not in DIMENSIONS or period not in PERIODS:
+        return jsonify({'error': '不支持的维度或周期', 'dimensions': list(DIMENSIONS),
+                        'periods': list(PERIODS)}), 400
+    bounds = []
+    for name in ('date_from', 'date_to'):
+        value = request.args.get(name, '').strip()
+        keys = buckets(value) if value else None
+        if value and keys is None:
+            return jsonify({'error': '日期格式应为 YYYY-MM-DD: %s' % value}), 400
+        bounds.append(keys[period] if keys else None)
+    rollups = get_rollups()
+    return jsonify({'dimension': dimension, 'period': period,
+                    'series': rollups.series(dimension, period, request.args.getlist('key'), *bounds)})
+
+def render_roles(directory=None, status=200, **messages):
+    directory = directory or get_roles_registry().directory()
+    roles = directory.roles
+    return render_template('roles.html', roles=roles, roles_version=directory.version,
+                           company_count=len(set(r['company'] for r in roles)), **messages), status
 
 @app.route('/roles', methods=['GET', 'POST'])
 def manage_roles():
+    # 写入都在跨进程锁内基于最新的名册进行；按下标编辑/删除时校验页面载入时的版本
+    registry = get_roles_registry()
     if request.method == 'POST':
         form_type = request.form.get('form_type')
-        roles = load_roles()
+        expected_version = request.form.get('roles_version')
         
-        if form_type == 'add':
-            # 处理添加新角色
-            company = request.form.get('company')
-            name = request.form.get('name')
-            title = request.form.get('title')
+        try:
+            if form_type == 'add':
+                # 处理添加新角色
+                company = request.form.get('company')
+                name = request.form.get('name')
+                title = request.form.get('title')
+                
+                if company and name and title:
+                    directory = registry.update(
+                        lambda roles: roles + [{'company': company, 'name': name, 'title': title}])
+                    return render_roles(directory, success="角色添加成功")
+                else:
+                    return render_roles(error="请填写所有字段")
             
-            if company and name and title:
-                roles.append({'company': company, 'name': name, 'title': title})
-                save_roles(roles)
-                return render_template('roles.html', roles=roles, company_count=len(set(r['company'] for r in roles)), success="角色添加成功")
-            else:
-                return render_template('roles.html', roles=roles, company_count=len(set(r['company'] for r in roles)), error="请填写所有字段")
-        
-        elif form_type == 'edit':
-            # 处理编辑角色
-            for i in range(len(roles)):
-                company_key = f'company_{i}'
-                name_key = f'name_{i}'
-                title_key = f'title_{i}'
+            elif form_type == 'edit':
+                # 处理编辑角色
+                def edit_roles(roles):
+                    for i in range(len(roles)):
+                        company_key = f'company_{i}'
+                        name_key = f'name_{i}'
+                        title_key = f'title_{i}'
+                        
+                        if company_key in request.form and name_key in request.form and title_key in request.form:
+                            roles[i]['company'] = request.form[company_key]
+                            roles[i]['name'] = request.form[name_key]
+                            roles[i]['title'] = request.form[title_key]
+                    return roles
                 
-                if company_key in request.form and name_key in request.form and title_key in request.form:
-                    roles[i]['company'] = request.form[company_key]
-                    roles[i]['name'] = request.form[name_key]
-                    roles[i]['title'] = request.form[title_key]
+                directory = registry.update(edit_roles, expected_version)
+                return render_roles(directory, success="角色更新成功")
             
-            save_roles(roles)
-            return render_template('roles.html', roles=roles, company_count=len(set(r['company'] for r in roles)), success="角色更新成功")
-        
-        elif form_type == 'delete':
-            # 处理删除角色
-            delete_index = request.form.get('delete_index')
-            if delete_index and delete_index.isdigit():
-                index = int(delete_index)
-                if 0 <= index < len(roles):
-                    del roles[index]
-                    save_roles(roles)
-                    return render_template('roles.html', roles=roles, company_count=len(set(r['company'] for r in roles)), success="角色删除成功")
+            elif form_type == 'delete':
+                # 处理删除角色
+                delete_index = request.form.get('delete_index')
+                if delete_index and delete_index.isdigit():
+                    index = int(delete_index)
+                    if 0 <= index < len(registry.directory().roles):
+                        directory = registry.update(lambda roles: roles[:index] + roles[index + 1:],
+                                                    expected_version)
+                        return render_roles(directory, success="角色删除成功")
+        except RolesConflict:
+            return render_roles(status=409, error="角色名冊已被其他人修改，請確認最新內容後再操作")
     
-    roles_list = load_roles()
-    return render_template('roles.html', roles=roles_list, company_count=len(set(r['company'] for r in roles_list)))
+    return render_roles()
 
 @app.route('/settings', methods=['GET', 'POST'])
 def system_settings():
@@ -346,7 +768,28 @@ def system_health():
         'upload_folder': os.path.exists(app.config['UPLOAD_FOLDER']),
         'data_folder': os.path.exists(app.config['DATA_FOLDER'])
     }
-    return render_template('health.html', status=status)
+    for name, value in get_result_cache().stats().items():
+        status['result_cache_' + name] = value
+    for name, value in get_search_index().stats().items():
+        status['search_' + name] = value
+    for name, value in get_fragment_cache().stats().items():
+        status['fragment_cache_' + name] = value
+    for name, value in get_fingerprints().stats().items():
+        status['fingerprints_' + name] = value
+    for name, value in get_idf_table().stats().items():
+        status['idf_' + name] = value
+    for name, value in startup.TIMINGS.items():
+        status['startup_' + name] = value
+    summary = metrics.summary() if app.config['METRICS_ENABLED'] else {}
+    return render_template('health.html', status=status, metrics=summary)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return Response('metrics disabled\n', status=404, mimetype='text/plain')
+    for name, value in startup.TIMINGS.items():
+        metrics.STARTUP_MS.set(value, stage=name)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/routes')
 def show_routes():
@@ -365,17 +808,34 @@ def debug_csv():
         file = request.files.get('csv_file')
         if file and (file.filename.endswith('.csv') or file.filename.endswith('.txt')):
             try:
-                content = file.read().decode('utf-8-sig')
-                lines = content.splitlines()
+                # 流式解码，只保留前 1000 个字符和前 10 行
+                head = []
+                head_length = 0
+                first_few_lines = []
+                line_count = 0
+                
+                def chunks():
+                    nonlocal head_length
+                    for chunk in iter_text(file.stream, 'utf-8-sig'):
+                        if head_length < 1000:
+                            head.append(chunk[:1000 - head_length])
+                            head_length += len(head[-1])
+                        yield chunk
+                
+                for line in iter_lines(chunks()):
+                    if line_count < 10:
+                        first_few_lines.append(line)
+                    line_count += 1
+                content = ''.join(head)
                 
                 # 清理内容（移除BOM等）
                 cleaned_content = content.replace('\ufeff', '')
                 
                 return render_template('debug_csv.html', result={
-                    'lines': len(lines),
-                    'original_content': content[:1000],
-                    'cleaned_content': cleaned_content[:1000],
-                    'first_few_lines': lines[:10]
+                    'lines': line_count,
+                    'original_content': content,
+                    'cleaned_content': cleaned_content,
+                    'first_few_lines': first_few_lines
                 })
             except Exception as e:
                 return render_template('debug_csv.html', error=f"处理文件时出错: {str(e)}")
@@ -384,5 +844,8 @@ def debug_csv():
     
     return render_template('debug_csv.html')
 
+startup.record_timing('app_import_ms', time.perf_counter() - _import_started)
+
 if __name__ == '__main__':
+    startup.warm_up(app.config['DATA_FOLDER'], freeze=False)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,358 @@
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from analyzer import LocalMeetingAnalyzer, file_hash
+from fingerprints import FingerprintIndex, file_signature
+from result_cache import ResultCache
+from roles import RolesRegistry
+from startup import lazy_import
+from storage import SqliteDatabase
+from summarizer import IdfTable
+
+jieba = lazy_import('jieba')
+
+logger = logging.getLogger(__name__)
+
+# 多进程批量分析
+#
+# 每个工作进程启动时预先建好分析器（关键词匹配器、jieba 词典），之后的任务不再重复初始化；
+# 结果按完成顺序返回，由主进程分批写入存储。
+#
+# 提供签名库时，工作进程分析前先算 MinHash 签名：与已入库转录近似重复的文件
+# 按 near_duplicates 设置直接跳过（merge）或照常分析并在记录上标注（flag）。
+#
+# 重新分析（reanalyze_tasks）同样走进程池：按记录的 stage_versions 只重算版本或关键词变了的阶段，
+# 原始转录从上传目录读取，结果合并进原记录后分批 update_many。
+
+_analyzer = None
+_fingerprints = None
+_near_duplicates = 'merge'
+
+
+def init_worker(cache_folder=None, roles_path=None, fingerprint_path=None, near_duplicates='merge',
+                idf_path=None):
+    global _analyzer, _fingerprints, _near_duplicates
+    if _analyzer is None:
+        jieba.initialize()
+        cache = ResultCache(cache_folder) if cache_folder else None
+        roles = RolesRegistry(roles_path).directory() if roles_path else None
+        idf = IdfTable(idf_path) if idf_path else None
+        _analyzer = LocalMeetingAnalyzer(cache=cache, roles=roles, idf=idf)
+    if fingerprint_path and near_duplicates != 'off':
+        if _fingerprints is None or _fingerprints.path != fingerprint_path:
+            _fingerprints = FingerprintIndex(fingerprint_path)
+    else:
+        _fingerprints = None
+    _near_duplicates = near_duplicates
+
+
+def analyze_task(task):
+    # task: {'path': 转录文件路径, 'filename': 用于解析元数据的文件名, ...}
+    # 签名记在 task['signature']，近似重复时记在 task['near_duplicate']；merge 模式下跳过分析返回 None
+    if _fingerprints is not None:
+        if not task.get('content_hash'):
+            task['content_hash'] = file_hash(task['path'])
+        task['signature'] = file_signature(task['path'])
+        match = _fingerprints.find(task['signature'], 'local_model', exclude=task['content_hash'])
+        if match and match['analysis_id'] is not None:
+            task['near_duplicate'] = match
+            if _near_duplicates == 'merge':
+                return None
+    result = _analyzer.analyze_path(task['path'], task.get('filename'), digest=task.get('content_hash'))
+    if task.get('near_duplicate'):
+        result['near_duplicate_of'] = near_duplicate_note(task['near_duplicate'])
+    return result
+
+
+def near_duplicate_note(match):
+    return {'id': match['analysis_id'], 'similarity': match['similarity']}
+
+
+def _run_task(task):
+    try:
+        return task, analyze_task(task), None
+    except Exception as e:
+        return task, None, '%s: %s' % (type(e).__name__, e)
+
+
+def analyze_tasks(tasks, workers=None, cache_folder=None, max_pending=None, roles_path=None,
+                  fingerprint_path=None, near_duplicates='merge', idf_path=None):
+    # 按完成顺序逐个产出 (task, result, error)；在途任务数有上限，内存不随任务数增长
+    return _run_pool(_run_task, tasks, workers, max_pending,
+                     (cache_folder, roles_path, fingerprint_path, near_duplicates, idf_path))
+
+
+def _run_pool(run, tasks, workers, max_pending, initargs):
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    # fork 启动时子进程直接继承主进程里已初始化的分析器
+    init_worker(*initargs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+        pending = set()
+        for task in tasks:
+            pending.add(executor.submit(run, task))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def ingest_tasks(tasks, store, workers=None, batch_size=200, cache_folder=None, on_batch=None,
+                 on_skip=None, roles_path=None, fingerprint_path=None, near_duplicates='merge',
+                 idf_path=None):
+    # 分析并分批写入存储；已存在相同内容的记录跳过。on_batch(成功的 (task, record) 列表) 在每批提交后调用，
+    # on_skip(task, 'duplicate'、'near_duplicate' 或 'failed', 错误信息) 在跳过文件时调用
+    totals = {'analyzed': 0, 'stored': 0, 'duplicates': 0, 'near_duplicates': 0, 'failed': 0}
+    # 已入库的 (内容哈希, 分析方式) 开始时载入一次；写入时 append_many_unique 在同一事务里再查一遍
+    batch, seen = [], store.content_keys()
+    fingerprints = (FingerprintIndex(fingerprint_path)
+                    if fingerprint_path and near_duplicates != 'off' else None)
+
+    def flush():
+        records, duplicates = store.append_many_unique([record for _, record in batch])
+        totals['stored'] += len(records)
+        totals['duplicates'] += len(duplicates)
+        # 其他进程在这一批分析期间写入了同样的内容：签名指向已有记录，文件按重复跳过
+        skipped = {id(record): existing for record, existing in duplicates}
+        if fingerprints is not None:
+            fingerprints.link([(record['content_hash'], record['analysis_method'],
+                                skipped[id(record)]['id'] if id(record) in skipped else record['id'])
+                               for _, record in batch])
+        if on_skip:
+            for task, record in batch:
+                if id(record) in skipped:
+                    on_skip(task, 'duplicate', None)
+        if on_batch:
+            on_batch([(task, record) for task, record in batch if id(record) not in skipped])
+        del batch[:]
+
+    for task, result, error in analyze_tasks(tasks, workers, cache_folder, roles_path=roles_path,
+                                             fingerprint_path=fingerprint_path,
+                                             near_duplicates=near_duplicates, idf_path=idf_path):
+        if error:
+            totals['failed'] += 1
+            logger.error('分析 %s 失败: %s', task['path'], error)
+            if on_skip:
+                on_skip(task, 'failed', error)
+            continue
+        if result is None:
+            # 工作进程判定为已入库转录的近似重复，这份内容记到那条记录名下
+            totals['near_duplicates'] += 1
+            if fingerprints is not None:
+                fingerprints.add([(task['content_hash'], 'local_model', task['signature'],
+                                   task['near_duplicate']['analysis_id'], task.get('filename'))])
+            if on_skip:
+                on_skip(task, 'near_duplicate', None)
+            continue
+        totals['analyzed'] += 1
+        digest = result.get('content_hash')
+        key = (digest, result['analysis_method'])
+        if key in seen:
+            totals['duplicates'] += 1
+            if on_skip:
+                on_skip(task, 'duplicate', None)
+            continue
+        if fingerprints is not None and task.get('signature') is not None:
+            # 同一批里先后到达的近似重复：工作进程查询时前一份还没有入库
+            if near_duplicates == 'merge' and fingerprints.find(task['signature'], result['analysis_method'],
+                                                                exclude=digest):
+                totals['near_duplicates'] += 1
+                if on_skip:
+                    on_skip(task, 'near_duplicate', None)
+                continue
+            fingerprints.add([(digest, result['analysis_method'], task['signature'], None,
+                               task.get('filename'))])
+        seen.add(key)
+        if task.get('source_path'):
+            result['source_path'] = task['source_path']
+        batch.append((task, result))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return totals
+
+
+def reanalyze_task(task):
+    # task: {'id', 'path', 'stages', 'content_hash'}；返回这些阶段重新计算的字段
+    return _analyzer.reanalyze_path(task['path'], task['stages'], digest=task.get('content_hash'))
+
+
+def _run_reanalyze(task):
+    try:
+        return task, reanalyze_task(task), None
+    except Exception as e:
+        return task, None, '%s: %s' % (type(e).__name__, e)
+
+
+def stale_tasks(records, upload_folder, stages=None, roles_path=None):
+    # 逐条找出需要重新分析的本地分析记录；stages 给定时这些阶段无论版本都重算。
+    # 产出 (task, None) 或缺少原始转录时的 (None, 记录 id)
+    roles = RolesRegistry(roles_path).directory() if roles_path else None
+    analyzer = LocalMeetingAnalyzer(roles=roles)
+    for record in records:
+        if record.get('analysis_method') != 'local_model':
+            continue
+        wanted = analyzer.stale_stages(record)
+        if stages:
+            wanted = [stage for stage in analyzer.stage_versions if stage in wanted or stage in stages]
+        if not wanted:
+            continue
+        path = record.get('source_path')
+        if path and not os.path.isabs(path):
+            path = os.path.join(upload_folder, path)
+        if not path or not os.path.isfile(path):
+            yield None, record['id']
+            continue
+        yield {'id': record['id'], 'path': path, 'stages': wanted,
+               'content_hash': record.get('content_hash')}, None
+
+
+def reanalyze_tasks(tasks, store, workers=None, batch_size=200, roles_path=None, idf_path=None,
+                    on_batch=None):
+    # 多进程只重算过期的阶段，结果合并进原记录后分批 update_many；
+    # on_batch([(改写前, 改写后)]) 在每批提交后调用
+    totals = {'updated': 0, 'failed': 0, 'stages': {}}
+    pending = {}
+
+    def flush():
+        current = store.get_many(list(pending))
+        changes = []
+        for record_id, partial in pending.items():
+            old = current.get(record_id)
+            if old is None:
+                continue
+            new = dict(old)
+            new.update(partial)
+            # 只替换重算过的阶段，其余阶段的版本保持不变
+            new['stage_versions'] = dict(old.get('stage_versions') or {}, **partial['stage_versions'])
+            changes.append((old, new))
+        totals['updated'] += store.update_many([new for _, new in changes])
+        if on_batch:
+            on_batch(changes)
+        pending.clear()
+
+    for task, result, error in _run_pool(_run_reanalyze, tasks, workers, None,
+                                         (None, roles_path, None, 'off', idf_path)):
+        if error:
+            totals['failed'] += 1
+            logger.error('重新分析记录 %s 失败: %s', task['id'], error)
+            continue
+        for stage in task['stages']:
+            totals['stages'][stage] = totals['stages'].get(stage, 0) + 1
+        pending[task['id']] = result
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+    return totals
+
+
+# 目录导入的断点记录：每个文件按路径、大小和修改时间记下结果，重跑时跳过已完成的文件
+INGEST_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS ingested_files (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        content_hash TEXT,
+        status TEXT NOT NULL,
+        analysis_id INTEGER,
+        error TEXT,
+        updated_at TEXT NOT NULL
+    )''',
+]
+
+
+class IngestCheckpoint(SqliteDatabase):
+    def __init__(self, path):
+        SqliteDatabase.__init__(self, path)
+        with self._transaction() as conn:
+            for statement in INGEST_SCHEMA:
+                conn.execute(statement)
+
+    def finished(self):
+        # 已成功导入或确认重复的文件: {路径: (大小, 修改时间)}；失败的文件下次重试
+        rows = self._conn().execute(
+            "SELECT path, size, mtime_ns FROM ingested_files WHERE status != 'failed'")
+        return {row['path']: (row['size'], row['mtime_ns']) for row in rows}
+
+    def mark(self, entries):
+        # entries: [(task, status, analysis_id, error)]
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO ingested_files '
+                '(path, size, mtime_ns, content_hash, status, analysis_id, error, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(task['source_path'], task['size'], task['mtime_ns'], task.get('content_hash'),
+                  status, analysis_id, error, now) for task, status, analysis_id, error in entries])
+
+
+def scan_directory(root, suffix='.txt'):
+    # 递归列出转录文件，顺序固定便于断点续跑
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(suffix):
+                path = os.path.abspath(os.path.join(folder, name))
+                st = os.stat(path)
+                yield {'path': path, 'source_path': path, 'filename': name,
+                       'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def ingest_directory(root, store, checkpoint, workers=None, batch_size=200, cache_folder=None,
+                     on_batch=None, roles_path=None, fingerprint_path=None, near_duplicates='merge',
+                     idf_path=None):
+    # 导入目录下的所有转录：先按路径跳过已完成的文件，再按内容哈希跳过已入库的内容，
+    # 其余文件多进程分析、分批写入；每批提交后记录断点。返回统计和吞吐量
+    start = time.perf_counter()
+    finished = checkpoint.finished()
+    totals = {'files': 0, 'skipped': 0, 'bytes': 0}
+    skipped = []
+
+    def pending_tasks():
+        # 已入库的内容哈希只载入一次，JSON 后端不必为每个文件重读整个文件
+        seen = {digest for digest, method in store.content_keys() if method == 'local_model'}
+        for task in scan_directory(root):
+            totals['files'] += 1
+            if finished.get(task['path']) == (task['size'], task['mtime_ns']):
+                totals['skipped'] += 1
+                continue
+            task['content_hash'] = file_hash(task['path'])
+            if task['content_hash'] in seen:
+                skipped.append((task, 'duplicate', None, None))
+                totals['skipped'] += 1
+                if len(skipped) >= batch_size:
+                    flush_skipped()
+                continue
+            seen.add(task['content_hash'])
+            totals['bytes'] += task['size']
+            yield task
+
+    def flush_skipped():
+        checkpoint.mark(skipped)
+        del skipped[:]
+
+    def committed(batch):
+        checkpoint.mark([(task, 'done', record.get('id'), None) for task, record in batch])
+        if on_batch:
+            on_batch(batch)
+
+    def not_stored(task, status, error):
+        skipped.append((task, status, None, error))
+
+    totals.update(ingest_tasks(pending_tasks(), store, workers, batch_size, cache_folder,
+                               on_batch=committed, on_skip=not_stored, roles_path=roles_path,
+                               fingerprint_path=fingerprint_path, near_duplicates=near_duplicates,
+                               idf_path=idf_path))
+    if skipped:
+        flush_skipped()
+    totals['seconds'] = time.perf_counter() - start
+    return totals
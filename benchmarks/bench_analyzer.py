@@ -0,0 +1,91 @@
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import LocalMeetingAnalyzer
+
+
+# 分析器基准：旧版三次 re.split + 逐句 any() 与单次扫描引擎对比
+FILLER = '我们今天讨论一下这个客户的情况大家看看还有什么意见然后再说'
+
+
+def make_text(analyzer, size, seed=1):
+    rng = random.Random(seed)
+    keywords = [k for k in analyzer.matcher.keywords]
+    parts, length = [], 0
+    while length < size:
+        sentence = ''.join(rng.choice(FILLER) for _ in range(rng.randint(8, 30)))
+        if rng.random() < 0.3:
+            sentence += rng.choice(keywords)
+        sentence += rng.choice('。！？')
+        parts.append(sentence)
+        length += len(sentence.encode('utf-8'))
+    return ''.join(parts)
+
+
+def legacy_analyze(analyzer, text):
+    sentences = [s.strip() for s in re.split(r'[。！？!?]', text) if s.strip()]
+    summary = sentences[:3]
+    action_items = [{'description': s} for s in re.split(r'[。！？!?]', text)
+                    if any(kw in s for kw in analyzer.action_keywords)]
+    complaints = [{'content': s} for s in re.split(r'[。！？!?]', text)
+                  if any(kw in s for kw in analyzer.complaint_keywords)]
+    return summary, action_items, complaints
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=float, default=16)
+    args = parser.parse_args()
+
+    analyzer = LocalMeetingAnalyzer()
+    text = make_text(analyzer, int(args.mb * 1024 * 1024))
+
+    start = time.perf_counter()
+    _, legacy_actions, legacy_complaints = legacy_analyze(analyzer, text)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = analyzer.analyze(text, 'bench_20240101_090000.txt')
+    engine = time.perf_counter() - start
+
+    assert len(result['action_items']) == len(legacy_actions)
+    assert len(result['complaints']) == len(legacy_complaints)
+    print('transcript: %.1f MB, %d chars' % (args.mb, len(text)))
+    print('legacy: %.3fs  single-pass: %.3fs  speedup: %.1fx' % (legacy, engine, legacy / engine))
+
+    # 峰值内存：整份读入 vs. 从文件流式分析（结果本身的大小两者相同）
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', encoding='utf-8', delete=False) as f:
+        f.write(text)
+        path = f.name
+    del text, result
+    try:
+        start = time.perf_counter()
+        analyzer.analyze_path(path, 'bench_20240101_090000.txt')
+        streaming_time = time.perf_counter() - start
+        tracemalloc.start()
+        with open(path, 'rb') as f:
+            content = f.read().decode('utf-8')
+        analyzer.analyze(content, 'bench_20240101_090000.txt')
+        del content
+        whole = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        analyzer.analyze_path(path, 'bench_20240101_090000.txt')
+        streamed = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+    finally:
+        os.remove(path)
+    print('peak memory: whole-file %.1f MB  streaming %.1f MB (%.3fs)' % (
+        whole / 2 ** 20, streamed / 2 ** 20, streaming_time))
+
+
+if __name__ == '__main__':
+    main()
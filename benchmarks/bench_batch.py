@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import LocalMeetingAnalyzer
+from batch import ingest_tasks
+from storage import open_store
+from bench_analyzer import make_text
+
+
+# 多进程批量分析吞吐量：工作进程数从 1 增加到 CPU 核数
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--kb', type=int, default=200, help='每份转录的大小')
+    parser.add_argument('--workers', default=None, help='逗号分隔，默认 1,2,4..CPU 核数')
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(',')]
+    else:
+        worker_counts = sorted({1, cpus} | {2 ** i for i in range(1, 8) if 2 ** i < cpus})
+
+    analyzer = LocalMeetingAnalyzer()
+    with tempfile.TemporaryDirectory() as folder:
+        tasks = []
+        for i in range(args.files):
+            path = os.path.join(folder, '会议%d_20240101_%06d.txt' % (i, i))
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(make_text(analyzer, args.kb * 1024, seed=i))
+            tasks.append({'path': path})
+
+        print('%8s %10s %10s %8s' % ('workers', 'seconds', 'files/s', 'speedup'))
+        baseline = None
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as data_folder:
+                store = open_store(data_folder)
+                start = time.perf_counter()
+                ingest_tasks(tasks, store, workers=workers)
+                elapsed = time.perf_counter() - start
+                store.close()
+            baseline = baseline or elapsed
+            print('%8d %10.2f %10.1f %8.2fx' % (workers, elapsed, args.files / elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import JsonAnalysisStore, open_store
+
+
+# 仪表板延迟基准：旧版整档解析 + 遍历统计 vs. 缓存 + 写入时聚合
+def make_record(i):
+    return {
+        'metadata': {'filename': '周会_%d.txt' % i, 'date': '2024-01-%02d' % (i % 28 + 1),
+                     'time': '10:00:00', 'topic': '周会%d' % (i % 50)},
+        'summary': ['今天讨论项目进度', '客户反馈了交期问题', '下周继续跟进'],
+        'action_items': [{'description': '负责完成第%d项任务' % j} for j in range(i % 7)],
+        'complaints': [{'content': '客户投诉第%d个问题' % j} for j in range(i % 3)],
+        'gt_analysis': {'performance': 5, 'shield': 3, 'wash': 7, 'delay': 4},
+        'manager_analysis': {'Mark': 8, 'Eric': 6, 'Chester': 7, 'David': 9},
+        'analysis_method': 'local_model',
+    }
+
+
+def legacy_dashboard(store):
+    analyses = store.load_all()
+    return {
+        'total_meetings': len(analyses),
+        'total_actions': sum(len(a.get('action_items', [])) for a in analyses),
+        'total_complaints': sum(len(a.get('complaints', [])) for a in analyses),
+    }, analyses[-5:]
+
+
+def cached_dashboard(store):
+    return store.stats(), store.recent(5)
+
+
+def timeit(func, repeat):
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            records = [make_record(i) for i in range(size)]
+            legacy = JsonAnalysisStore(os.path.join(folder, 'legacy.json'))
+            legacy.replace_all(records)
+            store = open_store(folder, 'sqlite', cached=True)
+            store.append_many(records)
+            results.append({
+                'meetings': size,
+                'legacy_ms': timeit(lambda: legacy_dashboard(legacy), repeat),
+                'cached_ms': timeit(lambda: cached_dashboard(store), repeat),
+            })
+            store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='输出 JSON')
+    args = parser.parse_args()
+    results = run([int(s) for s in args.sizes.split(',')], args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print('%10s %12s %12s' % ('meetings', 'legacy(ms)', 'cached(ms)'))
+    for row in results:
+        print('%10d %12.2f %12.3f' % (row['meetings'], row['legacy_ms'], row['cached_ms']))
+
+
+if __name__ == '__main__':
+    main()
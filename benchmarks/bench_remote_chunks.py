@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import LocalMeetingAnalyzer
+from remote import DeepSeekClient, split_chunks
+from stub_chat_server import CANNED_ANALYSIS, serve
+from transcripts import TranscriptGenerator
+
+
+# 长转录的远程分析：整份一次请求 vs 分段并发请求（map-reduce），对着本地桩服务测量
+#
+#   python benchmarks/bench_remote_chunks.py --kb 600 --chunk-tokens 16000 --latency-per-kchar 0.05
+# 桩服务按提示词长度模拟耗时，每段回复带上自己的段号，用来检查合并结果。
+
+
+def chunk_reply(request):
+    content = request['messages'][-1]['content']
+    match = re.search(r'第 (\d+)/(\d+) 段', content)
+    index = int(match.group(1)) if match else 0
+    reply = dict(CANNED_ANALYSIS)
+    reply['summary'] = ['第%d段摘要' % index]
+    reply['action_items'] = CANNED_ANALYSIS['action_items'] + [
+        {'description': '第%d段的行动项目' % index, 'responsible': 'Mark', 'deadline': ''}]
+    reply['gt_analysis'] = dict(CANNED_ANALYSIS['gt_analysis'], performance=index % 10)
+    return json.dumps(reply, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='长转录分段远程分析')
+    parser.add_argument('--kb', type=float, default=600, help='转录大小')
+    parser.add_argument('--chunk-tokens', type=int, default=16000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.2, help='每个请求的固定耗时')
+    parser.add_argument('--latency-per-kchar', type=float, default=0.05)
+    args = parser.parse_args()
+
+    analyzer = LocalMeetingAnalyzer()
+    text = TranscriptGenerator(analyzer).transcript(int(args.kb * 1024))
+    chunks = split_chunks(text, args.chunk_tokens)
+    if ''.join(chunks).strip() != text.strip():
+        print('分段后的文本与原文不一致')
+        return 1
+
+    server, state = serve(latency=args.latency, latency_per_kchar=args.latency_per_kchar, reply=chunk_reply)
+    url = 'http://127.0.0.1:%d/v1/chat/completions' % server.server_address[1]
+    try:
+        print('%-8s %8s %10s %14s' % ('mode', 'requests', 'seconds', 'action_items'))
+        for mode, budget in (('single', len(text) * 2), ('chunked', args.chunk_tokens)):
+            client = DeepSeekClient(url, 'stub', 'key', max_concurrency=args.concurrency, chunk_tokens=budget)
+            before = state.requests
+            start = time.perf_counter()
+            result = client.analyze(text, '周会_20240101_090000.txt', analyzer)
+            elapsed = time.perf_counter() - start
+            client.close()
+            print('%-8s %8d %10.2f %14d' % (mode, state.requests - before, elapsed, len(result['action_items'])))
+        print('chunks=%d max_in_flight=%d summary=%s' % (len(chunks), state.max_in_flight, result['summary']))
+        print('gt_analysis=%s' % result['gt_analysis'])
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import LocalMeetingAnalyzer
+from search import SearchIndex
+from bench_analyzer import make_text
+
+
+# 全文检索基准：建索引吞吐量和不同查询的延迟
+QUERIES = ['客户', '延迟 进度', '客户 抱怨 改进', '绩效考核', '不存在的词语']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--meetings', type=int, default=20000)
+    parser.add_argument('--kb', type=float, default=0.5, help='每场会议的转录大小')
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    analyzer = LocalMeetingAnalyzer()
+    rng = random.Random(1)
+    texts = [make_text(analyzer, int(args.kb * 1024), seed=i) for i in range(200)]
+    with tempfile.TemporaryDirectory() as folder:
+        index = SearchIndex(os.path.join(folder, 'search.db'))
+        start = time.perf_counter()
+        for first in range(0, args.meetings, args.batch):
+            batch = [(doc_id, rng.choice(texts).split('。'))
+                     for doc_id in range(first + 1, min(first + args.batch, args.meetings) + 1)]
+            index.add(batch)
+        elapsed = time.perf_counter() - start
+        print('indexed %d meetings in %.1fs (%.0f/s), %s' % (
+            args.meetings, elapsed, args.meetings / elapsed, index.stats()))
+
+        index.search(QUERIES[0])
+        print('%-16s %8s %10s' % ('query', 'hits', 'ms'))
+        for query in QUERIES:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                result = index.search(query, limit=10)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print('%-16s %8d %10.2f' % (query, result['total'], elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
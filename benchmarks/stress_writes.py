@@ -0,0 +1,92 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcripts import make_records
+
+
+# 多进程并发写入压力测试：模拟多个 gunicorn 工作进程同时入库、同时编辑角色名册，
+# 检查没有记录丢失、id 不重复、名册没有丢失新增的角色。
+#
+#   python benchmarks/stress_writes.py --workers 1,2,4 --records 200 --roles 20
+
+
+def worker(data_folder, backend, wid, records, roles, barrier):
+    import app as app_module
+    app_module.app.config['DATA_FOLDER'] = data_folder
+    app_module.app.config['STORAGE_BACKEND'] = backend
+    client = app_module.app.test_client()
+    barrier.wait()
+    for record in records:
+        app_module.store_analysis(record)
+    conflicts = 0
+    for i in range(roles):
+        client.post('/roles', data={'form_type': 'add', 'company': 'W%d' % wid,
+                                    'name': 'w%d-%d' % (wid, i), 'title': 'stress'})
+        # 用页面载入时的版本改第一行的职称：别的进程在这之间写过就会得到 409，不能覆盖别人的修改
+        directory = app_module.get_roles_registry().directory()
+        first = directory.roles[0]
+        response = client.post('/roles', data={'form_type': 'edit', 'roles_version': directory.version,
+                                               'company_0': first['company'], 'name_0': first['name'],
+                                               'title_0': 'edited by %d' % wid})
+        conflicts += response.status_code == 409
+    return conflicts
+
+
+def run(backend, workers, per_worker, roles, records):
+    with tempfile.TemporaryDirectory(prefix='mss-stress-') as folder:
+        # 每个进程的记录内容哈希不同，不会被当作重复跳过
+        chunks = [[dict(r, content_hash='%d-%s' % (wid, r['content_hash']))
+                   for r in records[:per_worker]] for wid in range(workers)]
+        ctx = multiprocessing.get_context('fork')
+        barrier = ctx.Manager().Barrier(workers)
+        start = time.perf_counter()
+        with ctx.Pool(workers) as pool:
+            conflicts = pool.starmap(worker, [(folder, backend, wid, chunks[wid], roles, barrier)
+                                              for wid in range(workers)])
+        seconds = time.perf_counter() - start
+
+        from roles import read_roles
+        from storage import open_store
+        store = open_store(folder, backend)
+        stored = store.load_all()
+        store.close()
+        ids = [r['id'] for r in stored]
+        hashes = {r['content_hash'] for r in stored}
+        names = {role['name'] for role in read_roles(os.path.join(folder, 'roles.csv'))[0]}
+        expected_names = {'w%d-%d' % (wid, i) for wid in range(workers) for i in range(roles)}
+        ok = (len(stored) == workers * per_worker and len(set(ids)) == len(ids) and
+              len(hashes) == len(stored) and expected_names <= names)
+        print('%-6s workers=%d records=%d/%d roles=%d/%d conflicts=%d %.2fs %.0f records/s %s' % (
+            backend, workers, len(stored), workers * per_worker, len(names & expected_names),
+            len(expected_names), sum(conflicts), seconds, len(stored) / seconds,
+            'OK' if ok else 'LOST UPDATES'))
+        return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程并发写入压力测试')
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--records', type=int, default=200, help='每个进程写入的记录数')
+    parser.add_argument('--roles', type=int, default=20, help='每个进程新增的角色数')
+    parser.add_argument('--backends', default='sqlite,json')
+    args = parser.parse_args()
+
+    records = make_records(args.records, pool=20, size=2048)
+    ok = True
+    # app 导入时会在当前目录建立 data/uploads，放到临时目录里
+    with tempfile.TemporaryDirectory(prefix='mss-stress-') as workdir:
+        os.chdir(workdir)
+        for backend in args.backends.split(','):
+            for workers in [int(w) for w in args.workers.split(',')]:
+                ok = run(backend, workers, args.records, args.roles, records) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
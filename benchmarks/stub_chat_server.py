@@ -0,0 +1,110 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 本地 chat-completions 桩服务，用于在没有 DeepSeek 金钥时测试远程分析路径
+#
+#   python benchmarks/stub_chat_server.py --port 8765 --latency 0.5 --fail-rate 0.2
+# --latency-per-kchar 模拟耗时随提示词长度增长（每千字符增加的秒数）
+# 然后在系统设置里把 AI URL 设为 http://127.0.0.1:8765/v1/chat/completions
+
+CANNED_ANALYSIS = {
+    'summary': ['桩服务返回的会议摘要'],
+    'action_items': [{'description': '跟进客户交期', 'responsible': 'Eric', 'deadline': '下周五'}],
+    'complaints': [{'content': '客户反映品质问题', 'target': 'YungSen'}],
+    'gt_analysis': {'performance': 3, 'shield': 4, 'wash': 2, 'delay': 5},
+    'manager_analysis': {'Mark': 7, 'Eric': 6, 'Chester': 8, 'David': 5},
+}
+
+
+class StubState:
+    def __init__(self, latency=0.0, fail_rate=0.0, fail_status=503, reply=None, latency_per_kchar=0.0):
+        self.latency = latency
+        self.latency_per_kchar = latency_per_kchar
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.reply = reply or (lambda request: json.dumps(CANNED_ANALYSIS, ensure_ascii=False))
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            with state.lock:
+                state.requests += 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                chars = sum(len(m.get('content') or '') for m in request.get('messages', []))
+                time.sleep(state.latency + state.latency_per_kchar * chars / 1000.0)
+                if random.random() < state.fail_rate:
+                    with state.lock:
+                        state.failures += 1
+                    self._send(state.fail_status, {'error': {'message': 'stub failure'}},
+                               {'Retry-After': '0'})
+                    return
+                content = state.reply(request)
+                self._send(200, {
+                    'id': 'stub-%d' % state.requests,
+                    'object': 'chat.completion',
+                    'model': request.get('model'),
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': content}}],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+                })
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+    return Handler
+
+
+def serve(port=0, **options):
+    # 在后台线程启动，返回 (server, state)；port=0 时自动选择端口
+    state = StubState(**options)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--fail-status', type=int, default=503)
+    parser.add_argument('--latency-per-kchar', type=float, default=0.0)
+    args = parser.parse_args()
+    state = StubState(args.latency, args.fail_rate, args.fail_status,
+                      latency_per_kchar=args.latency_per_kchar)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(state))
+    print('stub chat-completions server on http://127.0.0.1:%d/v1/chat/completions' % args.port)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from analyzer import LocalMeetingAnalyzer
+from storage import open_store
+from transcripts import TranscriptGenerator, make_records
+
+
+# 基准测试套件：分析器、存储和列表页在不同数据量下的耗时，结果输出为 JSON，可与上次结果对比
+#
+#   python benchmarks/suite.py --output base.json
+#   python benchmarks/suite.py --compare base.json
+
+ROUTES = ['/meeting_records', '/meeting_records?page=20&sort=date_desc', '/action_items',
+          '/action_items?status=pending&page=20', '/complaints', '/manager_analysis']
+ANALYZE_SIZES_KB = [10, 100, 1024]
+
+
+def measure(func, repeat, budget):
+    # 先跑一次预热，再跑 repeat 次或直到用完时间预算（至少一次）
+    func()
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < repeat and (not samples or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(samples), 4), 'min_ms': round(min(samples), 4),
+            'runs': len(samples)}
+
+
+def bench_analyzer(results, repeat, budget):
+    analyzer = LocalMeetingAnalyzer()
+    generator = TranscriptGenerator(analyzer, seed=1)
+    for kb in ANALYZE_SIZES_KB:
+        text = generator.transcript(kb * 1024)
+        results['analyze[%dkb]' % kb] = measure(lambda: analyzer.analyze(text, '周会_20240101_100000.txt'),
+                                                repeat, budget)
+    filenames = [generator.filename() for _ in range(1000)]
+    stats = measure(lambda: [analyzer.extract_metadata(name) for name in filenames], repeat, budget)
+    results['extract_metadata[x1000]'] = stats
+
+
+def use_data_folder(app_module, folder):
+    # 让 app 的各个单例改用新的数据目录
+    app_module.app.config['DATA_FOLDER'] = folder
+    for name in ('_store', '_search_index', '_result_cache', '_job_store', '_roles_registry',
+                 '_rollups', '_fragment_cache', '_fingerprints', '_idf_table'):
+        setattr(app_module, name, None)
+
+
+def bench_store(results, sizes, repeat, budget):
+    import app as app_module
+    client = app_module.app.test_client()
+    for size in sizes:
+        records = make_records(size)
+        with tempfile.TemporaryDirectory() as folder:
+            use_data_folder(app_module, folder)
+            start = time.perf_counter()
+            app_module.append_analyses(records)
+            results['append_many[%d]' % size] = {'median_ms': round((time.perf_counter() - start) * 1000, 4),
+                                                 'min_ms': None, 'runs': 1}
+            backend = open_store(folder)
+            results['store.load_all[%d]' % size] = measure(backend.load_all, repeat, budget)
+            results['load_analyses[%d]' % size] = measure(app_module.load_analyses, repeat, budget)
+            extra = make_records(1, pool=1)[0]
+            results['append[%d]' % size] = measure(lambda: backend.append(dict(extra)), repeat, budget)
+            for route in ROUTES:
+                stats = measure(lambda: client.get(route), repeat, budget)
+                results['route:%s[%d]' % (route, size)] = stats
+            loaded = backend.load_all()
+            results['save_analyses[%d]' % size] = measure(lambda: app_module.save_analyses(loaded),
+                                                          min(repeat, 3), budget)
+            backend.close()
+            app_module.get_store().close()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold, min_ms):
+    # 中位数变慢超过 threshold（比例）且差值超过 min_ms 视为回归
+    regressions = []
+    print('%-52s %12s %12s %8s' % ('benchmark', 'baseline', 'current', 'change'))
+    for name, stats in current['results'].items():
+        old = baseline['results'].get(name)
+        if not old:
+            continue
+        before, after = old['median_ms'], stats['median_ms']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > threshold and after - before > min_ms:
+            regressions.append(name)
+            flag = '  <-- 回归'
+        print('%-52s %12.3f %12.3f %+7.1f%%%s' % (name, before, after, change * 100, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='性能基准测试套件')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='已入库会议数量，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=5.0, help='每项测试的时间预算（秒）')
+    parser.add_argument('--only', choices=['analyzer', 'store'], help='只跑其中一组')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    parser.add_argument('--compare', help='与之前的 JSON 结果对比，有回归时返回非零')
+    parser.add_argument('--threshold', type=float, default=0.25, help='判定为回归的变慢比例')
+    parser.add_argument('--min-ms', type=float, default=0.05, help='小于这个差值的变化视为噪声')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    results = {}
+    # app 导入时会在当前目录建立 data/uploads，放到临时目录里
+    with tempfile.TemporaryDirectory(prefix='mss-bench-') as workdir:
+        os.chdir(workdir)
+        if args.only in (None, 'analyzer'):
+            bench_analyzer(results, args.repeat, args.budget)
+        if args.only in (None, 'store'):
+            bench_store(results, [int(s) for s in args.sizes.split(',')], args.repeat, args.budget)
+        os.chdir(ROOT)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_ms)
+        if regressions:
+            print('发现 %d 项回归' % len(regressions))
+            return 1
+        return 0
+    if not output:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import LocalMeetingAnalyzer
+
+
+# 合成会议转录：发言人 + 口语化句子，句中按比例穿插分析器的关键词
+TOPICS = ['周会', '月度检讨会', '客户会议', '专案进度会', '品质检讨会', '业务汇报', '供应商会议', '新品导入会']
+OPENERS = ['我们今天主要看一下', '关于上周提到的', '我这边补充一下', '刚才讲到的', '大家注意一下',
+           '客户那边反馈说', '从数据上看', '我觉得', '另外', '然后', '目前来说', '简单说一下']
+SUBJECTS = ['出货计划', '良率数据', '测试报告', '物料交期', '系统上线', '预算', '人力安排', '样品',
+            '量产时程', '客户规格', '包装方式', '验证结果', '成本', '合约条款', '库存', '产线状况']
+CLOSERS = ['这个要再确认', '大概就是这样', '下周再看', '先这样处理', '没有其他意见', '要尽快',
+           '还在评估中', '应该没问题', '需要大家配合', '我会再同步']
+ENDINGS = '。。。。！？'
+# 每句话带上各类关键词的概率
+DENSITY = {'action': 0.25, 'complaint': 0.15, 'gt': 0.2, 'manager': 0.1}
+
+
+def vocabularies(analyzer):
+    return {
+        'action': analyzer.action_keywords,
+        'complaint': analyzer.complaint_keywords,
+        'gt': [kw for keywords in analyzer.gt_keywords.values() for kw in keywords],
+        'manager': [kw for keywords in analyzer.manager_keywords.values() for kw in keywords],
+    }
+
+
+def speakers(analyzer):
+    roles = analyzer.default_roles
+    return list(roles.managers) + list(roles.customers) + ['王经理', '李工', '陈小姐', '张课长']
+
+
+class TranscriptGenerator:
+    def __init__(self, analyzer=None, seed=0, density=None):
+        analyzer = analyzer or LocalMeetingAnalyzer()
+        self.rng = random.Random(seed)
+        self.vocab = vocabularies(analyzer)
+        self.speakers = speakers(analyzer)
+        self.density = dict(DENSITY, **(density or {}))
+
+    def sentence(self):
+        rng = self.rng
+        parts = [rng.choice(OPENERS), rng.choice(SUBJECTS)]
+        for family, probability in self.density.items():
+            if rng.random() < probability:
+                parts.insert(rng.randint(1, len(parts)), rng.choice(self.vocab[family]))
+        if rng.random() < 0.5:
+            parts.append('，' + rng.choice(CLOSERS))
+        return ''.join(parts) + rng.choice(ENDINGS)
+
+    def transcript(self, size):
+        # size: 目标字节数（UTF-8）
+        lines, length = [], 0
+        while length < size:
+            line = '%s：%s' % (self.rng.choice(self.speakers),
+                              ''.join(self.sentence() for _ in range(self.rng.randint(1, 4))))
+            lines.append(line)
+            length += len(line.encode('utf-8')) + 1
+        return '\n'.join(lines) + '\n'
+
+    def filename(self, start=datetime(2024, 1, 1), days=365):
+        # 与上传文件相同的命名格式：主题_YYYYMMDD_HHMMSS.txt
+        moment = start + timedelta(days=self.rng.randrange(days), seconds=self.rng.randrange(8 * 3600, 19 * 3600))
+        return '%s_%s.txt' % (self.rng.choice(TOPICS), moment.strftime('%Y%m%d_%H%M%S'))
+
+
+def make_records(count, analyzer=None, pool=200, size=4096, seed=0):
+    # 大量已入库会议：分析一小批转录，再换上不同的文件名和日期复用结果
+    analyzer = analyzer or LocalMeetingAnalyzer()
+    generator = TranscriptGenerator(analyzer, seed=seed)
+    templates = [analyzer.analyze(generator.transcript(size), 'template.txt') for _ in range(min(pool, count))]
+    records = []
+    for i in range(count):
+        record = dict(templates[i % len(templates)])
+        record['metadata'] = analyzer.extract_metadata(generator.filename())
+        record['content_hash'] = '%064x' % i
+        records.append(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成会议转录文件')
+    parser.add_argument('directory')
+    parser.add_argument('--files', type=int, default=100)
+    parser.add_argument('--kb', type=float, default=20, help='每份转录的大小')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    generator = TranscriptGenerator(seed=args.seed)
+    for _ in range(args.files):
+        path = os.path.join(args.directory, generator.filename())
+        while os.path.exists(path):
+            path = os.path.join(args.directory, generator.filename())
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(generator.transcript(int(args.kb * 1024)))
+    print('已生成 %d 份转录 -> %s' % (args.files, args.directory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+import hashlib
+import re
+from datetime import datetime
+
+from startup import lazy_import
+from storage import SqliteDatabase
+from streaming import iter_sentence_blocks, iter_text
+
+jieba = lazy_import('jieba')
+np = lazy_import('numpy')
+
+# 近似重复转录检测
+#
+# 同一场会议常被重复上传：重新导出、剪掉头尾、文件名里的时间戳不同，内容哈希都对不上。
+# 入库前先算 MinHash 签名：jieba 分词后取相邻 3 个词为一个 shingle，128 个哈希函数各取最小值；
+# 两份签名相同位置相等的比例即 Jaccard 相似度的估计。
+# 签名按 16 段 × 8 行做 LSH：任一段完全相同的记录才是候选，查询只做 16 次索引查找，
+# 再用完整签名计算相似度确认。签名和分段桶持久化在 SQLite 中，多个进程共用。
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# 默认的相似度阈值；16 × 8 分段下相似度 0.8 的文档成为候选的概率约 95%，0.9 时超过 99.9%
+THRESHOLD = 0.8
+# 每次和哈希函数组做运算的 shingle 数，控制中间矩阵的大小
+SHINGLE_BATCH = 4096
+
+FINGERPRINT_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS fingerprints (
+        fp_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content_hash TEXT NOT NULL,
+        method TEXT NOT NULL,
+        signature BLOB NOT NULL,
+        analysis_id INTEGER,
+        filename TEXT,
+        created_at TEXT NOT NULL,
+        UNIQUE (content_hash, method)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS fingerprint_bands (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        fp_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, fp_id)
+    ) WITHOUT ROWID''',
+]
+
+_WORD = re.compile(r'\w')
+_token_hashes = {}
+_seeds = None
+
+
+def _mix(x):
+    # splitmix64 的终结函数，uint64 运算按 2^64 回绕
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hash_seeds():
+    # 固定种子，签名在进程之间、重启之后都可以比较
+    global _seeds
+    if _seeds is None:
+        _seeds = np.random.RandomState(20240101).randint(
+            0, 2 ** 63, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+    return _seeds
+
+
+def token_hash(token):
+    value = _token_hashes.get(token)
+    if value is None:
+        if len(_token_hashes) > 1000000:
+            _token_hashes.clear()
+        value = _token_hashes[token] = int.from_bytes(
+            hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value
+
+
+def tokens(text):
+    for token in jieba.cut(text, HMM=False):
+        token = token.strip().lower()
+        if token and _WORD.search(token):
+            yield token
+
+
+def shingle_hashes(token_values):
+    # 相邻 SHINGLE_SIZE 个词的哈希组合成一个 shingle；词数不够时整段算一个
+    values = np.asarray(token_values, dtype=np.uint64)
+    if len(values) < SHINGLE_SIZE:
+        values = np.concatenate([values, np.zeros(SHINGLE_SIZE - len(values), dtype=np.uint64)])
+    combined = np.zeros(len(values) - SHINGLE_SIZE + 1, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        combined = _mix(combined ^ values[offset:offset + len(combined)])
+    return combined
+
+
+class MinHasher:
+    # 逐块喂入文本，跨块的 shingle 由上一块末尾的几个词接上
+    def __init__(self):
+        self.signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+        self.carry = []
+        self.count = 0
+
+    def update(self, text):
+        values = self.carry + [token_hash(token) for token in tokens(text)]
+        if len(values) < SHINGLE_SIZE:
+            self.carry = values
+            return
+        self._add(shingle_hashes(values))
+        self.carry = values[-(SHINGLE_SIZE - 1):]
+
+    def _add(self, shingles):
+        shingles = np.unique(shingles)
+        seeds = _hash_seeds()
+        for start in range(0, len(shingles), SHINGLE_BATCH):
+            chunk = shingles[start:start + SHINGLE_BATCH]
+            np.minimum(self.signature, _mix(chunk[:, None] ^ seeds[None, :]).min(axis=0),
+                       out=self.signature)
+        self.count += len(shingles)
+
+    def digest(self):
+        # 整份文本不足一个 shingle 时用剩下的词
+        if self.carry and not self.count:
+            self._add(shingle_hashes(self.carry))
+        return self.signature.copy()
+
+
+def signature(chunks):
+    hasher = MinHasher()
+    for block in iter_sentence_blocks(chunks):
+        hasher.update(block)
+    return hasher.digest()
+
+
+def file_signature(path, encoding='utf-8'):
+    with open(path, 'rb') as f:
+        return signature(iter_text(f, encoding))
+
+
+def similarity(a, b):
+    return float(np.mean(np.asarray(a) == np.asarray(b)))
+
+
+def band_buckets(sig):
+    # 每段 ROWS 个值压成一个有符号 64 位整数，作为 SQLite 的桶号
+    rows = np.ascontiguousarray(sig, dtype=np.uint64).reshape(BANDS, ROWS)
+    return [int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), 'little', signed=True)
+            for row in rows]
+
+
+class FingerprintIndex(SqliteDatabase):
+    def __init__(self, path, threshold=THRESHOLD):
+        SqliteDatabase.__init__(self, path)
+        self.threshold = threshold
+        with self._transaction() as conn:
+            for statement in FINGERPRINT_SCHEMA:
+                conn.execute(statement)
+
+    def add(self, entries):
+        # entries: [(content_hash, method, signature, analysis_id, filename)]；同一内容和方式只记一次
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._transaction() as conn:
+            for content_hash, method, sig, analysis_id, filename in entries:
+                row = conn.execute('SELECT fp_id FROM fingerprints WHERE content_hash = ? AND method = ?',
+                                   (content_hash, method)).fetchone()
+                if row is not None:
+                    if analysis_id is not None:
+                        conn.execute('UPDATE fingerprints SET analysis_id = ? WHERE fp_id = ?',
+                                     (analysis_id, row['fp_id']))
+                    continue
+                cursor = conn.execute(
+                    'INSERT INTO fingerprints (content_hash, method, signature, analysis_id, filename, '
+                    'created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (content_hash, method, np.asarray(sig, dtype=np.uint64).tobytes(), analysis_id,
+                     filename, now))
+                conn.executemany('INSERT OR IGNORE INTO fingerprint_bands (band, bucket, fp_id) VALUES (?, ?, ?)',
+                                 [(band, bucket, cursor.lastrowid)
+                                  for band, bucket in enumerate(band_buckets(sig))])
+
+    def link(self, entries):
+        # entries: [(content_hash, method, analysis_id)]，分析入库后补上记录 id
+        with self._transaction() as conn:
+            conn.executemany('UPDATE fingerprints SET analysis_id = ? WHERE content_hash = ? AND method = ?',
+                             [(analysis_id, content_hash, method)
+                              for content_hash, method, analysis_id in entries])
+
+    def find(self, sig, method, exclude=None, threshold=None):
+        # 同一分析方式下最相似的已登记转录：{'content_hash', 'analysis_id', 'filename', 'similarity'}，
+        # 没有达到阈值的返回 None。尚未入库的转录 analysis_id 为 None；exclude 为自身的内容哈希
+        threshold = self.threshold if threshold is None else threshold
+        conn = self._conn()
+        candidates = set()
+        for band, bucket in enumerate(band_buckets(sig)):
+            candidates.update(row[0] for row in conn.execute(
+                'SELECT fp_id FROM fingerprint_bands WHERE band = ? AND bucket = ?', (band, bucket)))
+        if not candidates:
+            return None
+        ids = sorted(candidates)
+        rows = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows.extend(conn.execute(
+                'SELECT content_hash, signature, analysis_id, filename FROM fingerprints '
+                'WHERE method = ? AND fp_id IN (%s)' % ','.join('?' * len(chunk)), [method] + chunk))
+        best = None
+        sig = np.asarray(sig, dtype=np.uint64)
+        for row in rows:
+            if row['content_hash'] == exclude:
+                continue
+            score = similarity(sig, np.frombuffer(row['signature'], dtype=np.uint64))
+            # 已有分析记录的优先，其次是相似度
+            rank = (row['analysis_id'] is not None, score)
+            if score >= threshold and (best is None or rank > best[0]):
+                best = (rank, {'content_hash': row['content_hash'], 'analysis_id': row['analysis_id'],
+                               'filename': row['filename'], 'similarity': round(score, 3)})
+        return best[1] if best else None
+
+    def stats(self):
+        row = self._conn().execute(
+            'SELECT COUNT(*), COUNT(analysis_id) FROM fingerprints').fetchone()
+        return {'documents': row[0], 'linked': row[1]}
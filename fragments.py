@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+# 列表页卡片的渲染结果缓存
+#
+# 每场会议的卡片只依赖这条记录本身，渲染一次后按 (模板, 记录 id, 记录修订号) 缓存，
+# 新入库的会议才需要渲染。记录入库后内容不变；原地改写记录时要递增 rev，旧卡片自然失效。
+# 整体替换存储内容（replace_all）后调用 clear。
+
+
+def record_key(record):
+    return (record.get('id'), record.get('rev', 0))
+
+
+class FragmentCache:
+    def __init__(self, environment, max_items=2000):
+        self.environment = environment
+        self.max_items = max_items
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, template_name, record, **context):
+        # 没有 id 的记录（尚未入库）不缓存
+        key = (template_name,) + record_key(record)
+        if key[1] is not None:
+            with self._lock:
+                html = self._fragments.get(key)
+                if html is not None:
+                    self._fragments.move_to_end(key)
+                    self.hits += 1
+                    return html
+        html = Markup(self.environment.get_template(template_name).render(analysis=record, **context))
+        if key[1] is not None:
+            with self._lock:
+                self.misses += 1
+                self._fragments[key] = html
+                while len(self._fragments) > self.max_items:
+                    self._fragments.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._fragments), 'hits': self.hits, 'misses': self.misses}
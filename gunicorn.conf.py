@@ -0,0 +1,24 @@
+import os
+
+import startup
+
+# gunicorn 配置：gunicorn -c gunicorn.conf.py
+#
+# 主进程先载入应用并预热，之后 fork 出的工作进程共享已载入的词典和匹配器。
+
+wsgi_app = 'app:app'
+bind = os.environ.get('MSS_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('MSS_WORKERS', 2))
+threads = int(os.environ.get('MSS_THREADS', 4))
+timeout = int(os.environ.get('MSS_WORKER_TIMEOUT', 120))
+preload_app = True
+
+
+def when_ready(server):
+    # 应用已在主进程载入，工作进程尚未 fork
+    from app import app
+    startup.warm_up(app.config['DATA_FOLDER'])
+
+
+def post_fork(server, worker):
+    server.log.info('工作进程 %s 启动，预热耗时 %s', worker.pid, startup.TIMINGS)
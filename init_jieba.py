@@ -1,47 +1,43 @@
-{% extends "base.html" %}
-{% block title %}CSV診斷工具{% endblock %}
-{% block content %}
-<div class="container">
-    <h1><i class="bi bi-bug"></i> CSV檔案診斷工具</h1>
-    
-    {% if error %}
-    <div class="alert alert-danger">
-        <strong>錯誤:</strong> {{ error }}
-    </div>
-    {% endif %}
-    
-    {% if result %}
-    <div class="card mt-4">
-        <div class="card-header">
-            <h5>診斷結果</h5>
-        </div>
-        <div class="card-body">
-            <p><strong>總行數:</strong> {{ result.lines }}</p>
-            <p><strong>原始內容（前1000字符）:</strong></p>
-            <pre class="bg-light p-3">{{ result.original_content }}</pre>
-            
-            <p><strong>前10行:</strong></p>
-            <div class="bg-light p-3">
-                {% for line in result.first_few_lines %}
-                <div>行 {{ loop.index }}: <code>{{ line }}</code></div>
-                {% endfor %}
-            </div>
-        </div>
-    </div>
-    {% endif %}
-    
-    <div class="card mt-4">
-        <div class="card-header">
-            <h5>上傳CSV檔案進行診斷</h5>
-        </div>
-        <div class="card-body">
-            <form method="POST" enctype="multipart/form-data">
-                <div class="mb-3">
-                    <input type="file" class="form-control" name="csv_file" accept=".csv,.txt" required>
-                </div>
-                <button type="submit" class="btn btn-primary">診斷</button>
-            </form>
-        </div>
-    </div>
-</div>
-{% endblock %}
\ No newline at end of file
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from config import Config
+import startup
+
+
+# 部署时执行一次：生成 jieba 词典缓存，并测量应用导入和第一个请求的耗时
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成 jieba 词典缓存并报告启动耗时')
+    parser.add_argument('--data-folder', default=Config.DATA_FOLDER)
+    args = parser.parse_args(argv)
+
+    cache_path = os.path.join(args.data_folder, startup.JIEBA_CACHE_NAME)
+    start = time.perf_counter()
+    startup.build_jieba_cache(cache_path)
+    print('词典缓存: %s (%.1f MB, %.2f 秒)' % (
+        cache_path, os.path.getsize(cache_path) / 1024 / 1024, time.perf_counter() - start))
+
+    # 在全新的进程里测量，避免受本进程已导入模块的影响
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe = (
+        'import time, startup\n'
+        't = time.perf_counter()\n'
+        'from app import app\n'
+        'imported = time.perf_counter() - t\n'
+        'startup.warm_up(app.config["DATA_FOLDER"], freeze=False)\n'
+        'client = app.test_client()\n'
+        't = time.perf_counter()\n'
+        'client.get("/health")\n'
+        'print("导入 app: %.0f ms" % (imported * 1000))\n'
+        'print("预热: %.0f ms (jieba 词典 %.0f ms)" % (startup.TIMINGS["warm_up_ms"], startup.TIMINGS["jieba_load_ms"]))\n'
+        'print("第一个请求: %.0f ms" % ((time.perf_counter() - t) * 1000))\n'
+    )
+    env = dict(os.environ, PYTHONPATH=here)
+    return subprocess.call([sys.executable, '-c', probe], env=env)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from storage import SqliteDatabase
+
+logger = logging.getLogger(__name__)
+
+# 后台分析任务
+#
+# 任务和每个文件的进度都记录在 SQLite 中，进程重启后未完成的任务会重新排队；
+# 工作线程数固定，上传请求只负责落盘和建任务。
+
+JOB_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        analysis_method TEXT,
+        options TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        error TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS job_files (
+        job_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        filename TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size INTEGER,
+        status TEXT NOT NULL,
+        analysis_id INTEGER,
+        error TEXT,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (job_id, idx)
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)',
+]
+
+# 文件状态：queued -> running -> done / duplicate / failed
+FINISHED_FILE_STATUS = ('done', 'duplicate', 'failed')
+
+# 超过这个时间没有进度的 running 任务视为所在进程已退出，可以被重新领取
+STALE_AFTER = timedelta(minutes=10)
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class JobStore(SqliteDatabase):
+    def __init__(self, path):
+        SqliteDatabase.__init__(self, path)
+        with self._transaction() as conn:
+            for statement in JOB_SCHEMA:
+                conn.execute(statement)
+
+    def create(self, files, analysis_method, options=None):
+        # files: [{'filename', 'path', 'size'}]
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, analysis_method, options, created_at, updated_at, total) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', analysis_method, json.dumps(options or {}), now, now, len(files)))
+            conn.executemany(
+                'INSERT INTO job_files (job_id, idx, filename, path, size, status, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(job_id, i, f['filename'], f['path'], f.get('size'), 'queued', now)
+                 for i, f in enumerate(files)])
+        return job_id
+
+    def get(self, job_id):
+        conn = self._conn()
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options'] or '{}')
+        job['files'] = [dict(f) for f in conn.execute(
+            'SELECT idx, filename, path, size, status, analysis_id, error, updated_at '
+            'FROM job_files WHERE job_id = ? ORDER BY idx', (job_id,))]
+        job['progress'] = round((job['done'] + job['failed']) / job['total'], 3) if job['total'] else 1.0
+        return job
+
+    def original_filename(self, path):
+        # 按内容存放的上传文件对应的原始文件名
+        row = self._conn().execute('SELECT filename FROM job_files WHERE path = ? LIMIT 1',
+                                   (path,)).fetchone()
+        return row['filename'] if row else None
+
+    def unfinished(self):
+        rows = self._conn().execute(
+            "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at")
+        return [row['id'] for row in rows]
+
+    def claim(self, job_id):
+        # 原子地把任务标记为 running；多个进程同时恢复任务时只有一个能领到
+        stale_before = (datetime.now() - STALE_AFTER).isoformat(timespec='seconds')
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND "
+                "(status = 'queued' OR (status = 'running' AND updated_at < ?))",
+                (_now(), job_id, stale_before))
+            return cursor.rowcount == 1
+
+    def set_status(self, job_id, status, error=None):
+        with self._transaction() as conn:
+            conn.execute('UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                         (status, error, _now(), job_id))
+
+    def set_file_status(self, job_id, idx, status, analysis_id=None, error=None):
+        # 文件状态和任务计数在同一事务中更新
+        with self._transaction() as conn:
+            previous = conn.execute('SELECT status FROM job_files WHERE job_id = ? AND idx = ?',
+                                    (job_id, idx)).fetchone()['status']
+            conn.execute(
+                'UPDATE job_files SET status = ?, analysis_id = ?, error = ?, updated_at = ? '
+                'WHERE job_id = ? AND idx = ?', (status, analysis_id, error, _now(), job_id, idx))
+            if previous not in FINISHED_FILE_STATUS and status in FINISHED_FILE_STATUS:
+                column = 'failed' if status == 'failed' else 'done'
+                conn.execute('UPDATE jobs SET %s = %s + 1 WHERE id = ?' % (column, column), (job_id,))
+            conn.execute('UPDATE jobs SET updated_at = ? WHERE id = ?', (_now(), job_id))
+
+
+class JobQueue:
+    def __init__(self, job_store, handler, max_workers=2):
+        # handler(job, files) 负责处理任务中的文件，并通过 job_store 上报每个文件的进度
+        self.job_store = job_store
+        self.handler = handler
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self._lock = threading.Lock()
+        self._active = set()
+
+    def submit(self, files, analysis_method, options=None):
+        job_id = self.job_store.create(files, analysis_method, options)
+        self._schedule(job_id)
+        return job_id
+
+    def resume(self):
+        # 重启前没有完成的任务重新排队，已完成的文件会被跳过
+        job_ids = self.job_store.unfinished()
+        for job_id in job_ids:
+            self._schedule(job_id)
+        return len(job_ids)
+
+    def _schedule(self, job_id):
+        with self._lock:
+            if job_id in self._active:
+                return
+            self._active.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            if not self.job_store.claim(job_id):
+                return
+            job = self.job_store.get(job_id)
+            files = [f for f in job['files'] if f['status'] not in FINISHED_FILE_STATUS]
+            self.handler(job, files)
+            job = self.job_store.get(job_id)
+            status = 'failed' if job['failed'] and not job['done'] else 'done'
+            self.job_store.set_status(job_id, status)
+        except Exception as e:
+            logger.exception('分析任务 %s 失败', job_id)
+            self.job_store.set_status(job_id, 'failed', str(e))
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
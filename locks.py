@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# 多进程安全的文件写入
+#
+# file_lock: 基于锁文件的跨进程互斥锁（POSIX 用 flock，Windows 用 msvcrt.locking），
+# 每次加锁都新开一个文件句柄，所以同一进程的不同线程之间同样互斥；
+# atomic_write: 先写临时文件并 fsync，再 rename 覆盖目标，读者永远只会看到完整的旧文件或新文件。
+
+
+@contextmanager
+def file_lock(path):
+    with open(path, 'a+b') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    # 用法与 open 相同；with 块正常结束才替换目标文件，出错时目标保持原样
+    tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
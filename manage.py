@@ -0,0 +1,224 @@
+import argparse
+import os
+import sys
+import time
+
+from analyzer import STAGE_VERSIONS
+from batch import IngestCheckpoint, ingest_directory, reanalyze_tasks, stale_tasks
+from config import Config
+from rollups import RollupStore
+from search import SearchIndex, document_sentences
+from storage import BACKENDS, open_store
+from streaming import iter_text
+from summarizer import DRIFT_RATIO, IdfTable, is_drifted, summarize_chunks
+import startup
+
+
+# 命令行管理工具
+def open_data_store(args):
+    # 按 --backend 打开存储；JSON 迁移到 SQLite 只在 migrate 命令里做
+    return open_store(args.data_folder, args.backend, migrate=False)
+
+
+def cmd_migrate(args):
+    store = open_store(args.data_folder, 'sqlite', migrate=False)
+    json_path = args.source or os.path.join(args.data_folder, 'analyses.json')
+    count = store.migrate_json(json_path)
+    print('已迁移 %d 条分析记录 -> %s' % (count, store.path))
+
+
+def cmd_reindex(args):
+    # 把还没进入全文索引的记录补上；--rebuild 清空后全部重建
+    store = open_data_store(args)
+    index = SearchIndex(os.path.join(args.data_folder, 'search.db'))
+    if args.rebuild:
+        index.clear()
+    indexed = index.indexed_ids()
+    start = time.perf_counter()
+    batch, count = [], 0
+    for record in store.iter_all():
+        if record['id'] in indexed:
+            continue
+        batch.append((record['id'], list(document_sentences(record, args.upload_folder))))
+        if len(batch) >= args.batch_size:
+            count += index.add(batch)
+            batch = []
+    if batch:
+        count += index.add(batch)
+    print('已索引 %d 条记录，用时 %.1f 秒' % (count, time.perf_counter() - start))
+
+
+def cmd_rollups(args):
+    # 补齐缺少的趋势汇总；--rebuild 清空后按全部记录重算
+    store = open_data_store(args)
+    rollups = RollupStore(os.path.join(args.data_folder, 'rollups.db'))
+    if args.rebuild:
+        rollups.clear()
+    applied = rollups.applied_ids()
+    start = time.perf_counter()
+    batch, count = [], 0
+    for record in store.iter_all():
+        if record['id'] in applied:
+            continue
+        batch.append(record)
+        if len(batch) >= args.batch_size:
+            count += rollups.add(batch)
+            batch = []
+    if batch:
+        count += rollups.add(batch)
+    print('已汇总 %d 条记录，用时 %.1f 秒' % (count, time.perf_counter() - start))
+
+
+def cmd_resummarize(args):
+    # 语料 IDF 漂移后，按原始转录重新生成本地分析的摘要；--all 不论是否漂移全部重做
+    store = open_data_store(args)
+    idf = IdfTable(os.path.join(args.data_folder, 'idf.db'))
+    snapshot = idf.snapshot()
+    stale = [record['id'] for record in store.iter_all()
+             if record.get('analysis_method') == 'local_model' and
+             (args.all or is_drifted(record, snapshot.documents, args.drift))]
+    start = time.perf_counter()
+    updated = missing = 0
+    for offset in range(0, len(stale), args.batch_size):
+        records = store.get_many(stale[offset:offset + args.batch_size])
+        batch = []
+        for record in records.values():
+            path = record.get('source_path')
+            if path and not os.path.isabs(path):
+                path = os.path.join(args.upload_folder, path)
+            if not path or not os.path.isfile(path):
+                missing += 1
+                continue
+            with open(path, 'rb') as f:
+                record['summary'] = summarize_chunks(iter_text(f), snapshot)
+            record['summary_documents'] = snapshot.documents
+            batch.append(record)
+        updated += store.update_many(batch)
+    print('语料 %d 场会议：重新摘要 %d 条，缺少原始转录 %d 条，用时 %.1f 秒' % (
+        snapshot.documents, updated, missing, time.perf_counter() - start))
+
+
+def cmd_reanalyze(args):
+    # 关键词或阶段版本变化后，按原始转录只重算过期的阶段；--stages 指定的阶段不论版本都重算
+    store = open_data_store(args)
+    rollups = RollupStore(os.path.join(args.data_folder, 'rollups.db'))
+    roles_path = os.path.join(args.data_folder, 'roles.csv')
+    tasks, missing = [], 0
+    for task, record_id in stale_tasks(store.iter_all(), args.upload_folder, args.stages, roles_path):
+        if task is None:
+            missing += 1
+        else:
+            tasks.append(task)
+    if args.dry_run:
+        counts = {}
+        for task in tasks:
+            for stage in task['stages']:
+                counts[stage] = counts.get(stage, 0) + 1
+        print('需要重新分析 %d 条，缺少原始转录 %d 条：%s' % (
+            len(tasks), missing, ', '.join('%s %d' % item for item in sorted(counts.items())) or '无'))
+        return 0
+    start = time.perf_counter()
+    totals = reanalyze_tasks(tasks, store, workers=args.workers, batch_size=args.batch_size,
+                             roles_path=roles_path, idf_path=os.path.join(args.data_folder, 'idf.db'),
+                             on_batch=rollups.update)
+    print('重新分析 %d 条，失败 %d 条，缺少原始转录 %d 条，用时 %.1f 秒' % (
+        totals['updated'], totals['failed'], missing, time.perf_counter() - start))
+    for stage, count in sorted(totals['stages'].items()):
+        print('  %s: %d' % (stage, count))
+    return 1 if totals['failed'] else 0
+
+
+def cmd_ingest(args):
+    # 多进程导入整个目录；中断后再次执行会从断点继续
+    # 工作进程 fork 自本进程，词典在这里载入一次即可共享
+    startup.load_jieba(os.path.join(args.data_folder, startup.JIEBA_CACHE_NAME))
+    store = open_data_store(args)
+    checkpoint = IngestCheckpoint(os.path.join(args.data_folder, 'ingest.db'))
+    index = None if args.no_index else SearchIndex(os.path.join(args.data_folder, 'search.db'))
+    rollups = RollupStore(os.path.join(args.data_folder, 'rollups.db'))
+    progress = {'stored': 0}
+
+    def on_batch(batch):
+        if index is not None:
+            index.add([(record['id'], document_sentences(record)) for _, record in batch])
+        rollups.add([record for _, record in batch])
+        progress['stored'] += len(batch)
+        print('已写入 %d 条' % progress['stored'], file=sys.stderr)
+
+    totals = ingest_directory(args.directory, store, checkpoint, workers=args.workers,
+                              batch_size=args.batch_size,
+                              cache_folder=os.path.join(args.data_folder, 'cache'),
+                              on_batch=on_batch,
+                              roles_path=os.path.join(args.data_folder, 'roles.csv'),
+                              fingerprint_path=os.path.join(args.data_folder, 'fingerprints.db'),
+                              near_duplicates=args.near_duplicates,
+                              idf_path=os.path.join(args.data_folder, 'idf.db'))
+    seconds = max(totals['seconds'], 1e-9)
+    print('文件 %d 个：新写入 %d，跳过 %d，重复 %d，近似重复 %d，失败 %d' % (
+        totals['files'], totals['stored'], totals['skipped'], totals['duplicates'],
+        totals['near_duplicates'], totals['failed']))
+    print('用时 %.1f 秒，%.1f 文件/秒，%.2f MB/秒' % (
+        seconds, totals['analyzed'] / seconds, totals['bytes'] / 1024 / 1024 / seconds))
+    return 1 if totals['failed'] else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='会议分析系统管理工具')
+    parser.add_argument('--data-folder', default=Config.DATA_FOLDER)
+    parser.add_argument('--backend', choices=sorted(BACKENDS),
+                        default=os.environ.get('MSS_STORAGE_BACKEND', 'sqlite'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate = subparsers.add_parser('migrate', help='将 analyses.json 迁移到 SQLite 存储')
+    migrate.add_argument('--source', help='旧的 analyses.json 路径')
+    migrate.set_defaults(func=cmd_migrate)
+
+    ingest = subparsers.add_parser('ingest', help='多进程导入目录下的转录文件，支持断点续跑')
+    ingest.add_argument('directory')
+    ingest.add_argument('--workers', type=int, default=None, help='默认为 CPU 核数')
+    ingest.add_argument('--batch-size', type=int, default=200, help='每个写入事务的记录数')
+    ingest.add_argument('--no-index', action='store_true', help='不更新全文检索索引')
+    ingest.add_argument('--near-duplicates', choices=['merge', 'flag', 'off'],
+                        default=os.environ.get('MSS_NEAR_DUPLICATES', 'merge'),
+                        help='近似重复的转录：merge 跳过不分析，flag 照常分析并标注，off 不检测')
+    ingest.set_defaults(func=cmd_ingest)
+
+    reindex = subparsers.add_parser('reindex', help='补建或重建全文检索索引')
+    reindex.add_argument('--upload-folder', default=Config.UPLOAD_FOLDER)
+    reindex.add_argument('--rebuild', action='store_true', help='清空索引后全部重建')
+    reindex.add_argument('--batch-size', type=int, default=100)
+    reindex.set_defaults(func=cmd_reindex)
+
+    rollups = subparsers.add_parser('rollups', help='补齐或重建趋势汇总')
+    rollups.add_argument('--rebuild', action='store_true', help='清空汇总后全部重算')
+    rollups.add_argument('--batch-size', type=int, default=1000)
+    rollups.set_defaults(func=cmd_rollups)
+
+    resummarize = subparsers.add_parser('resummarize', help='IDF 漂移后重新生成本地分析的摘要')
+    resummarize.add_argument('--upload-folder', default=Config.UPLOAD_FOLDER)
+    resummarize.add_argument('--drift', type=float, default=DRIFT_RATIO,
+                             help='语料规模达到摘要时的多少倍才重新摘要')
+    resummarize.add_argument('--all', action='store_true', help='全部重新摘要')
+    resummarize.add_argument('--batch-size', type=int, default=200)
+    resummarize.set_defaults(func=cmd_resummarize)
+
+    reanalyze = subparsers.add_parser('reanalyze', help='关键词或分析阶段改版后，只重算过期的阶段')
+    reanalyze.add_argument('--upload-folder', default=Config.UPLOAD_FOLDER)
+    reanalyze.add_argument('--stages', nargs='+', choices=list(STAGE_VERSIONS),
+                           help='不论版本强制重算的阶段')
+    reanalyze.add_argument('--workers', type=int, default=None, help='默认为 CPU 核数')
+    reanalyze.add_argument('--batch-size', type=int, default=200, help='每个写入事务的记录数')
+    reanalyze.add_argument('--dry-run', action='store_true', help='只统计需要重算的记录和阶段')
+    reanalyze.set_defaults(func=cmd_reanalyze)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    os.makedirs(args.data_folder, exist_ok=True)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+from functools import lru_cache
+
+from startup import lazy_import
+
+np = lazy_import('numpy')
+
+# 一次分句、一次扫描匹配所有关键词族
+#
+# 转录先转成码位数组，分句和多关键词匹配都在这个数组上向量化完成；
+# 匹配器按关键词集合只构建一次，每个关键词对应一个族位掩码。扫描时先用首字查找表
+# 筛出候选位置，再按关键词逐字向量化验证，互相重叠或包含的关键词都会各自命中。
+
+SENTENCE_DELIMITERS = '。！？!?'
+_DELIMITER_CODES = [ord(c) for c in SENTENCE_DELIMITERS]
+_EXTRA_SPACE_CODES = [0x85, 0xa0, 0x1680, 0x2028, 0x2029, 0x202f, 0x205f, 0x3000]
+
+
+def segment(text, codes=None):
+    # 用码位数组一次性找出所有句子边界，返回去掉首尾空白后的 (起点, 终点)
+    if codes is None:
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    is_delimiter = np.zeros(len(codes), dtype=bool)
+    for code in _DELIMITER_CODES:
+        is_delimiter |= codes == code
+    delimiters = np.flatnonzero(is_delimiter)
+    starts = np.concatenate(([0], delimiters + 1))
+    ends = np.concatenate((delimiters, [len(codes)]))
+
+    is_space = (codes <= 0x20) | ((codes >= 0x2000) & (codes <= 0x200a))
+    for code in _EXTRA_SPACE_CODES:
+        is_space |= codes == code
+    # prefix[i] 为前 i 个字符中非空白字符的数量
+    prefix = np.zeros(len(codes) + 1, dtype=np.int32)
+    np.cumsum(~is_space, out=prefix[1:])
+    keep = prefix[ends] > prefix[starts]
+    starts, ends = starts[keep], ends[keep]
+    starts = np.searchsorted(prefix, prefix[starts] + 1, side='left') - 1
+    ends = np.searchsorted(prefix, prefix[ends], side='left')
+    return starts.astype(np.int64), ends.astype(np.int64)
+
+
+class ScanResult:
+    def __init__(self, text, starts, ends, masks, hit_pos, hit_keyword, hit_sentence, matcher):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.masks = masks
+        self.hit_pos = hit_pos
+        self.hit_keyword = hit_keyword
+        self.hit_sentence = hit_sentence
+        self.matcher = matcher
+
+    def __len__(self):
+        return len(self.starts)
+
+    def sentence(self, index):
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def sentences(self, indices=None):
+        if indices is None:
+            indices = range(len(self.starts))
+        return [self.sentence(i) for i in indices]
+
+    def select(self, *families):
+        # 命中任一指定关键词族的句子下标
+        mask = self.matcher.mask(*families)
+        return np.flatnonzero(self.masks & mask)
+
+    def keyword_hits(self, index):
+        # 某句的 (位置, 关键词) 列表
+        rows = np.flatnonzero(self.hit_sentence == index)
+        keywords = self.matcher.keywords
+        return [(int(self.hit_pos[r]), keywords[self.hit_keyword[r]]) for r in rows]
+
+
+class KeywordMatcher:
+    def __init__(self, families):
+        self.families = list(families)
+        if len(self.families) > 63:
+            raise ValueError('关键词族数量不能超过 63 个')
+        self.bits = {name: 1 << i for i, name in enumerate(self.families)}
+        masks = {}
+        for name, keywords in families.items():
+            for keyword in keywords:
+                if keyword:
+                    masks[keyword] = masks.get(keyword, 0) | self.bits[name]
+        self.keywords = sorted(masks, key=lambda k: (-len(k), k))
+        self.keyword_index = {k: i for i, k in enumerate(self.keywords)}
+        self.keyword_masks = np.array([masks[k] for k in self.keywords], dtype=np.uint64)
+
+        # 首字查找表：码位是否为某个关键词的首字；候选位置再逐字向后验证
+        self._firsts = sorted({ord(k[0]) for k in self.keywords})
+        self._first_table = np.zeros(0x110000, dtype=bool)
+        self._first_table[self._firsts] = True
+        self._keyword_codes = [[ord(c) for c in k] for k in self.keywords]
+
+    def mask(self, *families):
+        value = 0
+        for name in families:
+            value |= self.bits[name]
+        return np.uint64(value)
+
+    def find(self, codes):
+        # 找出所有关键词的全部出现位置（包括互相重叠、互相包含的情况）
+        candidates = np.flatnonzero(self._first_table[codes])
+        candidate_codes = codes[candidates]
+        by_first = {first: candidates[candidate_codes == first] for first in self._firsts}
+        positions, keyword_ids = [], []
+        size = len(codes)
+        for keyword_id, keyword_codes in enumerate(self._keyword_codes):
+            found = by_first[keyword_codes[0]]
+            for offset, code in enumerate(keyword_codes[1:], 1):
+                found = found[found + offset < size]
+                found = found[codes[found + offset] == code]
+            positions.append(found)
+            keyword_ids.append(np.full(len(found), keyword_id, dtype=np.int64))
+        if not positions:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        positions = np.concatenate(positions).astype(np.int64)
+        keyword_ids = np.concatenate(keyword_ids)
+        order = np.argsort(positions, kind='stable')
+        return positions[order], keyword_ids[order]
+
+    def scan(self, text):
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        starts, ends = segment(text, codes)
+        hit_pos, hit_keyword = self.find(codes)
+        hit_sentence = np.searchsorted(starts, hit_pos, side='right') - 1
+
+        masks = np.zeros(len(starts), dtype=np.uint64)
+        if len(hit_pos):
+            np.bitwise_or.at(masks, hit_sentence, self.keyword_masks[hit_keyword])
+        return ScanResult(text, starts, ends, masks, hit_pos, hit_keyword, hit_sentence, self)
+
+
+def _freeze(families):
+    return tuple((name, tuple(keywords)) for name, keywords in families.items())
+
+
+@lru_cache(maxsize=32)
+def _build(frozen):
+    return KeywordMatcher({name: list(keywords) for name, keywords in frozen})
+
+
+def get_matcher(families):
+    # 同一组关键词只构建一次，多个分析器实例共享
+    return _build(_freeze(families))
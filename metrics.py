@@ -0,0 +1,215 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 进程内指标：计数器和直方图，以 Prometheus 文本格式导出
+#
+# 每次记录只做一次二分查找和一次加锁累加，可以在生产环境常开；
+# 多个 gunicorn 工作进程各自计数，/metrics 返回的是处理该请求的进程的数据。
+
+enabled = True
+
+# 秒
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+REMOTE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def set_enabled(value):
+    global enabled
+    enabled = bool(value)
+
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not enabled:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield self.name + _format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数（不累计，最后一个是 +Inf）, 总和, 次数]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not enabled:
+            return
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def values(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self.values().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield (self.name + '_bucket' +
+                       _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))]),
+                       cumulative)
+            yield self.name + '_sum' + _format_labels(self.labelnames, key), total
+            yield self.name + '_count' + _format_labels(self.labelnames, key), count
+
+    def quantile(self, q, key):
+        # 由桶计数估算分位数（桶内线性插值），用于健康检查页的摘要
+        counts, _, count = self.values().get(key, (None, 0, 0))
+        if not count:
+            return None
+        rank = q * count
+        cumulative, lower = 0, 0.0
+        for bound, bucket_count in zip(self.buckets, counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return self.buckets[-1]
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return _register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render():
+    # Prometheus 文本格式 0.0.4
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        lines.append('# HELP %s %s' % (metric.name, metric.documentation.replace('\n', ' ')))
+        lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+        for name, value in metric.samples():
+            lines.append('%s %s' % (name, _format_value(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def summary():
+    # 健康检查页用的简要统计：直方图给出次数、平均和 p95（毫秒），计数器和仪表给出当前值
+    histograms, values = [], []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        for key, value in sorted(metric.values().items()):
+            labels = ', '.join('%s=%s' % pair for pair in zip(metric.labelnames, key))
+            if isinstance(metric, Histogram):
+                _, total, count = value
+                histograms.append({'name': metric.name, 'labels': labels, 'count': count,
+                                   'avg_ms': round(total / count * 1000, 2),
+                                   'p95_ms': round(metric.quantile(0.95, key) * 1000, 2)})
+            else:
+                values.append({'name': metric.name, 'labels': labels, 'value': value})
+    return {'histograms': histograms, 'values': values}
+
+
+def reset():
+    for metric in list(_registry.values()):
+        with metric._lock:
+            metric._values.clear()
+
+
+# 各模块共用的指标
+REQUEST_SECONDS = histogram('mss_http_request_duration_seconds', '请求处理耗时', ['endpoint', 'method'])
+REQUESTS = counter('mss_http_requests_total', '请求数', ['endpoint', 'status'])
+RENDER_SECONDS = histogram('mss_template_render_seconds', 'Jinja 模板渲染耗时', ['template'])
+ANALYZER_STAGE_SECONDS = histogram('mss_analyzer_stage_seconds', '本地分析各阶段耗时（每份转录）', ['stage'],
+                                   buckets=STAGE_BUCKETS)
+ANALYZED_CHARS = counter('mss_analyzer_input_chars_total', '本地分析的转录字符数')
+STORE_SECONDS = histogram('mss_store_operation_seconds', '存储读写耗时', ['backend', 'operation'])
+STORE_READ_BYTES = counter('mss_store_read_bytes_total', '从存储读出的字节数', ['backend'])
+STORE_WRITE_BYTES = counter('mss_store_write_bytes_total', '写入存储的字节数', ['backend'])
+REMOTE_SECONDS = histogram('mss_remote_request_seconds', '远程分析 API 单次请求耗时', ['status'],
+                           buckets=REMOTE_BUCKETS)
+REMOTE_RETRIES = counter('mss_remote_retries_total', '远程分析重试次数')
+STARTUP_MS = gauge('mss_startup_milliseconds', '启动各阶段耗时（毫秒）', ['stage'])
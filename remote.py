@@ -0,0 +1,347 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from matcher import segment
+from result_cache import cache_key, content_hash
+from startup import lazy_import
+from summarizer import MAX_SUMMARY
+
+np = lazy_import('numpy')
+requests = lazy_import('requests')
+
+logger = logging.getLogger(__name__)
+
+# DeepSeek（chat-completions 协议）远程分析客户端
+#
+# 共享一个带连接池的 Session；并发数由信号量限制；429/5xx 按指数退避重试；
+# 每分钟 token 用量由令牌桶限流。
+#
+# 超过 chunk_tokens 的长转录走 map-reduce：按句子边界切成若干段，各段并发分析（同一个信号量限流），
+# 再在本地合并成一份结果——行动项目和抱怨按原文顺序去重拼接，得分按各段长度加权平均，
+# 摘要从均匀分布的几段里各取一句。总耗时取决于最慢的一段（段数不超过并发数时），而不是各段之和。
+# 各段结果也进结果缓存，某一段失败后重试时已完成的段不再请求。
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 提示词结构或结果整理方式改变时递增，结果缓存随之失效
+REMOTE_ANALYZER_VERSION = 1
+
+# 每段转录的 token 预算（估算值，不含提示词）；DeepSeek 上下文为 64K，要给提示词和输出留出余量
+CHUNK_TOKENS = 16000
+
+SYSTEM_PROMPT = (
+    '你是会议分析助手。只输出一个 JSON 对象，字段如下：'
+    'summary（字符串数组，最多%d条）；'
+    'action_items（数组，元素含 description、responsible、deadline）；'
+    'complaints（数组，元素含 content、target）；'
+    'gt_analysis（对象，performance/shield/wash/delay 四项 0-10 分）；'
+    'manager_analysis（对象，主管姓名 -> 0-10 分，主管为 Mark、Eric、Chester、David）。'
+) % MAX_SUMMARY
+
+CHUNK_PROMPT = '以下是一场长会议转录的第 %d/%d 段，只根据这一段的内容输出。'
+
+
+class RemoteAnalysisError(Exception):
+    pass
+
+
+def estimate_tokens(text):
+    # 粗略估算：中文约每字 1 token，ASCII 约每 4 字符 1 token
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return len(text) - ascii_chars + ascii_chars // 4 + 1
+
+
+def split_chunks(text, max_tokens=CHUNK_TOKENS):
+    # 按句子边界切成估算 token 数不超过 max_tokens 的若干段；单句就超出预算时在句中硬切
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    # cost[i] 为 text[:i] 按 estimate_tokens 口径的估算值，ASCII 按 0.25 累计，不小于逐段取整的结果；
+    # estimate_tokens 对每段另加 1，切分预算相应扣掉，保证 estimate_tokens(段) <= max_tokens
+    cost = np.concatenate(([0.0], np.cumsum(np.where(codes < 128, 0.25, 1.0))))
+    budget = max_tokens - 1
+    starts, ends = segment(text, codes)
+    # 可以切开的位置：每句末尾的标点之后
+    cuts = np.minimum(ends + 1, len(codes))
+    cut_costs = cost[cuts]
+    chunks, start = [], 0
+    while start < len(text):
+        limit = cost[start] + budget
+        if cost[-1] <= limit:
+            end = len(text)
+        else:
+            i = int(np.searchsorted(cut_costs, limit, side='right')) - 1
+            end = int(cuts[i]) if i >= 0 else 0
+            if end <= start:
+                end = max(int(np.searchsorted(cost, limit, side='right')) - 1, start + 1)
+        chunks.append(text[start:end])
+        start = end
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class TokenBucket:
+    def __init__(self, tokens_per_minute):
+        self.capacity = float(tokens_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        # 超过桶容量的请求等桶满后放行，避免永远等待
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DeepSeekClient:
+    def __init__(self, url, model, api_key, prompt='', max_concurrency=4, timeout=(5, 120),
+                 max_retries=5, backoff=1.0, max_backoff=30.0, tokens_per_minute=None,
+                 session=None, cache=None, chunk_tokens=CHUNK_TOKENS):
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.prompt = prompt
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.cache = cache
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def _headers(self):
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = 'Bearer ' + self.api_key
+        return headers
+
+    def _delay(self, attempt, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        # 指数退避加抖动
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * (0.5 + random.random() / 2)
+
+    def complete(self, messages, **options):
+        payload = {'model': self.model, 'messages': messages}
+        payload.update(options)
+        if self.rate_limiter:
+            self.rate_limiter.acquire(sum(estimate_tokens(m['content']) for m in messages))
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                with self._slots:
+                    start = time.perf_counter()
+                    try:
+                        response = self.session.post(self.url, json=payload, headers=self._headers(),
+                                                     timeout=self.timeout)
+                    finally:
+                        metrics.REMOTE_SECONDS.observe(
+                            time.perf_counter() - start,
+                            status=response.status_code if response is not None else 'error')
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.json()['choices'][0]['message']['content']
+                error = 'HTTP %d' % response.status_code
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+            except (requests.HTTPError, ValueError, KeyError, IndexError) as e:
+                raise RemoteAnalysisError('远程分析失败: %s' % e)
+            if attempt < self.max_retries:
+                delay = self._delay(attempt, response)
+                logger.warning('远程分析请求失败（%s），%.1f 秒后重试', error, delay)
+                metrics.REMOTE_RETRIES.inc()
+                time.sleep(delay)
+        raise RemoteAnalysisError('远程分析重试 %d 次后仍失败: %s' % (self.max_retries, error))
+
+    def _request(self, content, note=''):
+        messages = [
+            {'role': 'system', 'content': SYSTEM_PROMPT},
+            {'role': 'user', 'content': '%s%s\n\n%s' % (note, self.prompt, content)},
+        ]
+        return parse_reply(self.complete(messages, response_format={'type': 'json_object'}))
+
+    def _analyze_chunk(self, chunk, index, count):
+        note = CHUNK_PROMPT % (index + 1, count) + '\n'
+        key = None
+        if self.cache:
+            key = cache_key(content_hash(chunk), 'deepseek-chunk', self.model,
+                            SYSTEM_PROMPT + note + self.prompt, REMOTE_ANALYZER_VERSION)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        result = build_result(self._request(chunk, note), {})
+        del result['metadata']
+        if key:
+            self.cache.put(key, result)
+        return result
+
+    def analyze_chunks(self, chunks):
+        # 各段并发请求，任一段失败则整份失败（调用方会退回本地模型）
+        if len(chunks) == 1:
+            return [self._analyze_chunk(chunks[0], 0, 1)]
+        with ThreadPoolExecutor(max_workers=min(len(chunks), self.max_concurrency)) as executor:
+            return list(executor.map(self._analyze_chunk, chunks, range(len(chunks)),
+                                     [len(chunks)] * len(chunks)))
+
+    def analyze(self, content, filename, local_analyzer):
+        digest = content_hash(content)
+        metadata = local_analyzer.extract_metadata(filename)
+        chunks = split_chunks(content, self.chunk_tokens)
+        key = None
+        if self.cache:
+            # 只有一段时与不分段的结果相同，沿用原来的缓存键
+            version = REMOTE_ANALYZER_VERSION if len(chunks) == 1 else '%s/%d' % (
+                REMOTE_ANALYZER_VERSION, self.chunk_tokens)
+            key = cache_key(digest, 'deepseek', self.model, SYSTEM_PROMPT + self.prompt, version)
+            cached = self.cache.get(key)
+            if cached is not None:
+                cached['metadata'] = metadata
+                return cached
+
+        if len(chunks) == 1:
+            result = build_result(self._request(content), metadata)
+        else:
+            result = merge_results(self.analyze_chunks(chunks),
+                                   [estimate_tokens(chunk) for chunk in chunks], metadata)
+        result['content_hash'] = digest
+        if key:
+            self.cache.put(key, {k: v for k, v in result.items() if k != 'metadata'})
+        return result
+
+    def analyze_many(self, items, local_analyzer):
+        # items: [(content, filename)]，按输入顺序返回结果或异常
+        def run(item):
+            # 请求层面的各种异常（URL 无效、传输中断、回复无法解码等）都交给调用方退回本地模型
+            try:
+                return self.analyze(item[0], item[1], local_analyzer)
+            except (RemoteAnalysisError, requests.RequestException, ValueError) as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(run, items))
+
+    def close(self):
+        self.session.close()
+
+
+def parse_reply(reply):
+    # 兼容模型把 JSON 包在 ``` 代码块里的情况
+    match = re.search(r'\{.*\}', reply, re.S)
+    if not match:
+        raise RemoteAnalysisError('远程分析结果不是 JSON')
+    try:
+        return json.loads(match.group())
+    except ValueError as e:
+        raise RemoteAnalysisError('远程分析结果无法解析: %s' % e)
+
+
+def _scores(value):
+    if not isinstance(value, dict):
+        return {}
+    scores = {}
+    for key, score in value.items():
+        try:
+            scores[key] = max(0.0, min(10.0, float(score)))
+        except (TypeError, ValueError):
+            continue
+    return scores
+
+
+def _items(value, text_key):
+    items = []
+    for item in value if isinstance(value, list) else []:
+        if isinstance(item, str):
+            item = {text_key: item}
+        if isinstance(item, dict) and item.get(text_key):
+            items.append(item)
+    return items
+
+
+def build_result(parsed, metadata):
+    # 远程结果整理成与 LocalMeetingAnalyzer.analyze 相同的结构
+    summary = parsed.get('summary') or []
+    if isinstance(summary, str):
+        summary = [summary]
+    return {
+        'metadata': metadata,
+        'summary': [str(s) for s in summary],
+        'action_items': _items(parsed.get('action_items'), 'description'),
+        'complaints': _items(parsed.get('complaints'), 'content'),
+        'gt_analysis': _scores(parsed.get('gt_analysis')),
+        'manager_analysis': _scores(parsed.get('manager_analysis')),
+        'analysis_method': 'deepseek',
+    }
+
+
+def _merge_items(partials, field, text_key):
+    # 按段的顺序拼接，同样内容的只保留第一条
+    items, seen = [], set()
+    for partial in partials:
+        for item in partial[field]:
+            text = ' '.join(str(item[text_key]).split())
+            if text not in seen:
+                seen.add(text)
+                items.append(item)
+    return items
+
+
+def _merge_scores(partials, field, weights):
+    # 各段按长度加权平均，某段没有给出的项不计入该项的权重
+    totals, sums = {}, {}
+    for partial, weight in zip(partials, weights):
+        for name, score in partial[field].items():
+            totals[name] = totals.get(name, 0.0) + weight
+            sums[name] = sums.get(name, 0.0) + score * weight
+    return {name: sums[name] / totals[name] for name in sums if totals[name] > 0}
+
+
+def merge_results(partials, weights, metadata):
+    # 各段的结果合并成一份；摘要先从均匀分布的几段里各取第一句，不够再依次补足
+    count = len(partials)
+    spread = sorted({round(i * (count - 1) / max(MAX_SUMMARY - 1, 1)) for i in range(MAX_SUMMARY)})
+    order = [(index, 0) for index in spread] + [
+        (index, position) for position in range(MAX_SUMMARY) for index in range(count)]
+    summary = []
+    for index, position in order:
+        sentences = partials[index]['summary']
+        if position < len(sentences) and sentences[position] not in summary:
+            summary.append(sentences[position])
+            if len(summary) >= MAX_SUMMARY:
+                break
+    return {
+        'metadata': metadata,
+        'summary': summary,
+        'action_items': _merge_items(partials, 'action_items', 'description'),
+        'complaints': _merge_items(partials, 'complaints', 'content'),
+        'gt_analysis': _merge_scores(partials, 'gt_analysis', weights),
+        'manager_analysis': _merge_scores(partials, 'manager_analysis', weights),
+        'analysis_method': 'deepseek',
+    }
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# 按内容寻址的分析结果缓存
+#
+# 键 = hash(转录内容, 分析方式, 模型, 提示词, 分析器版本)；
+# 内存层为 LRU，磁盘层按总大小淘汰最旧的文件。
+
+
+def content_hash(content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def cache_key(digest, method, model='', prompt='', version=''):
+    parts = json.dumps([digest, method, model or '', prompt or '', str(version)], ensure_ascii=False)
+    return hashlib.sha256(parts.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, folder, memory_items=256, max_disk_bytes=256 * 1024 * 1024):
+        self.folder = folder
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(folder, exist_ok=True)
+        self.disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], key + '.json')
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, st.st_mtime, st.st_size
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        # 内存里存的是 JSON 文本，每次取出都是新对象，调用方可以随意修改
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(data)
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, data)
+        return json.loads(data)
+
+    def put(self, key, result):
+        data = json.dumps(result, ensure_ascii=False)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        try:
+            old_size = os.path.getsize(path)
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._remember(key, data)
+            self.disk_bytes += os.path.getsize(path) - old_size
+            over = self.disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        # 淘汰到上限的 90%，避免每次写入都扫描目录
+        target = self.max_disk_bytes * 0.9
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            key = os.path.splitext(os.path.basename(path))[0]
+            with self._lock:
+                self._memory.pop(key, None)
+                self.evictions += 1
+        with self._lock:
+            self.disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'memory_items': len(self._memory),
+                'disk_bytes': self.disk_bytes,
+            }
@@ -0,0 +1,224 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import threading
+
+from analyzer import DefaultRoles
+from locks import atomic_write, file_lock
+from startup import lazy_import
+
+np = lazy_import('numpy')
+
+# 角色名册
+#
+# roles.csv 解析一次后缓存在内存，按文件修改时间和大小判断是否需要重读（其他进程的写入也能发现）；
+# 本进程写入后直接换上新的名册。名册和 DefaultRoles 的客户、主管合在一起，
+# 以关键词族的形式交给分析器的匹配器，入库时顺带解析发言人、负责人和客户。
+#
+# 写入在跨进程文件锁内“重读-修改-原子替换”；名册版本是文件内容的哈希，
+# 按下标编辑/删除时带上页面载入时的版本，期间被别人改过就拒绝，避免改错行或覆盖别人的修改。
+
+ROLE_FIELDS = ['company', 'name', 'title']
+
+# 关键词族名，和分析器自己的关键词族放进同一个匹配器
+STAFF_FAMILY = 'role:staff'
+CUSTOMER_FAMILY = 'role:customer'
+
+# 行首的“姓名：”发言人标记；纯数字（如时间 10:30）不算
+SPEAKER_PATTERN = re.compile(r'^[ \t　]*([^\s：:，,。！？!?]{1,24})[：:]', re.M)
+
+
+class RolesConflict(Exception):
+    pass
+
+
+def roles_version(data):
+    return hashlib.sha1(data).hexdigest()[:16] if data else ''
+
+
+def read_roles(path):
+    # 返回 (角色列表, 版本)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], ''
+    roles = []
+    for row in csv.DictReader(io.StringIO(data.decode('utf-8-sig'), newline='')):
+        role = {field: (row.get(field) or '').strip() for field in ROLE_FIELDS}
+        if role['name']:
+            roles.append(role)
+    return roles, roles_version(data)
+
+
+def write_roles(path, roles):
+    with atomic_write(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=ROLE_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for role in roles:
+            writer.writerow(role)
+
+
+def _is_word_char(char):
+    return char.isascii() and char.isalnum()
+
+
+class RoleDirectory:
+    # 某一时刻的名册快照，构建后只有发言人缓存会增长，可以在线程之间共享
+    def __init__(self, roles, defaults=None, version=''):
+        defaults = defaults or DefaultRoles()
+        self.version = version
+        self.roles = [dict(role) for role in roles]
+        customer_companies = {info['company'] for info in defaults.customers.values()}
+        # 姓名 -> 人员；名册里的设置优先于预设
+        people = {}
+        for name, info in defaults.managers.items():
+            people[name] = {'name': name, 'company': '', 'title': info['title'], 'customer': False}
+        for name, info in defaults.customers.items():
+            people[name] = {'name': name, 'company': info['company'], 'title': info['title'],
+                            'customer': True}
+        for role in self.roles:
+            people[role['name']] = dict(role, customer=role['company'] in customer_companies)
+        self.people = people
+
+        self.by_name = {role['name']: role for role in self.roles}
+        self.by_company = {}
+        for role in self.roles:
+            self.by_company.setdefault(role['company'], []).append(role)
+
+        # 客户公司名本身也能指认客户
+        self.aliases = dict(people)
+        for company in sorted(customer_companies):
+            self.aliases.setdefault(company, {'name': company, 'company': company, 'title': '',
+                                              'customer': True})
+        self._speakers = {}
+
+    def families(self):
+        return {
+            STAFF_FAMILY: sorted(k for k, p in self.aliases.items() if not p['customer']),
+            CUSTOMER_FAMILY: sorted(k for k, p in self.aliases.items() if p['customer']),
+        }
+
+    def speaker(self, label):
+        # 发言人标记 -> 人员；不在名册里的标记原样作为姓名。结果按标记缓存
+        person = self._speakers.get(label)
+        if person is None:
+            person = self.people.get(label)
+            if person is None:
+                # “Mark处长”之类：取标记里最长的已知姓名
+                known = [name for name in self.people if name in label]
+                person = (self.people[max(known, key=len)] if known else
+                          {'name': label, 'company': '', 'title': '', 'customer': False})
+            self._speakers[label] = person
+        return person
+
+    def resolve(self, scan, actions, complaints, speaker=None):
+        # 为一个文本块里的行动项目和抱怨找出负责人/客户，一次处理整个块的命中结果。
+        # speaker: 上一个块结束时的发言人；返回 (负责人列表, 客户列表, 本块结束时的发言人)
+        text = scan.text
+        labels = [(m.start(1), m.end(1), m.group(1)) for m in SPEAKER_PATTERN.finditer(text)
+                  if not m.group(1).isdigit()]
+        label_starts = np.array([start for start, _, _ in labels], dtype=np.int64)
+        label_ends = np.array([end for _, end, _ in labels], dtype=np.int64)
+
+        # 每句开头所在的发言人
+        owner = np.searchsorted(label_starts, scan.starts, side='right') - 1
+
+        # 句中点名的人：去掉落在发言人标记里的命中，以及英文名嵌在更长单词里的情况
+        matcher = scan.matcher
+        role_mask = matcher.mask(STAFF_FAMILY, CUSTOMER_FAMILY)
+        rows = np.flatnonzero(matcher.keyword_masks[scan.hit_keyword] & role_mask)
+        if len(rows) and len(labels):
+            positions = scan.hit_pos[rows]
+            j = np.searchsorted(label_starts, positions, side='right') - 1
+            inside = (j >= 0) & (positions < label_ends[np.maximum(j, 0)])
+            rows = rows[~inside]
+        mentions = {}
+        for row in rows:
+            keyword = matcher.keywords[scan.hit_keyword[row]]
+            start = int(scan.hit_pos[row])
+            end = start + len(keyword)
+            if _is_word_char(keyword[0]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(keyword[-1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            mentions.setdefault(int(scan.hit_sentence[row]), []).append(self.aliases[keyword])
+
+        def speaker_of(index):
+            j = owner[index]
+            return self.speaker(labels[j][2]) if j >= 0 else speaker
+
+        responsible = []
+        for index in actions:
+            named = [p for p in mentions.get(int(index), []) if not p['customer']]
+            person = named[0] if named else speaker_of(index)
+            responsible.append(person['name'] if person and not person['customer'] else None)
+        customers = []
+        for index in complaints:
+            named = [p for p in mentions.get(int(index), []) if p['customer']]
+            person = named[0] if named else speaker_of(index)
+            customers.append(person['company'] or person['name']
+                             if person and person['customer'] else None)
+
+        if labels:
+            speaker = self.speaker(labels[-1][2])
+        return responsible, customers, speaker
+
+
+class RolesRegistry:
+    def __init__(self, path, defaults=None):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.defaults = defaults or DefaultRoles()
+        self._lock = threading.Lock()
+        self._key = None
+        self._directory = None
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def directory(self):
+        key = self._stat_key()
+        with self._lock:
+            if self._directory is None or self._key != key:
+                roles, version = read_roles(self.path)
+                self._directory = RoleDirectory(roles, self.defaults, version)
+                self._key = key
+            return self._directory
+
+    def version(self):
+        return self.directory().version
+
+    def roles(self):
+        # 返回副本，调用方可以修改后再 save
+        return [dict(role) for role in self.directory().roles]
+
+    def by_name(self, name):
+        return self.directory().by_name.get(name)
+
+    def by_company(self, company):
+        return list(self.directory().by_company.get(company, []))
+
+    def update(self, change, expected_version=None):
+        # change(当前角色列表) -> 新列表，在锁内基于磁盘上的最新内容执行；
+        # expected_version 与当前版本不同时抛出 RolesConflict。返回新的名册快照
+        with self._lock, file_lock(self.lock_path):
+            roles, version = read_roles(self.path)
+            if expected_version is not None and expected_version != version:
+                raise RolesConflict('角色名册已被修改')
+            roles = change(roles)
+            write_roles(self.path, roles)
+            # 重读一遍得到与文件一致的版本号
+            roles, version = read_roles(self.path)
+            self._directory = RoleDirectory(roles, self.defaults, version)
+            self._key = self._stat_key()
+            return self._directory
+
+    def save(self, roles):
+        return self.update(lambda current: list(roles))
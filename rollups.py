@@ -0,0 +1,178 @@
+from collections import defaultdict
+from datetime import date
+
+from storage import SqliteDatabase
+
+# 趋势图用的时间序列汇总
+#
+# 每条分析入库时按日、按 ISO 周累加到桶里：会议数、行动项目数、抱怨数，
+# 每位负责人的行动项目数、每个客户的抱怨数，以及每位主管、每个 GT 类别的得分总和与次数（均值 = 总和 / 次数）。
+# 已汇总过的记录 id 单独记下，同一条记录不会重复累加，中断后可以补齐。
+# 记录原地改写（重新分析）后用 update 按新旧差值修正。
+
+ROLLUP_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS rollup_buckets (
+        period TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        key TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        score_sum REAL NOT NULL,
+        PRIMARY KEY (period, dimension, key, bucket)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS rollup_applied (
+        analysis_id INTEGER PRIMARY KEY
+    )''',
+]
+
+PERIODS = ('day', 'week')
+# 计数类维度（key 为空串表示全部）和打分类维度
+COUNT_DIMENSIONS = ('meetings', 'actions', 'complaints', 'responsible', 'customer')
+SCORE_DIMENSIONS = ('manager', 'gt')
+DIMENSIONS = COUNT_DIMENSIONS + SCORE_DIMENSIONS
+
+
+def buckets(date_text):
+    # '2024-01-03' -> {'day': '2024-01-03', 'week': '2024-W01'}；无法解析的日期不进入任何桶
+    try:
+        day = date.fromisoformat(date_text or '')
+    except ValueError:
+        return None
+    year, week, _ = day.isocalendar()
+    return {'day': day.isoformat(), 'week': '%04d-W%02d' % (year, week)}
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def contributions(record):
+    # 一条分析对各维度的贡献: [(维度, key, 次数, 分数)]
+    action_items = record.get('action_items') or []
+    complaints = record.get('complaints') or []
+    rows = [('meetings', '', 1, 0.0), ('actions', '', len(action_items), 0.0),
+            ('complaints', '', len(complaints), 0.0)]
+    for item in action_items:
+        if isinstance(item, dict) and item.get('responsible'):
+            rows.append(('responsible', str(item['responsible']), 1, 0.0))
+    for item in complaints:
+        customer = isinstance(item, dict) and (item.get('customer') or item.get('target'))
+        if customer:
+            rows.append(('customer', str(customer), 1, 0.0))
+    for dimension, key in (('manager', 'manager_analysis'), ('gt', 'gt_analysis')):
+        scores = record.get(key)
+        for name, score in (scores.items() if isinstance(scores, dict) else ()):
+            score = _number(score)
+            if score is not None:
+                rows.append((dimension, str(name), 1, score))
+    return rows
+
+
+def _accumulate(totals, record, sign):
+    keys = buckets((record.get('metadata') or {}).get('date'))
+    if keys is None:
+        return
+    for dimension, key, count, score in contributions(record):
+        if not count:
+            continue
+        for period in PERIODS:
+            entry = totals[(period, keys[period], dimension, key)]
+            entry[0] += sign * count
+            entry[1] += sign * score
+
+
+class RollupStore(SqliteDatabase):
+    def __init__(self, path):
+        SqliteDatabase.__init__(self, path)
+        with self._transaction() as conn:
+            for statement in ROLLUP_SCHEMA:
+                conn.execute(statement)
+
+    def add(self, records):
+        # 累加一批新入库的记录（需已有 id），已汇总过的跳过；返回实际汇总的条数
+        records = [r for r in records if r.get('id') is not None]
+        if not records:
+            return 0
+        with self._transaction() as conn:
+            ids = [r['id'] for r in records]
+            applied = set()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                applied.update(row[0] for row in conn.execute(
+                    'SELECT analysis_id FROM rollup_applied WHERE analysis_id IN (%s)'
+                    % ','.join('?' * len(chunk)), chunk))
+            totals = defaultdict(lambda: [0, 0.0])
+            added = []
+            for record in records:
+                if record['id'] in applied:
+                    continue
+                applied.add(record['id'])
+                added.append((record['id'],))
+                _accumulate(totals, record, 1)
+            self._apply(conn, totals)
+            conn.executemany('INSERT INTO rollup_applied (analysis_id) VALUES (?)', added)
+        return len(added)
+
+    def update(self, changes):
+        # changes: [(改写前的记录, 改写后的记录)]；已汇总过的记录按新旧差值修正，其余的留给 add；返回修正的条数
+        changes = [(old, new) for old, new in changes if old.get('id') is not None]
+        if not changes:
+            return 0
+        with self._transaction() as conn:
+            totals = defaultdict(lambda: [0, 0.0])
+            updated = 0
+            for old, new in changes:
+                if conn.execute('SELECT 1 FROM rollup_applied WHERE analysis_id = ?', (old['id'],)).fetchone():
+                    _accumulate(totals, old, -1)
+                    _accumulate(totals, new, 1)
+                    updated += 1
+            self._apply(conn, totals)
+            # 差值为零的桶删掉，和从未累加过一样
+            conn.execute('DELETE FROM rollup_buckets WHERE count = 0')
+        return updated
+
+    def _apply(self, conn, totals):
+        conn.executemany(
+            'INSERT INTO rollup_buckets (period, bucket, dimension, key, count, score_sum) '
+            'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (period, dimension, key, bucket) DO UPDATE SET '
+            'count = count + excluded.count, score_sum = score_sum + excluded.score_sum',
+            [bucket_key + tuple(values) for bucket_key, values in totals.items() if values != [0, 0.0]])
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM rollup_buckets')
+            conn.execute('DELETE FROM rollup_applied')
+
+    def applied_ids(self):
+        return {row[0] for row in self._conn().execute('SELECT analysis_id FROM rollup_applied')}
+
+    def keys(self, dimension):
+        rows = self._conn().execute(
+            "SELECT DISTINCT key FROM rollup_buckets WHERE period = 'day' AND dimension = ? ORDER BY key",
+            (dimension,))
+        return [row[0] for row in rows]
+
+    def series(self, dimension, period='week', keys=None, start=None, end=None):
+        # {key: [{'bucket', 'count', 'sum', 'mean'}, ...]}，桶按时间顺序；start/end 为桶名（含）
+        sql = 'SELECT key, bucket, count, score_sum FROM rollup_buckets WHERE period = ? AND dimension = ?'
+        params = [period, dimension]
+        if keys:
+            sql += ' AND key IN (%s)' % ','.join('?' * len(keys))
+            params.extend(keys)
+        if start:
+            sql += ' AND bucket >= ?'
+            params.append(start)
+        if end:
+            sql += ' AND bucket <= ?'
+            params.append(end)
+        result = {}
+        for row in self._conn().execute(sql + ' ORDER BY key, bucket', params):
+            point = {'bucket': row['bucket'], 'count': row['count']}
+            if dimension in SCORE_DIMENSIONS:
+                point['sum'] = round(row['score_sum'], 4)
+                point['mean'] = round(row['score_sum'] / row['count'], 4) if row['count'] else None
+            result.setdefault(row['key'], []).append(point)
+        return result
@@ -0,0 +1,335 @@
+import html
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+from startup import lazy_import
+from storage import SqliteDatabase
+from streaming import iter_sentences, iter_text
+
+jieba = lazy_import('jieba')
+np = lazy_import('numpy')
+
+# 会议全文检索
+#
+# jieba 分词后建倒排索引，持久化在 SQLite 中，每次入库增量追加：
+# 每批文档写成一个段，词项的段数超过上限时合并成一个；
+# 查询时把各段的 doc_id / 词频数组拼起来，用 BM25 向量化打分。
+# 文档重新索引时换一个新代号，旧代号的倒排项在查询时过滤、合并时清除。
+
+SEARCH_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS search_docs (
+        doc_id INTEGER PRIMARY KEY,
+        generation INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        sentences INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS search_postings (
+        term TEXT NOT NULL,
+        segment INTEGER NOT NULL,
+        doc_ids BLOB NOT NULL,
+        generations BLOB NOT NULL,
+        tfs BLOB NOT NULL,
+        PRIMARY KEY (term, segment)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS search_positions (
+        doc_id INTEGER NOT NULL,
+        term TEXT NOT NULL,
+        sentences TEXT NOT NULL,
+        PRIMARY KEY (doc_id, term)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS search_sentences (
+        doc_id INTEGER NOT NULL,
+        idx INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        PRIMARY KEY (doc_id, idx)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS search_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )''',
+]
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 词项的段数超过这个值时合并
+MAX_SEGMENTS = 16
+# 每个词项在一份文档里最多记录的句子位置，摘要片段只需要前几个
+MAX_POSITIONS = 32
+SNIPPET_CHARS = 120
+# SQLite 单条语句的参数个数上限以内
+SQL_BATCH = 500
+
+_WORD = re.compile(r'\w')
+
+
+def tokenize(text):
+    for token in jieba.cut_for_search(text):
+        token = token.strip().lower()
+        if token and _WORD.search(token):
+            yield token
+
+
+def document_sentences(record, upload_folder=None):
+    # 有原始转录时索引全文，否则退回到记录里的摘要、行动项目和抱怨
+    path = record.get('source_path')
+    if path and upload_folder and not os.path.isabs(path):
+        path = os.path.join(upload_folder, path)
+    if path and os.path.isfile(path):
+        with open(path, 'rb') as f:
+            yield from iter_sentences(iter_text(f, errors='replace'))
+        return
+    yield from record.get('summary') or []
+    for key, text_key in (('action_items', 'description'), ('complaints', 'content')):
+        for item in record.get(key) or []:
+            text = item.get(text_key) if isinstance(item, dict) else item
+            if text:
+                yield str(text)
+
+
+def _chunks(values, size=SQL_BATCH):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _window(text, terms, width=SNIPPET_CHARS):
+    # 过长的句子只截取第一个命中词附近的一段
+    if len(text) <= width:
+        return text
+    lowered = text.lower()
+    first = min((lowered.find(term) for term in terms if term in lowered), default=0)
+    start = max(0, min(first - width // 3, len(text) - width))
+    return ('…' if start else '') + text[start:start + width] + ('…' if start + width < len(text) else '')
+
+
+def highlight(text, terms):
+    # 先转义再用 <mark> 标出命中词
+    text = _window(text, terms)
+    if not terms:
+        return html.escape(text)
+    pattern = re.compile('|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.I)
+    parts, last = [], 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append('<mark>%s</mark>' % html.escape(match.group()))
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return ''.join(parts)
+
+
+class _LiveDocs:
+    # 每个 doc_id 当前有效的代号和长度，按 doc_id 下标存放便于向量化过滤
+    def __init__(self, rows):
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        size = int(ids.max()) + 1 if len(ids) else 0
+        self.generations = np.full(size, -1, dtype=np.int64)
+        self.lengths = np.zeros(size, dtype=np.float64)
+        self.generations[ids] = [row[1] for row in rows]
+        self.lengths[ids] = [row[2] for row in rows]
+        self.count = len(ids)
+        self.avg_length = float(self.lengths[ids].mean()) if len(ids) else 0.0
+
+    def filter(self, doc_ids, generations):
+        known = doc_ids < len(self.generations)
+        live = np.zeros(len(doc_ids), dtype=bool)
+        live[known] = self.generations[doc_ids[known]] == generations[known]
+        return live
+
+
+class SearchIndex(SqliteDatabase):
+    def __init__(self, path):
+        SqliteDatabase.__init__(self, path)
+        with self._transaction() as conn:
+            for statement in SEARCH_SCHEMA:
+                conn.execute(statement)
+        self._lock = threading.Lock()
+        self._live = None
+        self._live_version = None
+
+    def _meta(self, conn, key):
+        row = conn.execute('SELECT value FROM search_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _increment(self, conn, key):
+        conn.execute('INSERT INTO search_meta (key, value) VALUES (?, 1) '
+                     'ON CONFLICT(key) DO UPDATE SET value = value + 1', (key,))
+        return self._meta(conn, key)
+
+    def version(self):
+        return self._meta(self._conn(), 'version')
+
+    def _live_docs(self, conn=None):
+        conn = conn or self._conn()
+        version = self._meta(conn, 'version')
+        with self._lock:
+            if self._live is None or self._live_version != version:
+                rows = conn.execute('SELECT doc_id, generation, length FROM search_docs').fetchall()
+                self._live = _LiveDocs(rows)
+                self._live_version = version
+            return self._live
+
+    def _prepare(self, doc_id, sentences):
+        # 分词在事务之外完成，避免长时间占用写锁
+        tf, positions, texts, length = Counter(), defaultdict(list), [], 0
+        for idx, sentence in enumerate(sentences):
+            texts.append((doc_id, idx, sentence))
+            for token in tokenize(sentence):
+                tf[token] += 1
+                length += 1
+                seen = positions[token]
+                if len(seen) < MAX_POSITIONS and (not seen or seen[-1] != idx):
+                    seen.append(idx)
+        return doc_id, tf, positions, texts, length
+
+    def add(self, documents):
+        # documents: [(doc_id, 句子序列)]；同一 doc_id 再次加入时替换旧内容
+        prepared = [self._prepare(doc_id, sentences) for doc_id, sentences in documents]
+        if not prepared:
+            return 0
+        with self._transaction() as conn:
+            segment = self._increment(conn, 'segment')
+            postings = defaultdict(lambda: ([], []))
+            for doc_id, tf, positions, texts, length in prepared:
+                self._delete_doc(conn, doc_id)
+                conn.execute('INSERT INTO search_docs (doc_id, generation, length, sentences) '
+                             'VALUES (?, ?, ?, ?)', (doc_id, segment, length, len(texts)))
+                conn.executemany('INSERT INTO search_sentences (doc_id, idx, text) VALUES (?, ?, ?)',
+                                 texts)
+                conn.executemany(
+                    'INSERT INTO search_positions (doc_id, term, sentences) VALUES (?, ?, ?)',
+                    [(doc_id, term, json.dumps(idxs)) for term, idxs in positions.items()])
+                for term, count in tf.items():
+                    postings[term][0].append(doc_id)
+                    postings[term][1].append(count)
+            conn.executemany(
+                'INSERT INTO search_postings (term, segment, doc_ids, generations, tfs) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(term, segment, np.array(ids, dtype=np.int64).tobytes(),
+                  np.full(len(ids), segment, dtype=np.int64).tobytes(),
+                  np.array(tfs, dtype=np.int32).tobytes())
+                 for term, (ids, tfs) in postings.items()])
+            self._increment(conn, 'version')
+            self._merge(conn, postings)
+        return len(prepared)
+
+    def _merge(self, conn, terms):
+        crowded = []
+        for chunk in _chunks(terms):
+            crowded.extend(row[0] for row in conn.execute(
+                'SELECT term FROM search_postings WHERE term IN (%s) GROUP BY term HAVING COUNT(*) > ?'
+                % ', '.join('?' * len(chunk)), chunk + [MAX_SEGMENTS]))
+        if not crowded:
+            return
+        live = self._live_docs(conn)
+        segment = self._increment(conn, 'segment')
+        for term in crowded:
+            doc_ids, generations, tfs = self._postings(conn, term)
+            keep = live.filter(doc_ids, generations)
+            conn.execute('DELETE FROM search_postings WHERE term = ?', (term,))
+            if keep.any():
+                conn.execute(
+                    'INSERT INTO search_postings (term, segment, doc_ids, generations, tfs) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (term, segment, doc_ids[keep].tobytes(), generations[keep].tobytes(),
+                     tfs[keep].tobytes()))
+
+    def _postings(self, conn, term):
+        rows = conn.execute('SELECT doc_ids, generations, tfs FROM search_postings WHERE term = ?',
+                            (term,)).fetchall()
+        if not rows:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                    np.zeros(0, dtype=np.int32))
+        return tuple(np.concatenate([np.frombuffer(row[i], dtype=dtype) for row in rows])
+                     for i, dtype in enumerate((np.int64, np.int64, np.int32)))
+
+    def _delete_doc(self, conn, doc_id):
+        # 旧的倒排项留在段里，代号对不上即视为失效
+        conn.execute('DELETE FROM search_docs WHERE doc_id = ?', (doc_id,))
+        conn.execute('DELETE FROM search_sentences WHERE doc_id = ?', (doc_id,))
+        conn.execute('DELETE FROM search_positions WHERE doc_id = ?', (doc_id,))
+
+    def remove(self, doc_ids):
+        with self._transaction() as conn:
+            for doc_id in doc_ids:
+                self._delete_doc(conn, doc_id)
+            self._increment(conn, 'version')
+
+    def clear(self):
+        with self._transaction() as conn:
+            for table in ('search_docs', 'search_postings', 'search_positions', 'search_sentences'):
+                conn.execute('DELETE FROM %s' % table)
+            self._increment(conn, 'version')
+
+    def indexed_ids(self):
+        return {row[0] for row in self._conn().execute('SELECT doc_id FROM search_docs')}
+
+    def search(self, query, limit=10, offset=0):
+        # 返回 {'terms': 查询词, 'total': 命中文档数, 'hits': [{'id', 'score', 'snippets'}]}
+        terms = list(dict.fromkeys(tokenize(query or '')))
+        conn = self._conn()
+        live = self._live_docs(conn)
+        result = {'terms': terms, 'total': 0, 'hits': []}
+        if not terms or not live.count:
+            return result
+
+        ids_parts, score_parts = [], []
+        for term in terms:
+            doc_ids, generations, tfs = self._postings(conn, term)
+            keep = live.filter(doc_ids, generations)
+            doc_ids, tfs = doc_ids[keep], tfs[keep].astype(np.float64)
+            if not len(doc_ids):
+                continue
+            idf = math.log(1.0 + (live.count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * live.lengths[doc_ids] / max(live.avg_length, 1.0))
+            ids_parts.append(doc_ids)
+            score_parts.append(idf * tfs * (BM25_K1 + 1.0) / (tfs + norm))
+        if not ids_parts:
+            return result
+
+        doc_ids, inverse = np.unique(np.concatenate(ids_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        result['total'] = len(doc_ids)
+        wanted = min(offset + limit, len(doc_ids))
+        if wanted <= offset:
+            return result
+        top = np.argpartition(-scores, wanted - 1)[:wanted] if wanted < len(doc_ids) else np.arange(len(doc_ids))
+        top = top[np.lexsort((doc_ids[top], -scores[top]))][offset:]
+        for i in top:
+            doc_id = int(doc_ids[i])
+            result['hits'].append({'id': doc_id, 'score': round(float(scores[i]), 4),
+                                   'snippets': self.snippets(doc_id, terms)})
+        return result
+
+    def snippets(self, doc_id, terms, max_snippets=2):
+        # 优先选命中查询词最多的句子，按原文顺序返回
+        conn = self._conn()
+        counts = Counter()
+        for chunk in _chunks(terms):
+            for row in conn.execute(
+                    'SELECT sentences FROM search_positions WHERE doc_id = ? AND term IN (%s)'
+                    % ', '.join('?' * len(chunk)), [doc_id] + chunk):
+                counts.update(json.loads(row[0]))
+        # 多取几句候选，转录里重复的句子只保留一次
+        candidates = sorted(counts, key=lambda idx: (-counts[idx], idx))[:max_snippets * 4]
+        if not candidates:
+            return []
+        texts = dict(conn.execute(
+            'SELECT idx, text FROM search_sentences WHERE doc_id = ? AND idx IN (%s)'
+            % ', '.join('?' * len(candidates)), [doc_id] + candidates).fetchall())
+        chosen, seen = [], set()
+        for idx in candidates:
+            if idx in texts and texts[idx] not in seen and len(chosen) < max_snippets:
+                seen.add(texts[idx])
+                chosen.append(idx)
+        return [{'sentence': idx, 'html': highlight(texts[idx], terms)} for idx in sorted(chosen)]
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            'docs': conn.execute('SELECT COUNT(*) FROM search_docs').fetchone()[0],
+            'segments': conn.execute('SELECT COUNT(*) FROM search_postings').fetchone()[0],
+        }
@@ -0,0 +1,116 @@
+import gc
+import importlib
+import logging
+import marshal
+import mmap
+import os
+import sys
+import time
+import types
+
+logger = logging.getLogger(__name__)
+
+# 启动加速
+#
+# 重模块（jieba、numpy、requests）延迟到第一次使用时才真正导入；
+# jieba 的前缀词典预先序列化到 DATA_FOLDER，启动时通过 mmap 直接载入；
+# gunicorn 主进程在 fork 前完成预热并冻结 GC，工作进程以写时复制方式共享这些页面。
+
+JIEBA_CACHE_NAME = 'jieba.dict.cache'
+# 缓存格式变化时递增，旧缓存自动重建
+JIEBA_CACHE_FORMAT = 1
+
+# 各阶段耗时（毫秒），在健康检查页显示
+TIMINGS = {}
+
+
+def record_timing(name, seconds):
+    TIMINGS[name] = round(seconds * 1000, 1)
+    logger.info('启动耗时 %s: %.1f ms', name, seconds * 1000)
+
+
+class LazyModule(types.ModuleType):
+    # 第一次访问属性时才导入；importlib 的模块锁保证多个线程同时触发时只导入一次
+    def __init__(self, name):
+        types.ModuleType.__init__(self, name)
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+def lazy_import(name):
+    # 已经导入过的模块直接返回，否则返回一个延迟导入的代理
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def realize(*names):
+    # 让延迟导入的模块真正加载，预热时在 fork 之前调用
+    for name in names:
+        importlib.import_module(name)
+
+
+def _dictionary_key(jieba, tokenizer):
+    path = tokenizer.dictionary or os.path.join(os.path.dirname(jieba.__file__), jieba.DEFAULT_DICT_NAME)
+    st = os.stat(path)
+    return [JIEBA_CACHE_FORMAT, jieba.__version__, os.path.abspath(path), st.st_size, st.st_mtime_ns]
+
+
+def build_jieba_cache(path):
+    # 从词典文本生成前缀词典并原子地写入缓存
+    jieba = lazy_import('jieba')
+    tokenizer = jieba.dt
+    freq, total = tokenizer.gen_pfdict(tokenizer.get_dict_file())
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        marshal.dump((_dictionary_key(jieba, tokenizer), freq, total), f)
+    os.replace(tmp_path, path)
+    return freq, total
+
+
+def _read_jieba_cache(path, key):
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            cached_key, freq, total = marshal.loads(mm)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    return (freq, total) if cached_key == key else None
+
+
+def load_jieba(cache_path):
+    # 用预先生成的缓存初始化全局分词器；缓存缺失或词典变化时重建。已初始化时直接返回
+    jieba = lazy_import('jieba')
+    tokenizer = jieba.dt
+    if tokenizer.initialized:
+        return False
+    start = time.perf_counter()
+    loaded = _read_jieba_cache(cache_path, _dictionary_key(jieba, tokenizer))
+    if loaded is None:
+        logger.info('生成 jieba 词典缓存: %s', cache_path)
+        loaded = build_jieba_cache(cache_path)
+    with tokenizer.lock:
+        if not tokenizer.initialized:
+            tokenizer.FREQ, tokenizer.total = loaded
+            tokenizer.initialized = True
+    record_timing('jieba_load_ms', time.perf_counter() - start)
+    return True
+
+
+def warm_up(data_folder, freeze=True):
+    # 载入词典、构建关键词匹配器并跑一遍分析，之后的请求不再付出首次开销
+    start = time.perf_counter()
+    load_jieba(os.path.join(data_folder, JIEBA_CACHE_NAME))
+    realize('numpy', 'requests')
+    from analyzer import LocalMeetingAnalyzer
+    LocalMeetingAnalyzer().analyze('预热一下。需要跟进！', 'warmup_20240101_000000.txt')
+    if freeze:
+        # 预热产生的对象移出 GC 跟踪，避免工作进程里的回收触碰共享页面
+        gc.collect()
+        gc.freeze()
+    record_timing('warm_up_ms', time.perf_counter() - start)
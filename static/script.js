@@ -1,3 +1,18 @@
+// 輪詢分析任務進度，直到完成
+async function pollJob(statusUrl, onProgress) {
+    while (true) {
+        const response = await fetch(statusUrl, {headers: {'Accept': 'application/json'}});
+        const job = await response.json();
+        if (onProgress) {
+            onProgress(job);
+        }
+        if (job.status !== 'queued' && job.status !== 'running') {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // 文件上傳處理
 document.addEventListener('DOMContentLoaded', function() {
     // 文件上傳表單處理
@@ -8,10 +23,14 @@ document.addEventListener('DOMContentLoaded', function() {
             const formData = new FormData(this);
             const response = await fetch('/upload', {
                 method: 'POST',
+                headers: {'Accept': 'application/json'},
                 body: formData
             });
             const result = await response.json();
-            // 處理上傳結果
+            // 上傳立即返回任務編號，之後輪詢進度
+            if (result.status_url) {
+                await pollJob(result.status_url, job => console.log('分析進度', job.done + job.failed, '/', job.total));
+            }
         });
     }
 
@@ -24,7 +43,7 @@ document.addEventListener('DOMContentLoaded', function() {
             
             const response = await fetch('/analyze', {
                 method: 'POST',
-                headers: {'Content-Type': 'application/json'},
+                headers: {'Content-Type': 'application/json', 'Accept': 'application/json'},
                 body: JSON.stringify({
                     filenames: selectedFiles,
                     analysis_method: analysisMethod
@@ -32,6 +51,9 @@ document.addEventListener('DOMContentLoaded', function() {
             });
             const result = await response.json();
             // 處理分析結果
+            if (result.status_url) {
+                await pollJob(result.status_url, job => console.log('分析進度', job.done + job.failed, '/', job.total));
+            }
         });
     }
 });
\ No newline at end of file
@@ -0,0 +1,924 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import metrics
+from locks import atomic_write, file_lock
+
+# 分析结果存储引擎
+#
+# 所有后端都实现 iter_all / append_many / update_many / replace_all，
+# 查询方法在基类里给出逐条扫描的通用实现，SQLite 后端用索引覆盖它们。
+# append_unique 按内容哈希和分析方式查重后写入，JSON 和 SQLite 后端在同一把文件锁/同一个事务里完成。
+
+
+def _metadata(record):
+    metadata = record.get('metadata') or {}
+    return {
+        'date': metadata.get('date'),
+        'time': metadata.get('time'),
+        'topic': metadata.get('topic'),
+        'filename': metadata.get('filename'),
+    }
+
+
+# 单条记录对仪表板统计的贡献，写入时累加，不必每次请求重新遍历
+STAT_KEYS = ('meetings', 'actions', 'complaints', 'completed', 'pending')
+
+
+def action_status(item):
+    # 有截止时间的工作事项视为进行中，其余按已完成统计
+    return 'pending' if isinstance(item, dict) and item.get('deadline') else 'completed'
+
+
+def record_stats(record):
+    action_items = record.get('action_items') or []
+    pending = sum(1 for item in action_items if action_status(item) == 'pending')
+    return {
+        'meetings': 1,
+        'actions': len(action_items),
+        'complaints': len(record.get('complaints') or []),
+        'completed': len(action_items) - pending,
+        'pending': pending,
+    }
+
+
+# 列表页的工作事项 / 客户抱怨：每条一行，带上所属会议的可筛选字段
+ITEM_KINDS = {'action': 'action_items', 'complaint': 'complaints'}
+
+
+def item_rows(record):
+    meta = _metadata(record)
+    for kind, key in ITEM_KINDS.items():
+        for idx, item in enumerate(record.get(key) or []):
+            fields = item if isinstance(item, dict) else {}
+            yield {
+                'kind': kind,
+                'idx': idx,
+                'analysis_id': record.get('id'),
+                'date': meta['date'],
+                'time': meta['time'],
+                'topic': meta['topic'],
+                'method': record.get('analysis_method'),
+                'responsible': fields.get('responsible'),
+                'deadline': fields.get('deadline'),
+                'status': action_status(item) if kind == 'action' else None,
+                'item': item,
+            }
+
+
+def _matches(row, date_from=None, date_to=None, topic=None, method=None,
+             responsible=None, status=None):
+    # row: item_rows 产出的行，或 _metadata 加上 method 的会议行
+    if date_from and (row['date'] or '') < date_from:
+        return False
+    if date_to and (row['date'] or '') > date_to:
+        return False
+    if topic and row['topic'] != topic:
+        return False
+    if method and row['method'] != method:
+        return False
+    if responsible and row.get('responsible') != responsible:
+        return False
+    if status and row.get('status') != status:
+        return False
+    return True
+
+
+def _meeting_row(record):
+    row = _metadata(record)
+    row['method'] = record.get('analysis_method')
+    return row
+
+
+# 列表排序：名称 -> (SQL 排序子句, 通用实现里的排序键与是否倒序)
+SORTS = {
+    'newest': ('id DESC', None, True),
+    'oldest': ('id', None, False),
+    'date_desc': ("COALESCE(date, '') DESC, COALESCE(time, '') DESC, id DESC",
+                  lambda row: (row['date'] or '', row['time'] or ''), True),
+    'date_asc': ("COALESCE(date, ''), COALESCE(time, ''), id",
+                 lambda row: (row['date'] or '', row['time'] or ''), False),
+}
+
+
+def _sorted(rows, sort):
+    _, key, reverse = SORTS[sort]
+    if key is None:
+        return rows[::-1] if reverse else rows
+    return sorted(rows, key=key, reverse=reverse)
+
+
+def _page(rows, limit, offset):
+    end = offset + limit if limit is not None else None
+    return rows[offset:end]
+
+
+class AnalysisStore:
+    # 指标里的后端标签
+    name = None
+
+    def iter_all(self):
+        raise NotImplementedError
+
+    def append_many(self, records):
+        raise NotImplementedError
+
+    def replace_all(self, records):
+        raise NotImplementedError
+
+    def update_many(self, records):
+        # 按 id 原地改写记录，rev 随之递增（页面卡片缓存据此失效）；返回实际更新的条数
+        raise NotImplementedError
+
+    def append(self, record):
+        return self.append_many([record])[0]
+
+    def append_versioned(self, records):
+        # 返回 (记录, 写入前版本, 写入后版本)。后端在同一把锁/同一个事务里读出两个版本，
+        # 两者之间只有这一次写入，进程内缓存据此判断能否直接追加
+        return self.append_many(records), None, None
+
+    def append_unique(self, record):
+        # 同一内容、同一分析方式已有记录时返回 (已有记录, True)，否则写入并返回 (记录, False)
+        record, duplicate, _, _ = self.append_unique_versioned(record)
+        return record, duplicate
+
+    def append_unique_versioned(self, record):
+        # 查重和写入须在同一把锁/同一个事务里完成，多个进程同时写入同一份转录时只留一条
+        stored, duplicates, before, after = self.append_many_unique_versioned([record])
+        if duplicates:
+            return duplicates[0][1], True, before, after
+        return stored[0], False, before, after
+
+    def append_many_unique(self, records):
+        # 批量版 append_unique：返回 (写入的记录, [(未写入的记录, 已有记录)])
+        stored, duplicates, _, _ = self.append_many_unique_versioned(records)
+        return stored, duplicates
+
+    def append_many_unique_versioned(self, records):
+        stored, duplicates = [], []
+        for record in records:
+            existing = self.find_by_content(record.get('content_hash'), record['analysis_method'])
+            if existing:
+                duplicates.append((record, existing))
+            else:
+                stored.append(self.append(record))
+        return stored, duplicates, None, None
+
+    def content_keys(self):
+        # 已入库的 (content_hash, analysis_method) 集合，批量导入开始前载入一次用来查重
+        return {(r['content_hash'], r.get('analysis_method')) for r in self.iter_all()
+                if r.get('content_hash')}
+
+    def load_all(self):
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='load_all'):
+            return list(self.iter_all())
+
+    def version(self):
+        raise NotImplementedError
+
+    def modified(self):
+        # 最后一次写入的时间（Unix 秒），未知时为 None
+        return None
+
+    def stats(self):
+        totals = dict.fromkeys(STAT_KEYS, 0)
+        for record in self.iter_all():
+            for key, value in record_stats(record).items():
+                totals[key] += value
+        return totals
+
+    def count(self):
+        return sum(1 for _ in self.iter_all())
+
+    def get_many(self, ids):
+        # 按 id 取记录，返回 {id: 记录}
+        wanted = set(ids)
+        return {r['id']: r for r in self.iter_all() if r.get('id') in wanted}
+
+    def find_by_content(self, digest, method=None):
+        for record in self.iter_all():
+            if record.get('content_hash') == digest and (
+                    not method or record.get('analysis_method') == method):
+                return record
+        return None
+
+    def recent(self, limit):
+        records = self.load_all()
+        return records[-limit:] if limit else []
+
+    def query(self, date_from=None, date_to=None, topic=None, method=None,
+              limit=None, offset=0, newest_first=False, sort=None):
+        rows = [dict(_meeting_row(r), record=r) for r in self.iter_all()]
+        rows = [row for row in rows if _matches(row, date_from, date_to, topic, method)]
+        rows = _sorted(rows, sort or ('newest' if newest_first else 'oldest'))
+        return [row['record'] for row in _page(rows, limit, offset)]
+
+    def count_matching(self, date_from=None, date_to=None, topic=None, method=None):
+        return sum(1 for r in self.iter_all()
+                   if _matches(_meeting_row(r), date_from, date_to, topic, method))
+
+    def iter_matching(self, date_from=None, date_to=None, topic=None, method=None):
+        # 按 id 顺序逐条产出符合条件的记录，供导出流式使用
+        for record in self.iter_all():
+            if _matches(_meeting_row(record), date_from, date_to, topic, method):
+                yield record
+
+    def iter_items(self, kind):
+        for record in self.iter_all():
+            for row in item_rows(record):
+                if row['kind'] == kind:
+                    yield row
+
+    def query_items(self, kind, limit=None, offset=0, sort='newest', **filters):
+        rows = [row for row in self.iter_items(kind) if _matches(row, **filters)]
+        return _page(_sorted(rows, sort), limit, offset)
+
+    def item_totals(self, kind, **filters):
+        totals = {'total': 0, 'pending': 0, 'completed': 0}
+        for row in self.iter_items(kind):
+            if _matches(row, **filters):
+                totals['total'] += 1
+                if row['status']:
+                    totals[row['status']] += 1
+        return totals
+
+    def topics(self):
+        return sorted({r['topic'] for r in map(_metadata, self.iter_all()) if r['topic']})
+
+    def responsibles(self, kind='action'):
+        return sorted({row['responsible'] for row in self.iter_items(kind) if row['responsible']})
+
+    def close(self):
+        pass
+
+
+# 兼容旧版的 analyses.json 整档存储，每次写入都会重写整个文件。
+# 读-改-写在跨进程文件锁内完成，新文件写好后 rename 覆盖，多个工作进程同时写入不会丢记录
+class JsonAnalysisStore(AnalysisStore):
+    name = 'json'
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+
+    def iter_all(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                metrics.STORE_READ_BYTES.inc(os.fstat(f.fileno()).st_size, backend=self.name)
+                return iter(json.load(f))
+        return iter([])
+
+    def append_many(self, records):
+        return self.append_versioned(records)[0]
+
+    def append_versioned(self, records):
+        records = list(records)
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='append_many'), \
+                file_lock(self.lock_path):
+            before = self.version()
+            analyses = list(self.iter_all())
+            # 与 SQLite 后端一样给新记录分配递增 id，检索索引按 id 引用记录
+            next_id = max([r.get('id') or 0 for r in analyses] + [0]) + 1
+            for offset, record in enumerate(records):
+                record['id'] = next_id + offset
+            analyses.extend(records)
+            self._write(analyses)
+            after = self.version()
+        return records, before, after
+
+    def append_many_unique_versioned(self, records):
+        stored, duplicates = [], []
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='append_many'), \
+                file_lock(self.lock_path):
+            before = self.version()
+            analyses = list(self.iter_all())
+            existing = {(r['content_hash'], r.get('analysis_method')): r for r in analyses
+                        if r.get('content_hash')}
+            next_id = max([r.get('id') or 0 for r in analyses] + [0]) + 1
+            for record in records:
+                key = (record.get('content_hash'), record['analysis_method'])
+                if key in existing:
+                    duplicates.append((record, existing[key]))
+                    continue
+                record['id'] = next_id + len(stored)
+                if key[0]:
+                    existing[key] = record
+                stored.append(record)
+            if not stored:
+                return stored, duplicates, before, before
+            analyses.extend(stored)
+            self._write(analyses)
+            after = self.version()
+        return stored, duplicates, before, after
+
+    def replace_all(self, records):
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='replace_all'), \
+                file_lock(self.lock_path):
+            self._write(records)
+
+    def update_many(self, records):
+        changes = {record['id']: record for record in records}
+        updated = 0
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='update_many'), \
+                file_lock(self.lock_path):
+            analyses = list(self.iter_all())
+            for i, current in enumerate(analyses):
+                record = changes.get(current.get('id'))
+                if record is not None:
+                    record['rev'] = current.get('rev', 0) + 1
+                    analyses[i] = record
+                    updated += 1
+            if updated:
+                self._write(analyses)
+        return updated
+
+    def _write(self, records):
+        with atomic_write(self.path, 'w', encoding='utf-8') as f:
+            json.dump(list(records), f, ensure_ascii=False, indent=4)
+            metrics.STORE_WRITE_BYTES.inc(f.tell(), backend=self.name)
+
+    def version(self):
+        # 文件没有版本号，用修改时间和大小判断是否变化
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (st.st_mtime_ns, st.st_size)
+
+    def modified(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS analyses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT,
+        time TEXT,
+        topic TEXT,
+        filename TEXT,
+        method TEXT,
+        created_at TEXT NOT NULL,
+        action_count INTEGER NOT NULL DEFAULT 0,
+        complaint_count INTEGER NOT NULL DEFAULT 0,
+        pending_count INTEGER NOT NULL DEFAULT 0,
+        content_hash TEXT,
+        data TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS analysis_items (
+        analysis_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        date TEXT,
+        time TEXT,
+        topic TEXT,
+        method TEXT,
+        responsible TEXT,
+        deadline TEXT,
+        status TEXT,
+        data TEXT NOT NULL,
+        PRIMARY KEY (analysis_id, kind, idx)
+    )''',
+]
+
+# 旧版数据库缺少的列，打开时补齐并从 data 回填
+UPGRADE_COLUMNS = {
+    'analyses': [
+        ('action_count', 'INTEGER NOT NULL DEFAULT 0'),
+        ('complaint_count', 'INTEGER NOT NULL DEFAULT 0'),
+        ('pending_count', 'INTEGER NOT NULL DEFAULT 0'),
+        ('content_hash', 'TEXT'),
+    ],
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_analyses_date ON analyses(date, time)',
+    'CREATE INDEX IF NOT EXISTS idx_analyses_topic ON analyses(topic)',
+    'CREATE INDEX IF NOT EXISTS idx_analyses_method ON analyses(method)',
+    'CREATE INDEX IF NOT EXISTS idx_analyses_content ON analyses(content_hash, method)',
+    'CREATE INDEX IF NOT EXISTS idx_items_kind ON analysis_items(kind, analysis_id)',
+    'CREATE INDEX IF NOT EXISTS idx_items_date ON analysis_items(kind, date, time)',
+    'CREATE INDEX IF NOT EXISTS idx_items_responsible ON analysis_items(kind, responsible)',
+    'CREATE INDEX IF NOT EXISTS idx_items_status ON analysis_items(kind, status)',
+]
+
+ITEM_COLUMNS = ('analysis_id', 'kind', 'idx', 'date', 'time', 'topic', 'method',
+                'responsible', 'deadline', 'status')
+
+
+def _where(filters):
+    clauses, params = [], []
+    for name, value in filters.items():
+        if not value:
+            continue
+        if name == 'date_from':
+            clauses.append('date >= ?')
+        elif name == 'date_to':
+            clauses.append('date <= ?')
+        else:
+            clauses.append('%s = ?' % name)
+        params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def _columns(record):
+    # 从记录推导出的可索引列
+    meta = _metadata(record)
+    stats = record_stats(record)
+    return {
+        'date': meta['date'],
+        'time': meta['time'],
+        'topic': meta['topic'],
+        'filename': meta['filename'],
+        'method': record.get('analysis_method'),
+        'action_count': stats['actions'],
+        'complaint_count': stats['complaints'],
+        'pending_count': stats['pending'],
+        'content_hash': record.get('content_hash'),
+    }
+
+
+# SQLite 连接管理：每个线程、每个进程各自持有连接，fork 之后不复用父进程的连接
+class SqliteDatabase:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# SQLite 存储：追加只插入新行，日期/主题/分析方式/新旧顺序都走索引
+class SqliteAnalysisStore(SqliteDatabase, AnalysisStore):
+    name = 'sqlite'
+
+    def __init__(self, path):
+        SqliteDatabase.__init__(self, path)
+        with self._transaction() as conn:
+            tables = {row['name'] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._upgrade(conn, tables)
+            for statement in INDEXES:
+                conn.execute(statement)
+
+    def _upgrade(self, conn, tables):
+        if 'analyses' in tables and 'analysis_items' not in tables:
+            for row in conn.execute('SELECT id, data FROM analyses').fetchall():
+                self._insert_items(conn, self._row_to_record(row))
+        added = False
+        for table, columns in UPGRADE_COLUMNS.items():
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(%s)' % table)}
+            for name, ddl in columns:
+                if name not in existing:
+                    conn.execute('ALTER TABLE %s ADD COLUMN %s %s' % (table, name, ddl))
+                    added = True
+        if added:
+            for row in conn.execute('SELECT id, data FROM analyses').fetchall():
+                columns = _columns(json.loads(row['data']))
+                conn.execute(
+                    'UPDATE analyses SET %s WHERE id = ?' % ', '.join('%s = ?' % c for c in columns),
+                    list(columns.values()) + [row['id']])
+        if added or conn.execute("SELECT 1 FROM meta WHERE key = 'meetings'").fetchone() is None:
+            self._rebuild_stats(conn)
+
+    def _row_to_record(self, row):
+        record = json.loads(row['data'])
+        record['id'] = row['id']
+        return record
+
+    def _insert(self, conn, record, totals):
+        # 返回写入的 data 字节数
+        columns = _columns(record)
+        columns['created_at'] = datetime.now().isoformat(timespec='seconds')
+        columns['data'] = json.dumps({k: v for k, v in record.items() if k != 'id'},
+                                     ensure_ascii=False)
+        cursor = conn.execute(
+            'INSERT INTO analyses (%s) VALUES (%s)' % (
+                ', '.join(columns), ', '.join('?' * len(columns))),
+            list(columns.values()))
+        record['id'] = cursor.lastrowid
+        self._insert_items(conn, record)
+        for key, value in record_stats(record).items():
+            totals[key] += value
+        return len(columns['data'].encode('utf-8'))
+
+    def _insert_items(self, conn, record):
+        conn.executemany(
+            'INSERT INTO analysis_items (%s, data) VALUES (%s)' % (
+                ', '.join(ITEM_COLUMNS), ', '.join('?' * (len(ITEM_COLUMNS) + 1))),
+            [[row[c] for c in ITEM_COLUMNS] + [json.dumps(row['item'], ensure_ascii=False)]
+             for row in item_rows(record)])
+
+    def _bump(self, conn, totals):
+        # 统计增量和版本号与数据在同一个事务里提交
+        for key, value in totals.items():
+            conn.execute(
+                'INSERT INTO meta (key, value) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = value + excluded.value', (key, value))
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('version', 1) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('modified', ?)", (int(time.time()),))
+
+    def _rebuild_stats(self, conn):
+        row = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(action_count), 0), COALESCE(SUM(complaint_count), 0), '
+            'COALESCE(SUM(pending_count), 0) FROM analyses').fetchone()
+        meetings, actions, complaints, pending = row
+        values = {'meetings': meetings, 'actions': actions, 'complaints': complaints,
+                  'completed': actions - pending, 'pending': pending}
+        conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', values.items())
+        self._bump(conn, {})
+
+    def iter_all(self):
+        return self.iter_matching()
+
+    def append_many(self, records):
+        return self.append_versioned(records)[0]
+
+    def append_versioned(self, records):
+        records = list(records)
+        totals = dict.fromkeys(STAT_KEYS, 0)
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='append_many'):
+            with self._transaction() as conn:
+                before = self._version(conn)
+                size = sum(self._insert(conn, record, totals) for record in records)
+                self._bump(conn, totals)
+                after = self._version(conn)
+        metrics.STORE_WRITE_BYTES.inc(size, backend=self.name)
+        return records, before, after
+
+    def append_many_unique_versioned(self, records):
+        # BEGIN IMMEDIATE 之后才查重，其他进程的同一份转录要等这个事务提交后才能查到并跳过；
+        # 同一批里先插入的记录在事务内可见，批内重复也会被跳过
+        stored, duplicates = [], []
+        totals = dict.fromkeys(STAT_KEYS, 0)
+        size = 0
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='append_many'):
+            with self._transaction() as conn:
+                before = self._version(conn)
+                for record in records:
+                    row = conn.execute('SELECT id, data FROM analyses WHERE content_hash = ? AND method = ? '
+                                       'LIMIT 1', (record.get('content_hash'), record['analysis_method'])).fetchone()
+                    if row is not None:
+                        duplicates.append((record, self._row_to_record(row)))
+                        continue
+                    size += self._insert(conn, record, totals)
+                    stored.append(record)
+                if not stored:
+                    return stored, duplicates, before, before
+                self._bump(conn, totals)
+                after = self._version(conn)
+        metrics.STORE_WRITE_BYTES.inc(size, backend=self.name)
+        return stored, duplicates, before, after
+
+    def content_keys(self):
+        rows = self._conn().execute('SELECT content_hash, method FROM analyses WHERE content_hash IS NOT NULL')
+        return {(row['content_hash'], row['method']) for row in rows}
+
+    def replace_all(self, records):
+        records = list(records)
+        totals = dict.fromkeys(STAT_KEYS, 0)
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='replace_all'):
+            with self._transaction() as conn:
+                conn.execute('DELETE FROM analyses')
+                conn.execute('DELETE FROM analysis_items')
+                conn.execute("DELETE FROM meta WHERE key NOT IN ('version', 'modified')")
+                size = sum(self._insert(conn, record, totals) for record in records)
+                self._bump(conn, totals)
+        metrics.STORE_WRITE_BYTES.inc(size, backend=self.name)
+
+    def update_many(self, records):
+        records = list(records)
+        totals = dict.fromkeys(STAT_KEYS, 0)
+        size = updated = 0
+        with metrics.STORE_SECONDS.time(backend=self.name, operation='update_many'):
+            with self._transaction() as conn:
+                for record in records:
+                    row = conn.execute('SELECT data FROM analyses WHERE id = ?', (record['id'],)).fetchone()
+                    if row is None:
+                        continue
+                    current = json.loads(row['data'])
+                    record['rev'] = current.get('rev', 0) + 1
+                    # 统计按新旧记录的差值累加
+                    for key, value in record_stats(current).items():
+                        totals[key] -= value
+                    for key, value in record_stats(record).items():
+                        totals[key] += value
+                    columns = _columns(record)
+                    columns['data'] = json.dumps({k: v for k, v in record.items() if k != 'id'},
+                                                 ensure_ascii=False)
+                    conn.execute('UPDATE analyses SET %s WHERE id = ?' % ', '.join('%s = ?' % c for c in columns),
+                                 list(columns.values()) + [record['id']])
+                    conn.execute('DELETE FROM analysis_items WHERE analysis_id = ?', (record['id'],))
+                    self._insert_items(conn, record)
+                    size += len(columns['data'].encode('utf-8'))
+                    updated += 1
+                if updated:
+                    self._bump(conn, totals)
+        metrics.STORE_WRITE_BYTES.inc(size, backend=self.name)
+        return updated
+
+    def _version(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def version(self):
+        return self._version(self._conn())
+
+    def modified(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'modified'").fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        rows = self._conn().execute('SELECT key, value FROM meta').fetchall()
+        values = {row['key']: row['value'] for row in rows}
+        return {key: values.get(key, 0) for key in STAT_KEYS}
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+
+    def get_many(self, ids):
+        ids, records = list(ids), {}
+        for chunk in [ids[i:i + 500] for i in range(0, len(ids), 500)]:
+            rows = self._conn().execute('SELECT id, data FROM analyses WHERE id IN (%s)'
+                                        % ', '.join('?' * len(chunk)), chunk)
+            records.update((row['id'], self._row_to_record(row)) for row in rows)
+        return records
+
+    def find_by_content(self, digest, method=None):
+        sql = 'SELECT id, data FROM analyses WHERE content_hash = ?'
+        params = [digest]
+        if method:
+            sql += ' AND method = ?'
+            params.append(method)
+        row = self._conn().execute(sql + ' LIMIT 1', params).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def recent(self, limit):
+        rows = self._conn().execute(
+            'SELECT id, data FROM analyses ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [self._row_to_record(row) for row in reversed(rows)]
+
+    def query(self, date_from=None, date_to=None, topic=None, method=None,
+              limit=None, offset=0, newest_first=False, sort=None):
+        where, params = _where({'date_from': date_from, 'date_to': date_to,
+                                'topic': topic, 'method': method})
+        sort = sort or ('newest' if newest_first else 'oldest')
+        sql = 'SELECT id, data FROM analyses%s ORDER BY %s' % (where, SORTS[sort][0])
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params.extend([limit if limit is not None else -1, offset])
+        rows = self._conn().execute(sql, params).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def iter_matching(self, date_from=None, date_to=None, topic=None, method=None):
+        # 游标逐行读取，内存占用与结果条数无关；data 按原始字节取出，顺便统计读取量，
+        # json.loads 直接解析 UTF-8 字节
+        where, params = _where({'date_from': date_from, 'date_to': date_to,
+                                'topic': topic, 'method': method})
+        cursor = self._conn().execute(
+            'SELECT id, CAST(data AS BLOB) AS data FROM analyses%s ORDER BY id' % where, params)
+        size = 0
+        try:
+            for row in cursor:
+                size += len(row['data'])
+                yield self._row_to_record(row)
+        finally:
+            metrics.STORE_READ_BYTES.inc(size, backend=self.name)
+
+    def count_matching(self, date_from=None, date_to=None, topic=None, method=None):
+        where, params = _where({'date_from': date_from, 'date_to': date_to,
+                                'topic': topic, 'method': method})
+        return self._conn().execute('SELECT COUNT(*) FROM analyses' + where, params).fetchone()[0]
+
+    def query_items(self, kind, limit=None, offset=0, sort='newest', **filters):
+        where, params = _where(dict(filters, kind=kind))
+        order = SORTS[sort][0].replace('id', 'analysis_id')
+        sql = 'SELECT %s, data FROM analysis_items%s ORDER BY %s, idx' % (
+            ', '.join(ITEM_COLUMNS), where, order)
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params.extend([limit if limit is not None else -1, offset])
+        rows = []
+        for row in self._conn().execute(sql, params):
+            item = dict(zip(ITEM_COLUMNS, row))
+            item['item'] = json.loads(row['data'])
+            rows.append(item)
+        return rows
+
+    def item_totals(self, kind, **filters):
+        where, params = _where(dict(filters, kind=kind))
+        row = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(status = 'pending'), 0), "
+            "COALESCE(SUM(status = 'completed'), 0) FROM analysis_items" + where, params).fetchone()
+        return {'total': row[0], 'pending': row[1], 'completed': row[2]}
+
+    def topics(self):
+        rows = self._conn().execute(
+            'SELECT DISTINCT topic FROM analyses WHERE topic IS NOT NULL ORDER BY topic')
+        return [row[0] for row in rows]
+
+    def responsibles(self, kind='action'):
+        rows = self._conn().execute(
+            'SELECT DISTINCT responsible FROM analysis_items '
+            'WHERE kind = ? AND responsible IS NOT NULL ORDER BY responsible', (kind,))
+        return [row[0] for row in rows]
+
+    def migrate_json(self, json_path):
+        # 一次性把旧的 analyses.json 导入，完成后改名避免重复导入
+        if not os.path.exists(json_path):
+            return 0
+        if self.count():
+            raise RuntimeError('存储中已有数据，无法迁移: %s' % json_path)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            analyses = json.load(f)
+        self.append_many(analyses)
+        os.replace(json_path, json_path + '.migrated')
+        return len(analyses)
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
+
+
+# 进程内缓存：按存储版本号失效，同一进程内的写入直接更新缓存
+class CachedStore(AnalysisStore):
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._version = None
+        self._records = None
+        self._stats = None
+        self._stats_version = None
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def iter_all(self):
+        return iter(self.load_all())
+
+    def load_all(self):
+        # 返回的列表在进程内共享，调用方只读
+        version = self.backend.version()
+        with self._lock:
+            if self._records is None or self._version != version:
+                self._records = self.backend.load_all()
+                self._version = version
+            return self._records
+
+    def append_many(self, records):
+        # 其他进程的写入夹在中间时 before 对不上，缓存留待下次按版本号重新载入
+        with self._lock:
+            records, before, after = self.backend.append_versioned(records)
+            self._appended(records, before, after)
+        return records
+
+    def append_unique(self, record):
+        with self._lock:
+            record, duplicate, before, after = self.backend.append_unique_versioned(record)
+            if not duplicate:
+                self._appended([record], before, after)
+        return record, duplicate
+
+    def append_many_unique(self, records):
+        with self._lock:
+            stored, duplicates, before, after = self.backend.append_many_unique_versioned(records)
+            if stored:
+                self._appended(stored, before, after)
+        return stored, duplicates
+
+    def content_keys(self):
+        return self.backend.content_keys()
+
+    def _appended(self, records, before, after):
+        if before is not None and self._records is not None and self._version == before:
+            self._records.extend(records)
+            self._version = after
+        if before is not None and self._stats is not None and self._stats_version == before:
+            for record in records:
+                for key, value in record_stats(record).items():
+                    self._stats[key] += value
+            self._stats_version = after
+
+    def update_many(self, records):
+        with self._lock:
+            updated = self.backend.update_many(records)
+            self._records = None
+            self._stats = None
+        return updated
+
+    def replace_all(self, records):
+        with self._lock:
+            self.backend.replace_all(records)
+            self._records = None
+            self._stats = None
+
+    def version(self):
+        return self.backend.version()
+
+    def modified(self):
+        return self.backend.modified()
+
+    def stats(self):
+        version = self.backend.version()
+        with self._lock:
+            if self._stats is None or self._stats_version != version:
+                self._stats = self.backend.stats()
+                self._stats_version = version
+            return dict(self._stats)
+
+    def count(self):
+        return self.backend.count()
+
+    def recent(self, limit):
+        return self.backend.recent(limit)
+
+    def query(self, *args, **kwargs):
+        return self.backend.query(*args, **kwargs)
+
+    def find_by_content(self, digest, method=None):
+        return self.backend.find_by_content(digest, method)
+
+    # 列表页查询直接交给后端（SQLite 走索引），不使用基类的逐条扫描
+    def count_matching(self, *args, **kwargs):
+        return self.backend.count_matching(*args, **kwargs)
+
+    def get_many(self, ids):
+        return self.backend.get_many(ids)
+
+    def iter_matching(self, *args, **kwargs):
+        return self.backend.iter_matching(*args, **kwargs)
+
+    def query_items(self, *args, **kwargs):
+        return self.backend.query_items(*args, **kwargs)
+
+    def item_totals(self, *args, **kwargs):
+        return self.backend.item_totals(*args, **kwargs)
+
+    def topics(self):
+        return self.backend.topics()
+
+    def responsibles(self, kind='action'):
+        return self.backend.responsibles(kind)
+
+    def close(self):
+        self.backend.close()
+
+
+BACKENDS = {
+    'json': lambda folder: JsonAnalysisStore(os.path.join(folder, 'analyses.json')),
+    'sqlite': lambda folder: SqliteAnalysisStore(os.path.join(folder, 'analyses.db')),
+}
+
+
+def open_store(data_folder, backend='sqlite', migrate=True, cached=False):
+    if backend not in BACKENDS:
+        raise ValueError('未知的存储后端: %s' % backend)
+    store = BACKENDS[backend](data_folder)
+    json_path = os.path.join(data_folder, 'analyses.json')
+    if migrate and isinstance(store, SqliteAnalysisStore) and not store.count():
+        store.migrate_json(json_path)
+    return CachedStore(store) if cached else store
@@ -0,0 +1,79 @@
+import codecs
+
+from matcher import SENTENCE_DELIMITERS, segment
+
+# 流式读取转录文件
+#
+# 字节流按块增量解码，再切成以句末标点结尾的文本块交给分析器；
+# 跨块的半句话留到下一块，峰值内存只和块大小有关，与文件大小无关。
+
+CHUNK_SIZE = 256 * 1024
+# 一直没有句末标点时强制切分，防止残句无限增长
+MAX_CARRY = 1024 * 1024
+
+
+def iter_bytes(stream, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_text(stream, encoding='utf-8', errors='strict', chunk_size=CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    for chunk in iter_bytes(stream, chunk_size):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _last_delimiter(text):
+    return max(text.rfind(delimiter) for delimiter in SENTENCE_DELIMITERS)
+
+
+def iter_sentence_blocks(chunks, max_carry=MAX_CARRY):
+    # 产出只包含完整句子的文本块
+    carry = ''
+    for chunk in chunks:
+        text = carry + chunk if carry else chunk
+        end = _last_delimiter(text)
+        if end < 0:
+            if len(text) > max_carry:
+                yield text
+                carry = ''
+            else:
+                carry = text
+            continue
+        yield text[:end + 1]
+        carry = text[end + 1:]
+    if carry:
+        yield carry
+
+
+def iter_sentences(chunks):
+    for block in iter_sentence_blocks(chunks):
+        starts, ends = segment(block)
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            yield block[start:end]
+
+
+def _strip_newline(line):
+    return (line.splitlines() or [''])[0]
+
+
+def iter_lines(chunks):
+    # 与 str.splitlines 结果一致，但不需要整份文本；结尾的 \r 可能和下一块的 \n 组成一个换行
+    carry = ''
+    for chunk in chunks:
+        lines = (carry + chunk).splitlines(keepends=True)
+        carry = ''
+        if lines and (lines[-1] == _strip_newline(lines[-1]) or lines[-1].endswith('\r')):
+            carry = lines.pop()
+        for line in lines:
+            yield _strip_newline(line)
+    if carry:
+        yield from carry.splitlines()
@@ -0,0 +1,200 @@
+import heapq
+import threading
+from datetime import datetime
+
+from matcher import segment
+from startup import lazy_import
+from storage import SqliteDatabase
+from streaming import iter_sentence_blocks
+
+np = lazy_import('numpy')
+
+# 语料级 TF-IDF 抽取式摘要
+#
+# 词项取句内相邻两个汉字（或英文字母、数字）组成的二元组，整块文本用 NumPy 一次切出，不需要逐句分词。
+# IDF = ln((N + 1) / (df + 1)) + 1，N 为已登记的会议数，df 为出现过该词项的会议数；
+# 每场新会议分析时把自己的词项集合累加进 idf_terms（按内容哈希去重），不需要重算全语料。
+# 打分分两步：逐块按 IDF 算出各句的信息量，只保留最靠前的一批候选句；
+# 整份转录结束后再乘上全文词频重新打分，跳过与已选句子高度重叠的句子，按原文顺序输出。
+
+IDF_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS idf_terms (
+        term INTEGER PRIMARY KEY,
+        df INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS idf_documents (
+        content_hash TEXT PRIMARY KEY,
+        created_at TEXT NOT NULL
+    )''',
+]
+
+MAX_SUMMARY = 3
+# 每份转录保留的候选句数
+MAX_CANDIDATES = 64
+# 太短的句子（寒暄、应答）不进入摘要
+MIN_CHARS = 8
+# 与已选句子共有的词项超过这个比例时跳过
+MAX_OVERLAP = 0.5
+# 语料规模达到摘要时的 DRIFT_RATIO 倍（且至少多出 MIN_DRIFT_DOCUMENTS 场）即认为 IDF 已漂移
+DRIFT_RATIO = 2.0
+MIN_DRIFT_DOCUMENTS = 20
+# 语料增长超过这个比例才重新载入 IDF 快照
+RELOAD_GROWTH = 0.05
+
+
+def sentence_terms(text, starts, ends):
+    # 返回 (词项, 所属句子下标)，均为 int64 数组；词项 = 前一个字符码位 << 21 | 后一个
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    codes = np.where((codes >= 65) & (codes <= 90), codes + 32, codes)
+    word = (((codes >= 0x4e00) & (codes <= 0x9fff)) | ((codes >= 48) & (codes <= 57)) |
+            ((codes >= 97) & (codes <= 122)))
+    pos = np.flatnonzero(word[:-1] & word[1:])
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    sentence = np.searchsorted(starts, pos, side='right') - 1
+    keep = (sentence >= 0) & (pos + 1 < ends[np.maximum(sentence, 0)]) if len(starts) else pos < 0
+    pos, sentence = pos[keep], sentence[keep]
+    return (codes[pos] << 21) | codes[pos + 1], sentence
+
+
+class IdfSnapshot:
+    # 某一时刻的 IDF 表：按词项排序的数组，查询用二分查找
+    def __init__(self, terms=None, dfs=None, documents=0):
+        self.terms = terms if terms is not None else np.zeros(0, dtype=np.int64)
+        self.dfs = dfs if dfs is not None else np.zeros(0, dtype=np.int64)
+        self.documents = documents
+
+    def idf(self, terms):
+        df = np.zeros(len(terms))
+        if len(self.terms) and len(terms):
+            index = np.minimum(np.searchsorted(self.terms, terms), len(self.terms) - 1)
+            found = self.terms[index] == terms
+            df[found] = self.dfs[index[found]]
+        return np.log((self.documents + 1.0) / (df + 1.0)) + 1.0
+
+
+class IdfTable(SqliteDatabase):
+    def __init__(self, path):
+        SqliteDatabase.__init__(self, path)
+        self._lock = threading.Lock()
+        self._snapshot = None
+        with self._transaction() as conn:
+            for statement in IDF_SCHEMA:
+                conn.execute(statement)
+
+    def add(self, content_hash, terms):
+        # 登记一场会议的词项（去重后的数组）；同一内容只计一次，返回是否新登记
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._transaction() as conn:
+            if conn.execute('SELECT 1 FROM idf_documents WHERE content_hash = ?',
+                            (content_hash,)).fetchone():
+                return False
+            conn.execute('INSERT INTO idf_documents (content_hash, created_at) VALUES (?, ?)',
+                         (content_hash, now))
+            conn.executemany('INSERT INTO idf_terms (term, df) VALUES (?, 1) '
+                             'ON CONFLICT(term) DO UPDATE SET df = df + 1',
+                             ((term,) for term in np.unique(terms).tolist()))
+        return True
+
+    def documents(self):
+        return self._conn().execute('SELECT COUNT(*) FROM idf_documents').fetchone()[0]
+
+    def snapshot(self):
+        # 语料小时每次变化都重新载入，之后增长超过 RELOAD_GROWTH 才重新载入
+        documents = self.documents()
+        with self._lock:
+            current = self._snapshot
+            if current is None or (documents != current.documents and (
+                    current.documents < 1 / RELOAD_GROWTH or
+                    documents >= current.documents * (1 + RELOAD_GROWTH))):
+                rows = self._conn().execute('SELECT term, df FROM idf_terms ORDER BY term').fetchall()
+                data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+                self._snapshot = IdfSnapshot(data[:, 0].copy(), data[:, 1].copy(), documents)
+            return self._snapshot
+
+    def stats(self):
+        terms = self._conn().execute('SELECT COUNT(*) FROM idf_terms').fetchone()[0]
+        return {'documents': self.documents(), 'terms': terms}
+
+
+class SummaryRanker:
+    # 一份转录的摘要打分，文本逐块喂入
+    def __init__(self, snapshot=None, max_candidates=MAX_CANDIDATES, min_chars=MIN_CHARS):
+        self.snapshot = snapshot or IdfSnapshot()
+        self.max_candidates = max_candidates
+        self.min_chars = min_chars
+        self.block_terms = []
+        # (信息量, 句子序号, 句子, 句中词项)
+        self.candidates = []
+        self.leading = []
+        self.offset = 0
+
+    def add(self, text, starts, ends):
+        count = len(starts)
+        if len(self.leading) < MAX_SUMMARY:
+            self.leading.extend(text[s:e] for s, e in zip(starts[:MAX_SUMMARY], ends[:MAX_SUMMARY]))
+        terms, sentence = sentence_terms(text, starts, ends)
+        if len(terms):
+            unique, inverse, counts = np.unique(terms, return_inverse=True, return_counts=True)
+            self.block_terms.append((unique, counts))
+            idf = self.snapshot.idf(unique)
+            sizes = np.bincount(sentence, minlength=count)
+            info = np.bincount(sentence, weights=idf[inverse], minlength=count) / np.sqrt(np.maximum(sizes, 1))
+            info[(np.asarray(ends) - np.asarray(starts)) < self.min_chars] = 0
+            top = np.argsort(-info, kind='stable')[:self.max_candidates]
+            top = top[info[top] > 0]
+            if len(top):
+                # 按句子分组的词项下标，取候选句的词项
+                order = np.argsort(sentence, kind='stable')
+                bounds = np.searchsorted(sentence[order], np.stack([top, top + 1]))
+                for i, (lo, hi) in zip(top.tolist(), bounds.T.tolist()):
+                    self.candidates.append((float(info[i]), self.offset + i, text[starts[i]:ends[i]],
+                                            unique[np.unique(inverse[order[lo:hi]])]))
+                self.candidates = heapq.nlargest(self.max_candidates, self.candidates, key=lambda c: c[0])
+        self.offset += count
+
+    def terms(self):
+        if not self.block_terms:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate([unique for unique, _ in self.block_terms]))
+
+    def summary(self, max_sentences=MAX_SUMMARY):
+        if not self.candidates:
+            return self.leading[:max_sentences]
+        terms, inverse = np.unique(np.concatenate([unique for unique, _ in self.block_terms]),
+                                   return_inverse=True)
+        tf = np.bincount(inverse, weights=np.concatenate([counts for _, counts in self.block_terms]))
+        weights = (1.0 + np.log(tf)) * self.snapshot.idf(terms)
+        scored = []
+        for _, index, sentence, candidate_terms in self.candidates:
+            w = weights[np.searchsorted(terms, candidate_terms)]
+            scored.append((float(w.sum() / np.sqrt(len(w))), index, sentence, set(candidate_terms.tolist())))
+        scored.sort(key=lambda c: (-c[0], c[1]))
+        chosen, covered = [], set()
+        for score, index, sentence, term_set in scored:
+            if len(term_set & covered) > MAX_OVERLAP * len(term_set):
+                continue
+            chosen.append((index, sentence))
+            covered |= term_set
+            if len(chosen) >= max_sentences:
+                break
+        return [sentence for _, sentence in sorted(chosen)]
+
+
+def summarize_chunks(chunks, snapshot, max_sentences=MAX_SUMMARY):
+    # 从原始转录重新生成摘要（批量重新摘要用）
+    ranker = SummaryRanker(snapshot)
+    for block in iter_sentence_blocks(chunks):
+        starts, ends = segment(block)
+        ranker.add(block, starts, ends)
+    return ranker.summary(max_sentences)
+
+
+def is_drifted(record, documents, ratio=DRIFT_RATIO, min_documents=MIN_DRIFT_DOCUMENTS):
+    # 本地分析的摘要生成时的语料规模与当前相比是否已明显变化；旧版摘要没有记录规模，一律算漂移
+    if record.get('analysis_method') != 'local_model':
+        return False
+    then = record.get('summary_documents')
+    if then is None:
+        return True
+    return documents >= max(then * ratio, then + min_documents)
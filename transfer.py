@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+
+from analyzer import DefaultRoles
+
+# 分析记录的批量导出与导入
+#
+# 导出逐条序列化、攒够一定字节数再交给响应，内存占用与记录总数无关；
+# 导入逐行解析 NDJSON，分批写入存储，内容哈希相同的记录跳过。
+
+# 响应每次写出的大致字节数
+FLUSH_SIZE = 64 * 1024
+
+GT_CATEGORIES = ['performance', 'shield', 'wash', 'delay']
+MANAGERS = list(DefaultRoles().managers)
+
+CSV_COLUMNS = (['id', 'date', 'time', 'topic', 'filename', 'analysis_method', 'content_hash',
+                'summary', 'action_count', 'complaint_count'] +
+               ['gt_' + name for name in GT_CATEGORIES] +
+               ['manager_' + name for name in MANAGERS] +
+               ['action_items', 'complaints'])
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def buffered(pieces, size=FLUSH_SIZE):
+    # 把很多小字符串合并成大块输出，减少响应的写入次数
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_row(record):
+    metadata = record.get('metadata') or {}
+    gt = record.get('gt_analysis') or {}
+    managers = record.get('manager_analysis') or {}
+    action_items = record.get('action_items') or []
+    complaints = record.get('complaints') or []
+    return ([record.get('id'), metadata.get('date'), metadata.get('time'), metadata.get('topic'),
+             metadata.get('filename'), record.get('analysis_method'), record.get('content_hash'),
+             '\n'.join(str(s) for s in record.get('summary') or []),
+             len(action_items), len(complaints)] +
+            [gt.get(name) for name in GT_CATEGORIES] +
+            [managers.get(name) for name in MANAGERS] +
+            [json.dumps(action_items, ensure_ascii=False), json.dumps(complaints, ensure_ascii=False)])
+
+
+def csv_lines(records):
+    # 带 BOM，Excel 打开时按 UTF-8 识别
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_COLUMNS)
+    yield '\ufeff' + out.getvalue()
+    for record in records:
+        out.seek(0)
+        out.truncate()
+        writer.writerow(csv_row(record))
+        yield out.getvalue()
+
+
+def export_lines(records, fmt):
+    lines = ndjson_lines(records) if fmt == 'ndjson' else csv_lines(records)
+    return buffered(lines)
+
+
+def parse_record(line):
+    # 一行 NDJSON -> 可写入存储的记录；格式不对时抛出 ValueError
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError('每行应为一个 JSON 对象')
+    if not isinstance(record.get('metadata'), dict):
+        raise ValueError('缺少 metadata')
+    if not record.get('analysis_method'):
+        raise ValueError('缺少 analysis_method')
+    for key in ('summary', 'action_items', 'complaints'):
+        if not isinstance(record.get(key, []), list):
+            raise ValueError('%s 应为数组' % key)
+    for key in ('gt_analysis', 'manager_analysis'):
+        if not isinstance(record.get(key, {}), dict):
+            raise ValueError('%s 应为对象' % key)
+    # id 由目标存储重新分配
+    record.pop('id', None)
+    return record
+
+
+def import_lines(lines, store, batch_size=500, on_batch=None, max_errors=20):
+    # lines: NDJSON 文本行；逐批 append_many_unique，on_batch(已写入的记录) 在每批提交后调用。
+    # 已入库的内容开始时载入一次；写入时在同一事务里再查一遍，挡住同时进行的其他导入
+    totals = {'imported': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+    batch, seen = [], store.content_keys()
+
+    def flush():
+        records, duplicates = store.append_many_unique(batch)
+        totals['imported'] += len(records)
+        totals['duplicates'] += len(duplicates)
+        if on_batch:
+            on_batch(records)
+        del batch[:]
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = parse_record(line)
+        except ValueError as e:
+            totals['invalid'] += 1
+            if len(totals['errors']) < max_errors:
+                totals['errors'].append({'line': number, 'error': str(e)})
+            continue
+        digest = record.get('content_hash')
+        if digest:
+            key = (digest, record['analysis_method'])
+            if key in seen:
+                totals['duplicates'] += 1
+                continue
+            seen.add(key)
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return totals